@@ -2,6 +2,10 @@
 ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it (``SERVER_MODE=asgi`` in start.sh, i.e. gunicorn with uvicorn
+workers) to keep the live event feed at /api/events/ streaming and to run
+the async read views (core.async_views) on the event loop; under WSGI the
+feed only replays.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -14,3 +18,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_asgi_application()
+
+# Read and compress index.html now rather than in the first request
+from core.react_views import get_app_shell  # noqa: E402
+
+get_app_shell()
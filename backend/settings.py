@@ -2,6 +2,7 @@
 Django settings for Agent Control Panel backend.
 """
 
+from decimal import Decimal
 from pathlib import Path
 import os
 from dotenv import load_dotenv
@@ -31,7 +32,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Serve static files
+    'core.middleware.AsyncWhiteNoiseMiddleware',  # Serve static files (async-capable WhiteNoise)
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,6 +40,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.db_routers.ReplicaRoutingMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -62,15 +65,27 @@ TEMPLATES = [
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 # Database
+# Connections are kept per worker thread for DB_CONN_MAX_AGE seconds and
+# checked before reuse (CONN_HEALTH_CHECKS), so a connection dropped by
+# the server or a pooler is replaced instead of failing a request. Budget
+# WEB_CONCURRENCY connections per database, times GUNICORN_THREADS when
+# start.sh runs threaded workers.
+# Behind PgBouncer in transaction mode set DB_POOLER=True: server-side
+# cursors (used by QuerySet.iterator(), e.g. exports) don't survive it.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 600))
+DB_POOLER = os.getenv('DB_POOLER', 'False') == 'True'
+
 # Use PostgreSQL if DATABASE_URL is available, otherwise SQLite (for testing)
 if os.getenv('DATABASE_URL') or os.getenv('DATABASE_PRIVATE_URL'):
     import dj_database_url
     DATABASES = {
         'default': dj_database_url.config(
             default=os.getenv('DATABASE_PRIVATE_URL') or os.getenv('DATABASE_URL'),
-            conn_max_age=600
+            conn_max_age=DB_CONN_MAX_AGE,
+            conn_health_checks=True
         )
     }
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = DB_POOLER
 else:
     # Fallback to SQLite for development/testing
     DATABASES = {
@@ -80,6 +95,23 @@ else:
         }
     }
 
+# Optional read replica. Read-only endpoints read from it (see
+# core.db_routers); a client that just wrote reads from the primary for
+# REPLICA_STICKY_SECONDS so it sees its own writes. Tests mirror it onto
+# the default database.
+if os.getenv('DATABASE_REPLICA_URL'):
+    import dj_database_url
+    DATABASES['replica'] = dj_database_url.parse(
+        os.getenv('DATABASE_REPLICA_URL'),
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=True,
+        test_options={'MIRROR': 'default'}
+    )
+    DATABASES['replica']['DISABLE_SERVER_SIDE_CURSORS'] = DB_POOLER
+
+DATABASE_ROUTERS = ['core.db_routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
 # Custom user model
 AUTH_USER_MODEL = 'core.User'
 
@@ -140,6 +172,168 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 100,
 }
 
+# Serialize agent/log lists from values_list() rows instead of model
+# instances (same output; see core.fastpath and `manage.py bench_serializers`)
+FAST_LIST_SERIALIZATION = os.getenv('FAST_LIST_SERIALIZATION', 'False') == 'True'
+
+# Server processes sharing this deployment's caches (start.sh exports it;
+# runserver and management commands are one process)
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+
+# Caches
+# Dashboard stats live in their own cache so the backend can be chosen per
+# deployment: locmem (per worker), file (shared on one host) or db (shared
+# across hosts; created by `manage.py createcachetable`).
+# It also holds one ETag version per agent (core.versions), hence the
+# raised entry limit. With locmem and more than one worker, a worker never
+# sees versions bumped by the others, so conditional GETs only revalidate
+# every VERSIONS_LOCAL_PERIOD seconds (`manage.py check` warns about it).
+STATS_CACHE_BACKEND = os.getenv('STATS_CACHE_BACKEND', 'locmem')
+STATS_CACHE_OPTIONS = {'MAX_ENTRIES': int(os.getenv('STATS_CACHE_MAX_ENTRIES', 50000))}
+STATS_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'stats',
+        'OPTIONS': STATS_CACHE_OPTIONS,
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('STATS_CACHE_LOCATION', '/tmp/agent-control-panel-stats'),
+        'OPTIONS': STATS_CACHE_OPTIONS,
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'stats_cache',
+        'OPTIONS': STATS_CACHE_OPTIONS,
+    },
+}
+# Validators roll over at least this often (seconds) when versions are per worker
+VERSIONS_LOCAL_PERIOD = int(os.getenv('VERSIONS_LOCAL_PERIOD', 5))
+# Agent limit state (core.limits) is read on every decision: locmem keeps
+# it per worker, redis shares it across workers and hosts. With locmem
+# each of the WEB_CONCURRENCY workers enforces the limits on its own, so
+# an agent can get up to WEB_CONCURRENCY times its rate and budget
+# (`manage.py check` warns about it).
+LIMITS_CACHE_BACKEND = os.getenv('LIMITS_CACHE_BACKEND', 'locmem')
+LIMITS_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'limits',
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('LIMITS_CACHE_MAX_ENTRIES', 200000))},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('LIMITS_CACHE_LOCATION', 'redis://localhost:6379/1'),
+    },
+}
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'stats': STATS_CACHE_BACKENDS[STATS_CACHE_BACKEND],
+    'limits': LIMITS_CACHE_BACKENDS[LIMITS_CACHE_BACKEND],
+}
+
+# Seconds a cached dashboard snapshot is served before a full recompute
+DASHBOARD_STATS_TTL = int(os.getenv('DASHBOARD_STATS_TTL', 60))
+
+# Bulk log ingestion (POST /api/logs/bulk/)
+AGENT_LOG_BULK_BATCH_SIZE = int(os.getenv('AGENT_LOG_BULK_BATCH_SIZE', 500))
+AGENT_LOG_BULK_MAX_BATCH_SIZE = 5000
+AGENT_LOG_BULK_MAX_RECORDS = int(os.getenv('AGENT_LOG_BULK_MAX_RECORDS', 10000))
+
+# Streaming metric ingestion (POST /api/agents/{id}/metrics/stream/)
+AGENT_METRIC_STREAM_BATCH_SIZE = int(os.getenv('AGENT_METRIC_STREAM_BATCH_SIZE', 200))
+AGENT_METRIC_STREAM_FLUSH_SECONDS = float(os.getenv('AGENT_METRIC_STREAM_FLUSH_SECONDS', 1.0))
+AGENT_METRIC_STREAM_MAX_LINE_BYTES = 65536
+
+# Live event feed (GET /api/events/)
+EVENT_BROKER = os.getenv('EVENT_BROKER', 'core.events.InProcessBroker')
+EVENT_HISTORY_SIZE = 1000  # Events kept for Last-Event-ID resume
+EVENT_STREAM_RETRY_MS = 3000
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+
+# Batched heartbeats (POST /api/agents/heartbeats/)
+HEARTBEAT_FLUSH_SECONDS = float(os.getenv('HEARTBEAT_FLUSH_SECONDS', 5))
+HEARTBEAT_MAX_PENDING = 5000  # Flush early once this many agents are pending
+HEARTBEAT_STALE_SECONDS = int(os.getenv('HEARTBEAT_STALE_SECONDS', 60))
+
+# Coalesced counter increments (POST /api/agents/increments/)
+COUNTER_FLUSH_SECONDS = float(os.getenv('COUNTER_FLUSH_SECONDS', 2))
+COUNTER_MAX_PENDING = 5000
+
+# Opt-in: queue waitlist signups (POST /api/waitlist) and insert them in
+# batches. A queued signup is lost if the worker is killed before the
+# next flush, so by default each signup is written before the response.
+WAITLIST_BUFFERED = os.getenv('WAITLIST_BUFFERED', 'False') == 'True'
+WAITLIST_FLUSH_SECONDS = float(os.getenv('WAITLIST_FLUSH_SECONDS', 1))
+WAITLIST_MAX_PENDING = 1000
+WAITLIST_COUNT_TTL = int(os.getenv('WAITLIST_COUNT_TTL', 10))  # Seconds the displayed count may lag
+
+# Security scores (core.security), from logs over a sliding window
+SECURITY_WINDOW_HOURS = int(os.getenv('SECURITY_WINDOW_HOURS', 24))
+SECURITY_FLUSH_SECONDS = float(os.getenv('SECURITY_FLUSH_SECONDS', 5))
+SECURITY_MAX_PENDING = 5000  # (agent, hour) buckets
+
+# Policy engine (core.policy): decision when no rule matches, how often a
+# process checks for rule changes, and the largest /api/policy/decide/ batch
+POLICY_DEFAULT_DECISION = os.getenv('POLICY_DEFAULT_DECISION', 'allowed')
+POLICY_RELOAD_SECONDS = float(os.getenv('POLICY_RELOAD_SECONDS', 1))
+POLICY_MAX_BATCH = 1000
+
+# Per-agent limits (core.limits), enforced when actions are decided.
+# Agents override them with actions_per_minute / cost_budget. Unset means
+# no limit and 0 refuses every action, here and on the agent.
+LIMITS_ACTIONS_PER_MINUTE = (
+    int(os.getenv('LIMITS_ACTIONS_PER_MINUTE')) if os.getenv('LIMITS_ACTIONS_PER_MINUTE') else None
+)
+LIMITS_COST_BUDGET = Decimal(os.getenv('LIMITS_COST_BUDGET')) if os.getenv('LIMITS_COST_BUDGET') else None
+LIMITS_COST_WINDOW_HOURS = int(os.getenv('LIMITS_COST_WINDOW_HOURS', 24))
+
+# Anomaly detection (core.anomalies) over ingested logs and metrics;
+# detections are written as flagged 'anomaly' logs
+ANOMALY_DETECTION = os.getenv('ANOMALY_DETECTION', 'True') == 'True'
+ANOMALY_ALPHA = float(os.getenv('ANOMALY_ALPHA', 0.1))  # EWMA weight of the newest observation
+ANOMALY_Z_THRESHOLD = float(os.getenv('ANOMALY_Z_THRESHOLD', 4))
+ANOMALY_WARMUP = 20  # Minutes / logs / samples seen before an agent can be flagged
+ANOMALY_MIN_BURST = 10  # Actions in a minute before a burst counts
+ANOMALY_NOVELTY_RATE = 0.05  # New targets flagged only from agents below this rate
+ANOMALY_COOLDOWN_SECONDS = int(os.getenv('ANOMALY_COOLDOWN_SECONDS', 300))
+ANOMALY_MAX_AGENTS = 10000  # Profiles kept per worker
+
+# Metric time series (GET /api/metrics/timeseries/)
+TIMESERIES_MAX_BUCKETS = 2000
+TIMESERIES_DEFAULT_POINTS = 300  # LTTB target for ?raw=1
+TIMESERIES_MAX_POINTS = 2000
+TIMESERIES_MAX_RAW_ROWS = 200000
+
+# Bulk export (GET /api/logs/export/, /api/metrics/export/)
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 5000))  # Rows per fetch and per columnar chunk
+
+# Fleet summary (GET /api/fleet/summary/)
+FLEET_SUMMARY_MIN_INTERVAL = int(os.getenv('FLEET_SUMMARY_MIN_INTERVAL', 15))  # Seconds between refreshes after a change
+FLEET_SUMMARY_MAX_AGE = int(os.getenv('FLEET_SUMMARY_MAX_AGE', 300))  # Refresh even without changes
+FLEET_SUMMARY_LOCK_SECONDS = 60
+FLEET_SUMMARY_MAX_PENDING = int(os.getenv('FLEET_SUMMARY_MAX_PENDING', 1000))  # Changed agents tracked before a full rebuild
+FLEET_SUMMARY_DEFAULT_TOP = 10
+FLEET_SUMMARY_MAX_TOP = 100
+
+# Data retention for agent_logs / agent_metrics (and their metric rollups), in days per User.plan
+# (matches the audit log history on the pricing page). None keeps forever.
+RETENTION_DAYS = {
+    'free': 7,
+    'starter': 7,
+    'pro': 90,
+    'team': 365,
+    'default': None,  # Unknown plans (e.g. self-hosted)
+}
+RETENTION_DELETE_CHUNK_SIZE = 5000
+RETENTION_PARTITION_DAYS = 7  # PostgreSQL partition width
+RETENTION_PARTITIONS_AHEAD = 4
+
+# Query budgets declared on views: 'off', 'warn' or 'raise'
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'warn' if DEBUG else 'off')
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -9,10 +9,12 @@ from django.views.generic import RedirectView
 from rest_framework.routers import DefaultRouter
 from core import views
 from core.api import (
-    AgentViewSet, AgentLogViewSet, dashboard_stats, health_check,
-    simulate_agents, simulate_activity
+    AgentViewSet, AgentLogViewSet, metrics_timeseries, fleet_summary, policy_decide, simulate_agents, simulate_activity
 )
+from core.async_views import agent_logs, agent_metrics, dashboard_stats, health_check
 from core.react_views import ReactAppView
+from core.event_views import event_stream
+from core.export_views import export_logs, export_metrics
 from core.debug_views import debug_auth
 
 # DRF Router for viewsets
@@ -34,6 +36,28 @@ urlpatterns = [
     # Dashboard stats
     path('api/dashboard/stats/', dashboard_stats, name='dashboard-stats'),
     
+    # Fleet metric time series
+    path('api/metrics/timeseries/', metrics_timeseries, name='metrics-timeseries'),
+    
+    # Bulk export (streamed; before the router so 'export' isn't read as a pk,
+    # and with an optional slash so /api/logs/export isn't caught by the SPA)
+    re_path(r'^api/logs/export/?$', export_logs, name='logs-export'),
+    re_path(r'^api/metrics/export/?$', export_metrics, name='metrics-export'),
+    
+    # Fleet totals grouped by model / status / user / plan
+    path('api/fleet/summary/', fleet_summary, name='fleet-summary'),
+    
+    # Policy decisions (core.policy)
+    path('api/policy/decide/', policy_decide, name='policy-decide'),
+    
+    # Live event feed (Server-Sent Events, needs ASGI for long-lived streams)
+    path('api/events/', event_stream, name='event-stream'),
+    
+    # Per-agent reads (async views; before the router, which routes the
+    # rest of /api/agents/<id>/)
+    path('api/agents/<uuid:pk>/logs/', agent_logs, name='agent-logs'),
+    path('api/agents/<uuid:pk>/metrics/', agent_metrics, name='agent-metrics'),
+    
     # Simulation endpoints (for demo/testing)
     path('api/simulate/agents/', simulate_agents, name='simulate-agents'),
     path('api/simulate/activity/', simulate_activity, name='simulate-activity'),
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Read and compress index.html now rather than in the first request
+from core.react_views import get_app_shell  # noqa: E402
+
+get_app_shell()
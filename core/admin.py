@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Waitlist, Agent, AgentLog, AgentMetric
+from django.http import StreamingHttpResponse
+from .export import LOG_EXPORT, stream_csv, streaming_content
+from .models import User, Waitlist, Agent, AgentLog, AgentMetric, PolicyRule
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -32,6 +34,7 @@ class WaitlistAdmin(admin.ModelAdmin):
 class AgentAdmin(admin.ModelAdmin):
     """Agent monitoring"""
     list_display = ['name', 'user', 'status', 'model', 'created_at', 'last_active_at']
+    list_select_related = ['user']
     list_filter = ['status', 'model', 'created_at']
     search_fields = ['name', 'user__email']
     readonly_fields = ['id', 'created_at', 'last_active_at']
@@ -41,6 +44,9 @@ class AgentAdmin(admin.ModelAdmin):
         ('Basic Info', {
             'fields': ('id', 'user', 'name', 'status', 'model')
         }),
+        ('Limits', {
+            'fields': ('actions_per_minute', 'cost_budget')
+        }),
         ('Timestamps', {
             'fields': ('created_at', 'last_active_at')
         }),
@@ -54,10 +60,22 @@ class AgentAdmin(admin.ModelAdmin):
 class AgentLogAdmin(admin.ModelAdmin):
     """Agent activity logs"""
     list_display = ['agent', 'action', 'target_short', 'status', 'timestamp']
+    list_select_related = ['agent']
     list_filter = ['status', 'action', 'timestamp']
     search_fields = ['agent__name', 'action', 'target']
     readonly_fields = ['timestamp']
     date_hierarchy = 'timestamp'
+    actions = ['export_csv']
+    
+    @admin.action(description='Export selected logs as CSV')
+    def export_csv(self, request, queryset):
+        """Streamed, so large selections don't hit page-size limits (see /api/logs/export/)"""
+        rows = queryset.order_by('timestamp', 'id').values_list(*LOG_EXPORT.paths)
+        response = StreamingHttpResponse(
+            streaming_content(request, stream_csv(LOG_EXPORT, rows)), content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = 'attachment; filename="agent_logs.csv"'
+        return response
     
     def target_short(self, obj):
         """Truncate target for display"""
@@ -70,6 +88,7 @@ class AgentLogAdmin(admin.ModelAdmin):
 class AgentMetricAdmin(admin.ModelAdmin):
     """Agent metrics and costs"""
     list_display = ['agent', 'tokens_used', 'cost', 'files_accessed', 'tool_calls', 'timestamp']
+    list_select_related = ['agent']
     list_filter = ['timestamp']
     search_fields = ['agent__name']
     readonly_fields = ['timestamp']
@@ -79,6 +98,17 @@ class AgentMetricAdmin(admin.ModelAdmin):
         # Metrics are usually auto-generated
         return request.user.is_superuser
 
+@admin.register(PolicyRule)
+class PolicyRuleAdmin(admin.ModelAdmin):
+    """Policy rules (changes reach every worker within POLICY_RELOAD_SECONDS)"""
+    list_display = ['__str__', 'agent', 'model', 'action', 'pattern_type', 'pattern', 'decision', 'priority', 'enabled']
+    list_select_related = ['agent']
+    list_filter = ['decision', 'pattern_type', 'enabled', 'model']
+    list_editable = ['priority', 'enabled']
+    search_fields = ['name', 'pattern', 'action', 'agent__name']
+    raw_id_fields = ['agent']
+    readonly_fields = ['created_at', 'updated_at']
+
 # Customize admin site
 admin.site.site_header = 'Agent Control Panel Admin'
 admin.site.site_title = 'Agent Control Panel'
@@ -0,0 +1,262 @@
+"""
+Agent Control Panel - Anomaly detection
+Flags agents whose behaviour suddenly changes, from streaming statistics
+updated as logs and metrics are ingested (core.signals). History is
+never queried. Each agent's profile has a fixed size, whatever the
+number of actions, targets or samples seen:
+
+- action bursts: per-minute action counts in a count-min sketch, with
+  an EWMA mean and variance per cell. An action whose count this minute
+  is ANOMALY_Z_THRESHOLD deviations above its usual rate is a burst
+  (e.g. a run of file_delete).
+- new targets: targets seen are kept in a Bloom filter, and an EWMA
+  tracks how often the agent touches new ones. A new target from an
+  agent that almost never does (novelty under ANOMALY_NOVELTY_RATE) is
+  flagged.
+- metric spikes: EWMA mean and variance of tokens_used and cost per
+  sample; a sample ANOMALY_Z_THRESHOLD deviations above is a spike.
+
+Detections are written as flagged AgentLog rows (action 'anomaly'),
+which the detector itself ignores. Each kind is reported at most once
+per ANOMALY_COOLDOWN_SECONDS per agent and subject. Profiles live in
+the worker that ingested the rows, start empty (ANOMALY_WARMUP
+observations before anything is flagged) and the least recently active
+are dropped beyond ANOMALY_MAX_AGENTS.
+"""
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import AgentLog
+
+ANOMALY_ACTION = 'anomaly'
+
+# Count-min sketch of per-minute action counts
+SKETCH_DEPTH = 4
+SKETCH_WIDTH = 64
+
+# Bloom filter of seen targets (8192 bits, 1 KB per agent)
+BLOOM_BITS = 8192
+BLOOM_HASHES = 3
+
+METRIC_FIELDS = ['tokens_used', 'cost']
+
+# Idle minutes folded into the baselines one by one; beyond this the
+# baselines have decayed to (almost) nothing anyway
+MAX_ROLLED_MINUTES = 60
+
+
+class EwmaStat:
+    """Exponentially weighted mean and variance of one series"""
+    __slots__ = ('mean', 'var', 'count')
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+
+    def z_score(self, value):
+        # The floor keeps near-constant series from flagging tiny changes
+        std = max(math.sqrt(self.var), 0.1 * abs(self.mean), 1e-9)
+        return (value - self.mean) / std
+
+    def update(self, value, alpha):
+        if not self.count:
+            self.mean = value
+        else:
+            diff = value - self.mean
+            self.mean += alpha * diff
+            self.var = (1 - alpha) * (self.var + alpha * diff * diff)
+        self.count += 1
+
+
+class ActionSketch:
+    """Count-min sketch of this minute's action counts with EWMA baselines per cell"""
+    __slots__ = ('current', 'mean', 'var', 'minute', 'minutes')
+
+    def __init__(self, minute):
+        size = SKETCH_DEPTH * SKETCH_WIDTH
+        self.current = array('d', bytes(8 * size))
+        self.mean = array('d', bytes(8 * size))
+        self.var = array('d', bytes(8 * size))
+        self.minute = minute
+        self.minutes = 0  # Minutes folded into the baselines
+
+    @staticmethod
+    def cells(action):
+        return [row * SKETCH_WIDTH + hash((row, action)) % SKETCH_WIDTH for row in range(SKETCH_DEPTH)]
+
+    def roll(self, minute, alpha):
+        """Fold finished minutes into the baselines"""
+        elapsed = min(minute - self.minute, MAX_ROLLED_MINUTES)
+        if elapsed <= 0:
+            return
+        current, mean, var = self.current, self.mean, self.var
+        for _ in range(elapsed):
+            for i in range(len(current)):
+                diff = current[i] - mean[i]
+                mean[i] += alpha * diff
+                var[i] = (1 - alpha) * (var[i] + alpha * diff * diff)
+                current[i] = 0.0
+        self.minute = minute
+        self.minutes += elapsed
+
+    def add(self, action):
+        """Count one action; returns (count this minute, usual mean, usual std)"""
+        cells = self.cells(action)
+        for cell in cells:
+            self.current[cell] += 1
+        # Collisions only ever add, so the smallest cell is the best estimate
+        cell = min(cells, key=self.current.__getitem__)
+        return self.current[cell], self.mean[cell], math.sqrt(self.var[cell])
+
+
+class TargetFilter:
+    """Bloom filter of targets an agent has touched"""
+    __slots__ = ('bits',)
+
+    def __init__(self):
+        self.bits = bytearray(BLOOM_BITS // 8)
+
+    def add(self, target):
+        """Record ``target``; returns whether it was (probably) new"""
+        first, second = hash(target), hash((target, 1)) | 1
+        new = False
+        for i in range(BLOOM_HASHES):
+            bit = (first + i * second) % BLOOM_BITS
+            byte, mask = bit >> 3, 1 << (bit & 7)
+            if not self.bits[byte] & mask:
+                new = True
+                self.bits[byte] |= mask
+        return new
+
+
+class AgentProfile:
+    """Everything the detector keeps about one agent (fixed size)"""
+    __slots__ = ('actions', 'targets', 'novelty', 'logs', 'metrics', 'reported')
+
+    def __init__(self, minute):
+        self.actions = ActionSketch(minute)
+        self.targets = TargetFilter()
+        self.novelty = 1.0  # EWMA of "this log's target was new"
+        self.logs = 0
+        self.metrics = {field: EwmaStat() for field in METRIC_FIELDS}
+        self.reported = {}  # (kind, subject) -> last reported (epoch seconds)
+
+    def should_report(self, kind, subject, now):
+        cooldown = settings.ANOMALY_COOLDOWN_SECONDS
+        if len(self.reported) > 32:
+            self.reported = {key: at for key, at in self.reported.items() if now - at < cooldown}
+        last = self.reported.get((kind, subject))
+        if last is not None and now - last < cooldown:
+            return False
+        self.reported[(kind, subject)] = now
+        return True
+
+
+class Detector:
+    """Per-agent profiles and the rules that turn observations into detections"""
+
+    def __init__(self):
+        self.profiles = OrderedDict()
+        self.lock = threading.Lock()
+
+    def profile(self, agent_id, minute):
+        profile = self.profiles.get(agent_id)
+        if profile is None:
+            profile = self.profiles[agent_id] = AgentProfile(minute)
+            while len(self.profiles) > settings.ANOMALY_MAX_AGENTS:
+                self.profiles.popitem(last=False)
+        else:
+            self.profiles.move_to_end(agent_id)
+        return profile
+
+    def observe_logs(self, logs, now=None):
+        """Update profiles with new AgentLog rows; returns unsaved detection logs"""
+        alpha, threshold = settings.ANOMALY_ALPHA, settings.ANOMALY_Z_THRESHOLD
+        warmup = settings.ANOMALY_WARMUP
+        now = time.time() if now is None else now
+        minute = int(now // 60)
+        detections = []
+        with self.lock:
+            for log in logs:
+                if log.action == ANOMALY_ACTION:
+                    continue
+                profile = self.profile(log.agent_id, minute)
+                profile.actions.roll(minute, alpha)
+                profile.logs += 1
+
+                count, mean, std = profile.actions.add(log.action)
+                z = (count - mean) / max(std, 1.0)
+                if (profile.actions.minutes >= warmup and count >= settings.ANOMALY_MIN_BURST
+                        and z >= threshold and profile.should_report('action_burst', log.action, now)):
+                    detections.append(self.detection(
+                        log.agent_id, 'action_burst', log.action, z, int(count), mean,
+                        f'{int(count)} {log.action} actions this minute (usually {mean:.1f})'
+                    ))
+
+                if log.target:
+                    new = profile.targets.add(log.target)
+                    if (new and profile.logs > warmup and profile.novelty < settings.ANOMALY_NOVELTY_RATE
+                            and profile.should_report('new_target', '', now)):
+                        detections.append(self.detection(
+                            log.agent_id, 'new_target', log.target, None, 1, profile.novelty,
+                            f'First {log.action} on {log.target}'
+                        ))
+                    profile.novelty += alpha * ((1.0 if new else 0.0) - profile.novelty)
+        return detections
+
+    def observe_metrics(self, metrics, now=None):
+        """Update profiles with new AgentMetric rows; returns unsaved detection logs"""
+        alpha, threshold = settings.ANOMALY_ALPHA, settings.ANOMALY_Z_THRESHOLD
+        now = time.time() if now is None else now
+        minute = int(now // 60)
+        detections = []
+        with self.lock:
+            for metric in metrics:
+                profile = self.profile(metric.agent_id, minute)
+                for field in METRIC_FIELDS:
+                    value = float(getattr(metric, field) or 0)
+                    stat = profile.metrics[field]
+                    z = stat.z_score(value)
+                    if (stat.count >= settings.ANOMALY_WARMUP and z >= threshold
+                            and profile.should_report('metric_spike', field, now)):
+                        detections.append(self.detection(
+                            metric.agent_id, 'metric_spike', field, z, value, stat.mean,
+                            f'{field} {value:g} in one sample (usually {stat.mean:.4g})'
+                        ))
+                    stat.update(value, alpha)
+        return detections
+
+    @staticmethod
+    def detection(agent_id, kind, subject, z, observed, expected, summary):
+        return AgentLog(
+            agent_id=agent_id,
+            action=ANOMALY_ACTION,
+            target=f'{kind}:{subject}',
+            status='flagged',
+            metadata={
+                'anomaly': kind,
+                'summary': summary,
+                'z_score': None if z is None else round(z, 2),
+                'observed': observed,
+                'expected': round(expected, 4),
+            },
+        )
+
+
+_detector = None
+_detector_lock = threading.Lock()
+
+
+def get_detector():
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                _detector = Detector()
+    return _detector
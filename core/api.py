@@ -6,21 +6,41 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import BrowsableAPIRenderer
+from django.conf import settings
+from django.db import DataError
 from django.db.models import Sum, Avg, Count, Q
+from django.utils.decorators import method_decorator
 from django.utils import timezone
 from datetime import timedelta
 import random
 import uuid
 
 from .models import Agent, AgentLog, AgentMetric
+from .events import publish
+from .fastpath import FastJSONRenderer, FastListMixin
+from .fleet import fleet_summary as build_fleet_summary, parse_summary_params
+from .db_routers import replica_reads
+from .counters import COUNTER_FIELDS, apply_deltas, get_counter_buffer
+from .heartbeats import get_heartbeat_buffer
+from .ingest import ingest_logs, MetricStreamIngestor
+from .pagination import AgentKeysetPagination, LogKeysetPagination
+from .limits import admit, limits_for, usage
+from .policy import get_engine
+from .parsers import NDJSONParser, get_body_stream, is_chunked, iter_ndjson, parse_chunked
+from .query_budget import query_budget
+from .timeseries import bucketed_series, parse_series_params, raw_series
+from .versions import agent_detail, bump_agents, conditional, tables
 from .serializers import (
     AgentSerializer, AgentSummarySerializer,
-    AgentLogSerializer, AgentMetricSerializer,
-    DashboardStatsSerializer
+    AgentLogSerializer, AgentCounterDeltaSerializer, PolicyDecisionRequestSerializer
 )
 
 
-class AgentViewSet(viewsets.ModelViewSet):
+@method_decorator(conditional(tables('agents')), name='list')
+@method_decorator(conditional(agent_detail), name='retrieve')
+class AgentViewSet(FastListMixin, viewsets.ModelViewSet):
     """
     Agent CRUD API
     
@@ -33,6 +53,14 @@ class AgentViewSet(viewsets.ModelViewSet):
     """
     serializer_class = AgentSerializer
     permission_classes = [AllowAny]  # TODO: Change to IsAuthenticated
+    pagination_class = AgentKeysetPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    query_budgets = {
+        'list': 1, 'retrieve': 1,
+        'heartbeats': 1, 'liveness': 0, 'increment': 2, 'increments': 1,
+        'timeseries': 3, 'limits': 2,
+    }
+    replica_actions = ('list', 'retrieve', 'timeseries')
     
     def get_queryset(self):
         queryset = Agent.objects.all()
@@ -47,6 +75,12 @@ class AgentViewSet(viewsets.ModelViewSet):
         if min_security:
             queryset = queryset.filter(security_score__gte=int(min_security))
         
+        if self.action == 'list':
+            # Summary rows only; skip the metadata JSON
+            queryset = queryset.only(
+                'id', 'name', 'status', 'security_score', 'last_active_at', 'created_at'
+            )
+        
         return queryset
     
     def get_serializer_class(self):
@@ -61,51 +95,222 @@ class AgentViewSet(viewsets.ModelViewSet):
         agent.last_active_at = timezone.now()
         agent.status = 'running'
         agent.save(update_fields=['last_active_at', 'status'])
+        publish('agent.heartbeat', {
+            'agent': str(agent.id),
+            'last_active_at': agent.last_active_at.isoformat()
+        })
         return Response({'status': 'ok', 'last_active_at': agent.last_active_at})
     
-    @action(detail=True, methods=['get'])
-    def logs(self, request, pk=None):
-        """Get recent logs for this agent"""
-        agent = self.get_object()
-        logs = agent.logs.all()[:50]
-        serializer = AgentLogSerializer(logs, many=True)
-        return Response(serializer.data)
+    @action(detail=False, methods=['post'])
+    def heartbeats(self, request):
+        """
+        POST /api/agents/heartbeats/
+        Batched heartbeats: {"agents": [id, ...]} or a bare list of ids.
+        Beats are buffered and written in batched UPDATEs every
+        HEARTBEAT_FLUSH_SECONDS; the request only checks (in one query)
+        which agents exist. Unknown ids are reported, not recorded.
+        """
+        agent_ids = request.data.get('agents') if isinstance(request.data, dict) else request.data
+        if not isinstance(agent_ids, list):
+            return Response(
+                {'error': 'Expected a list of agent ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        parsed, invalid = [], []
+        for agent_id in agent_ids:
+            try:
+                parsed.append(uuid.UUID(str(agent_id)))
+            except ValueError:
+                invalid.append(agent_id)
+        known = set(Agent.objects.filter(id__in=parsed).values_list('id', flat=True)) if parsed else set()
+        
+        buffer = get_heartbeat_buffer()
+        now = timezone.now()
+        accepted, unknown = 0, []
+        for agent_id in parsed:
+            if agent_id not in known:
+                unknown.append(str(agent_id))
+                continue
+            buffer.beat(agent_id, now)
+            accepted += 1
+            publish('agent.heartbeat', {'agent': str(agent_id), 'last_active_at': now.isoformat()})
+        
+        return Response({
+            'accepted': accepted,
+            'invalid': invalid,
+            'unknown': unknown,
+            'timestamp': now
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=False, methods=['get'])
+    def liveness(self, request):
+        """
+        GET /api/agents/liveness/?agent=<id>&agent=<id>
+        Staleness from recent heartbeats seen by this process (no database
+        access). Without ?agent= every recently seen agent is listed.
+        """
+        agent_ids = None
+        if request.query_params.getlist('agent'):
+            try:
+                agent_ids = [uuid.UUID(a) for a in request.query_params.getlist('agent')]
+            except ValueError:
+                return Response({'error': 'Invalid agent id'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'stale_after_seconds': settings.HEARTBEAT_STALE_SECONDS,
+            'agents': get_heartbeat_buffer().liveness(agent_ids)
+        })
     
     @action(detail=True, methods=['get'])
-    def metrics(self, request, pk=None):
-        """Get metrics for this agent"""
+    def limits(self, request, pk=None):
+        """
+        GET /api/agents/{id}/limits/
+        The agent's effective rate limit and cost budget with current
+        usage: actions available now and spend over the budget window.
+        """
         agent = self.get_object()
+        return Response(usage(agent.id, limits_for(agent.actions_per_minute, agent.cost_budget)))
+    
+    @action(detail=True, methods=['post'])
+    def increment(self, request, pk=None):
+        """
+        POST /api/agents/{id}/increment/
+        Atomically add to tasks_completed, tasks_failed, total_cost and
+        uptime_seconds, e.g. {"tasks_completed": 1, "total_cost": "0.0125"}.
+        With ?buffered=1 the delta is coalesced in memory and applied with
+        the next batch instead of immediately.
+        """
+        serializer = AgentCounterDeltaSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        delta = {field: serializer.validated_data[field] for field in COUNTER_FIELDS}
         
-        # Get time range
-        hours = int(request.query_params.get('hours', 24))
-        since = timezone.now() - timedelta(hours=hours)
+        try:
+            agent_id = uuid.UUID(str(pk))
+        except ValueError:
+            return Response({'error': 'Invalid agent id'}, status=status.HTTP_404_NOT_FOUND)
         
-        metrics = agent.metrics.filter(timestamp__gte=since)
+        if request.query_params.get('buffered'):
+            # Checked now: the flush has nobody to report a missing agent to
+            if not Agent.objects.filter(pk=agent_id).exists():
+                return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+            get_counter_buffer().add(agent_id, delta)
+            return Response({'status': 'queued'}, status=status.HTTP_202_ACCEPTED)
         
-        # Aggregate stats
-        stats = metrics.aggregate(
-            total_tokens=Sum('tokens_used'),
-            total_cost=Sum('cost'),
-            total_files=Sum('files_accessed'),
-            total_tools=Sum('tool_calls')
-        )
+        try:
+            applied = apply_deltas({agent_id: delta})
+        except (DataError, OverflowError):
+            return Response({'error': 'Counter out of range'}, status=status.HTTP_400_BAD_REQUEST)
+        if not applied:
+            return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+        counters = Agent.objects.filter(pk=agent_id).values(*COUNTER_FIELDS).first()
+        counters['total_cost'] = str(counters['total_cost'])  # Same as AgentSerializer
+        return Response(counters)
+    
+    @action(detail=False, methods=['post'])
+    def increments(self, request):
+        """
+        POST /api/agents/increments/
+        Batched deltas for many agents: {"deltas": [{"agent": id, ...}, ...]}.
+        Deltas for the same agent are summed in memory and applied with
+        one UPDATE per agent every COUNTER_FLUSH_SECONDS. Deltas for
+        unknown agents are reported in errors, not queued.
+        """
+        deltas = request.data.get('deltas') if isinstance(request.data, dict) else request.data
+        if not isinstance(deltas, list):
+            return Response(
+                {'error': 'Expected a list of deltas'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        valid = []
+        errors = []
+        for index, item in enumerate(deltas):
+            serializer = AgentCounterDeltaSerializer(data=item)
+            if not serializer.is_valid() or 'agent' not in serializer.validated_data:
+                errors.append({'index': index, 'errors': serializer.errors or {'agent': ['This field is required.']}})
+                continue
+            valid.append((index, serializer.validated_data))
+        
+        # One lookup for every agent in the batch
+        known = set(Agent.objects.filter(
+            id__in={data['agent'] for _, data in valid}
+        ).values_list('id', flat=True)) if valid else set()
+        
+        buffer = get_counter_buffer()
+        accepted = 0
+        for index, data in valid:
+            if data['agent'] not in known:
+                errors.append({
+                    'index': index,
+                    'errors': {'agent': [f'Invalid pk "{data["agent"]}" - object does not exist.']}
+                })
+                continue
+            buffer.add(data['agent'], {field: data[field] for field in COUNTER_FIELDS})
+            accepted += 1
+        errors.sort(key=lambda e: e['index'])
         
         return Response({
-            'agent_id': str(agent.id),
-            'period_hours': hours,
-            'totals': stats,
-            'recent': AgentMetricSerializer(metrics[:20], many=True).data
-        })
+            'accepted': accepted,
+            'failed': len(errors),
+            'errors': errors
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'])
+    def timeseries(self, request, pk=None):
+        """
+        GET /api/agents/{id}/timeseries/?field=cost&bucket=5m&since=24h
+        Bucketed count/sum/avg/p95 for one agent (see metrics_timeseries).
+        """
+        agent = self.get_object()
+        return Response(timeseries_response(request, agent.metrics.all()))
+    
+    @action(detail=True, methods=['post'], url_path='metrics/stream')
+    def metrics_stream(self, request, pk=None):
+        """
+        POST /api/agents/{id}/metrics/stream/
+        Ingest metric samples from a (chunked) NDJSON body, one sample per line.
+        Samples are written in size- or time-based batches while the body
+        is still being read, so one connection can carry a long session.
+        """
+        agent = self.get_object()
+        ingestor = MetricStreamIngestor(agent)
+        max_line_bytes = getattr(settings, 'AGENT_METRIC_STREAM_MAX_LINE_BYTES', 65536)
+        
+        lines = iter_ndjson(
+            get_body_stream(request),
+            max_line_bytes=max_line_bytes,
+            with_line_numbers=True
+        )
+        for line_number, record in lines:
+            ingestor.add(record, line_number=line_number)
+        ingestor.flush()
+        
+        return Response(ingestor.summary())
 
 
-class AgentLogViewSet(viewsets.ModelViewSet):
-    """Agent logs API"""
+@method_decorator(conditional(tables('logs')), name='list')
+@method_decorator(conditional(tables('logs')), name='retrieve')
+class AgentLogViewSet(FastListMixin, viewsets.ModelViewSet):
+    """
+    Agent logs API
+    
+    list: GET /api/logs/?cursor=... (newest first, keyset paginated)
+    tail: GET /api/logs/?since=... (only logs newer than the cursor)
+    """
     queryset = AgentLog.objects.all()
     serializer_class = AgentLogSerializer
     permission_classes = [AllowAny]
+    pagination_class = LogKeysetPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+    query_budgets = {'list': 1, 'retrieve': 1}
+    replica_actions = ('list', 'retrieve')
     
     def get_queryset(self):
-        queryset = AgentLog.objects.all()
+        # agent_name comes from the join, not a query per row
+        queryset = AgentLog.objects.select_related('agent').only(
+            'id', 'agent__name', 'timestamp', 'action', 'target', 'status', 'metadata'
+        )
         
         # Filter by agent
         agent_id = self.request.query_params.get('agent')
@@ -122,50 +327,187 @@ class AgentLogViewSet(viewsets.ModelViewSet):
         if action_type:
             queryset = queryset.filter(action__icontains=action_type)
         
-        return queryset[:100]
+        return queryset
+    
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        # Deletes don't go through logs_created; keep ETags honest
+        bump_agents([instance.agent_id], 'logs')
+    
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        POST /api/logs/bulk/?batch_size=500
+        Ingest many logs at once from a JSON array, {"logs": [...]} or NDJSON.
+        Valid records are written even if others fail; failures are
+        reported per record by their position in the batch.
+        """
+        if is_chunked(request):
+            records = parse_chunked(request, [JSONParser(), NDJSONParser()])
+        else:
+            records = request.data
+        if isinstance(records, dict):
+            records = records.get('logs')
+        if not isinstance(records, list):
+            return Response(
+                {'error': 'Expected a list of log records'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        max_records = getattr(settings, 'AGENT_LOG_BULK_MAX_RECORDS', 10000)
+        if len(records) > max_records:
+            return Response(
+                {'error': f'Batch exceeds {max_records} records'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        
+        logs, errors = ingest_logs(records, batch_size=request.query_params.get('batch_size'))
+        
+        return Response({
+            'received': len(records),
+            'created': len(logs),
+            'failed': len(errors),
+            'errors': errors
+        }, status=status.HTTP_400_BAD_REQUEST if records and not logs else status.HTTP_200_OK)
+
+
+def timeseries_response(request, queryset):
+    """Shared body of the per-agent and fleet time-series endpoints"""
+    params = parse_series_params(request.query_params)
+    field, since, until = params['field'], params['since'], params['until']
+    body = {
+        'field': field,
+        'since': since,
+        'until': until,
+    }
+    
+    if request.query_params.get('raw'):
+        points, samples = raw_series(queryset, field, since, until, params['points'])
+        body.update({'samples': samples, 'points': points})
+    else:
+        body.update({
+            'bucket_seconds': params['bucket_seconds'],
+            'points': bucketed_series(queryset, field, params['bucket_seconds'], since, until)
+        })
+    return body
 
 
+@replica_reads
+@query_budget(2)
 @api_view(['GET'])
-def dashboard_stats(request):
+def metrics_timeseries(request):
     """
-    GET /api/dashboard/stats/
-    Returns aggregated dashboard statistics
+    GET /api/metrics/timeseries/?field=cost&bucket=5m&since=24h
+    Fleet-wide metric series in fixed-width buckets (count/sum/avg/p95),
+    optionally filtered by ?agent=<id> (repeatable) and ?model=<name>.
+    ?raw=1&points=300 returns raw samples downsampled with LTTB instead.
     """
-    now = timezone.now()
-    hour_ago = now - timedelta(hours=1)
-    
-    agents = Agent.objects.all()
-    
-    stats = {
-        'total_agents': agents.count(),
-        'active_agents': agents.filter(
-            Q(status='running') | Q(last_active_at__gte=hour_ago)
-        ).count(),
-        'total_cost': float(agents.aggregate(total=Sum('total_cost'))['total'] or 0),
-        'avg_security_score': float(agents.aggregate(avg=Avg('security_score'))['avg'] or 100),
-        'recent_alerts': AgentLog.objects.filter(
-            status='blocked',
-            timestamp__gte=hour_ago
-        ).count()
-    }
+    queryset = AgentMetric.objects.all()
+    
+    agent_ids = request.query_params.getlist('agent')
+    if agent_ids:
+        queryset = queryset.filter(agent_id__in=agent_ids)
     
-    serializer = DashboardStatsSerializer(stats)
-    return Response(serializer.data)
+    model = request.query_params.get('model')
+    if model:
+        queryset = queryset.filter(agent__model=model)
+    
+    return Response(timeseries_response(request, queryset))
 
 
+# Totals and the top N when fresh; a refresh adds two GROUP BYs and the upsert
+@query_budget(8)
 @api_view(['GET'])
-def health_check(request):
+def fleet_summary(request):
     """
-    GET /api/health/
-    Simple health check for monitoring
+    GET /api/fleet/summary/?group_by=model&order=cost_last_hour&top=10
+    Fleet totals grouped by model, status, user or plan with per-hour
+    rates, top-N groups first. Served from the fleet_summary table,
+    which is re-aggregated when agents or metrics change (see core.fleet).
     """
+    params = parse_summary_params(request.query_params)
+    body = build_fleet_summary(params['group_by'], params['ordering'], params['top'])
+    
     return Response({
-        'status': 'healthy',
-        'timestamp': timezone.now().isoformat(),
-        'version': '0.2.0'
+        'group_by': params['group_by'],
+        'order': params['order'],
+        **body,
     })
 
 
+# Agent lookup, plus checking the rule-set version (at most every
+# POLICY_RELOAD_SECONDS), loading the rules after they changed and
+# seeding cold cost budgets
+@query_budget(4)
+@api_view(['POST'])
+def policy_decide(request):
+    """
+    POST /api/policy/decide/
+    Decide {"agent": <id>, "action": "file_read", "target": "/etc/passwd"}
+    against the policy rules, or a batch given as {"actions": [...]}.
+    The agent's model selects its model rules; without an agent, pass
+    "model" to evaluate model and global rules only. Actions the rules
+    let through are then checked against the agent's rate limit and
+    cost budget (core.limits); a refused one comes back blocked with
+    "limit": {"type": "rate" | "budget", "retry_after": <seconds>}.
+    """
+    batch = isinstance(request.data, dict) and 'actions' in request.data
+    items = request.data.get('actions') if batch else [request.data]
+    if not isinstance(items, list):
+        return Response({'error': 'Expected a list of actions'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > settings.POLICY_MAX_BATCH:
+        return Response(
+            {'error': f'Batch exceeds {settings.POLICY_MAX_BATCH} actions'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    
+    checked = [PolicyDecisionRequestSerializer(data=item) for item in items]
+    valid = [serializer for serializer in checked if serializer.is_valid()]
+    
+    # One lookup for the model and limits of every agent in the batch
+    agent_ids = {serializer.validated_data.get('agent') for serializer in valid} - {None}
+    agents = {
+        agent_id: (model, limits_for(actions_per_minute, cost_budget))
+        for agent_id, model, actions_per_minute, cost_budget in Agent.objects.filter(
+            id__in=agent_ids
+        ).values_list('id', 'model', 'actions_per_minute', 'cost_budget')
+    } if agent_ids else {}
+    
+    engine = get_engine()
+    results = []
+    decided = []
+    for serializer in checked:
+        if serializer.errors:
+            results.append({'errors': serializer.errors})
+            continue
+        data = serializer.validated_data
+        agent_id = data.get('agent')
+        if agent_id is not None and agent_id not in agents:
+            results.append({'errors': {'agent': [f'Invalid pk "{agent_id}" - object does not exist.']}})
+            continue
+        model = data.get('model') or (agents[agent_id][0] if agent_id else '')
+        decision, rule = engine.decide(data['action'], data['target'], agent_id, model)
+        result = {
+            'decision': decision,
+            'rule': rule and {'id': rule.id, 'name': rule.name, 'priority': rule.priority},
+        }
+        results.append(result)
+        decided.append((result, agent_id, agents[agent_id][1] if agent_id else None))
+    
+    # Allowed and flagged actions still have to fit the agent's limits
+    refused = admit([(agent_id, agent_limits, result['decision']) for result, agent_id, agent_limits in decided])
+    for (result, _, _), allowance in zip(decided, refused):
+        if allowance is not None:
+            result['decision'] = 'blocked'
+            result['limit'] = {'type': allowance.limit, 'retry_after': allowance.retry_after}
+    
+    if batch:
+        return Response({'decisions': results})
+    if 'errors' in results[0]:
+        return Response(results[0]['errors'], status=status.HTTP_400_BAD_REQUEST)
+    return Response(results[0])
+
+
 @api_view(['GET'])
 def simulate_agents(request):
     """
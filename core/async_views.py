@@ -0,0 +1,123 @@
+"""
+Agent Control Panel - Async read endpoints
+The hottest polled reads as native async views, so under ASGI
+(SERVER_MODE=asgi in start.sh) a worker serves many of them concurrently
+on its event loop instead of queueing them on one sync thread. Queries
+go through the async ORM; responses are rendered with the same renderer
+as the DRF views, so the wire format is unchanged.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_safe
+
+from .db_routers import replica_reads
+from .fastpath import FastJSONRenderer, get_fast_serializer
+from .models import Agent
+from .query_budget import query_budget
+from .rollups import arollup_totals
+from .serializers import AgentLogSerializer, AgentMetricSerializer, DashboardStatsSerializer
+from .stats import aget_dashboard_stats
+from .versions import agent_detail, conditional, tables
+
+
+def _json(data, status=200):
+    return HttpResponse(
+        FastJSONRenderer().render(data), content_type='application/json', status=status
+    )
+
+
+async def _get_agent(pk):
+    try:
+        return await Agent.objects.aget(pk=pk)
+    except Agent.DoesNotExist:
+        return None
+
+
+def _not_found():
+    return _json({'detail': 'Not found.'}, status=404)
+
+
+@query_budget(0)
+@require_safe
+async def health_check(request):
+    """
+    GET /api/health/
+    Simple health check for monitoring
+    """
+    return _json({
+        'status': 'healthy',
+        'timestamp': timezone.now().isoformat(),
+        'version': '0.2.0'
+    })
+
+
+@replica_reads
+@query_budget(2)
+@conditional(tables('agents', 'logs'), period=settings.DASHBOARD_STATS_TTL)
+@require_safe
+async def dashboard_stats(request):
+    """
+    GET /api/dashboard/stats/
+    Returns aggregated dashboard statistics (cached, see core.stats).
+    Sends an ETag; unchanged polls get 304 (see core.versions).
+    """
+    stats = await aget_dashboard_stats()
+    return _json(DashboardStatsSerializer(stats).data)
+
+
+@replica_reads
+@query_budget(2)
+@conditional(agent_detail)
+@require_safe
+async def agent_logs(request, pk):
+    """
+    GET /api/agents/{id}/logs/
+    Get recent logs for this agent
+    """
+    agent = await _get_agent(pk)
+    if agent is None:
+        return _not_found()
+    # The related manager hands every log this agent instance, so
+    # agent_name needs no extra query
+    logs = [log async for log in agent.logs.all()[:50]]
+    return _json(AgentLogSerializer(logs, many=True).data)
+
+
+@replica_reads
+@query_budget(4)
+@conditional(agent_detail, period=60)
+@require_safe
+async def agent_metrics(request, pk):
+    """
+    GET /api/agents/{id}/metrics/?hours=24
+    Get metrics for this agent
+    """
+    agent = await _get_agent(pk)
+    if agent is None:
+        return _not_found()
+
+    # Get time range
+    hours = int(request.GET.get('hours', 24))
+    now = timezone.now()
+    since = now - timedelta(hours=hours)
+
+    metrics = agent.metrics.filter(timestamp__gte=since)
+
+    # Aggregate stats from rollups; raw rows only for partial minutes
+    stats = await arollup_totals(agent.id, since, now)
+
+    if settings.FAST_LIST_SERIALIZATION:
+        fast = get_fast_serializer(AgentMetricSerializer)
+        recent = fast.serialize([row async for row in metrics.values_list(*fast.paths)[:20]])
+    else:
+        recent = AgentMetricSerializer([metric async for metric in metrics[:20]], many=True).data
+
+    return _json({
+        'agent_id': str(agent.id),
+        'period_hours': hours,
+        'totals': stats,
+        'recent': recent
+    })
@@ -0,0 +1,115 @@
+"""
+Agent Control Panel - Write coalescing buffers
+High-frequency writes (heartbeats, counters) are merged in memory per key
+and written in one batch every few seconds instead of once per request.
+
+Buffers are per process: each worker flushes its own writes, and a
+pending batch is lost if the process is killed before it flushes.
+
+A batch that fails to write is retried key by key, so one bad value
+can't hold up everyone else's: keys that still fail are logged and
+dropped. Only when the database can't be reached is the batch kept for
+the next flush.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.db import InterfaceError, OperationalError, close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescingBuffer:
+    """
+    Thread-safe buffer of pending writes keyed by id.
+
+    Subclasses implement ``merge`` (combine a new value with the pending
+    one) and ``write`` (persist a whole batch, atomically: a failed write
+    must leave nothing applied). A batch is flushed when
+    ``max_pending`` keys have accumulated, or every ``interval`` seconds
+    by a background thread started on first use.
+    """
+
+    def __init__(self, interval, max_pending):
+        self.interval = interval
+        self.max_pending = max_pending
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flusher = None
+        atexit.register(self.flush)
+
+    def merge(self, current, value):
+        raise NotImplementedError
+
+    def write(self, batch):
+        raise NotImplementedError
+
+    def add(self, key, value):
+        with self.lock:
+            self.pending[key] = self.merge(self.pending.get(key), value)
+            full = len(self.pending) >= self.max_pending
+        self._ensure_flusher()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Write everything pending; returns the number of keys written"""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+            try:
+                self.write(batch)
+            except (OperationalError, InterfaceError):
+                logger.exception('%s flush failed; keeping %d pending keys',
+                                 type(self).__name__, len(batch))
+                self.requeue(batch)
+                return 0
+            except Exception:
+                logger.exception('%s flush failed; retrying %d keys one by one',
+                                 type(self).__name__, len(batch))
+                return self.write_each(batch)
+            return len(batch)
+
+    def write_each(self, batch):
+        """Write keys one at a time, dropping those that fail"""
+        items = list(batch.items())
+        written = 0
+        for i, (key, value) in enumerate(items):
+            try:
+                self.write({key: value})
+            except (OperationalError, InterfaceError):
+                logger.exception('%s flush failed; keeping %d pending keys',
+                                 type(self).__name__, len(items) - i)
+                self.requeue(dict(items[i:]))
+                break
+            except Exception:
+                logger.exception('%s dropped pending write for %s: %r', type(self).__name__, key, value)
+            else:
+                written += 1
+        return written
+
+    def requeue(self, batch):
+        with self.lock:
+            for key, value in batch.items():
+                self.pending[key] = self.merge(self.pending.get(key), value)
+
+    def _ensure_flusher(self):
+        if self.flusher is not None:
+            return
+        with self.lock:
+            if self.flusher is None:
+                self.flusher = threading.Thread(
+                    target=self._run, name=f'{type(self).__name__}-flusher', daemon=True
+                )
+                self.flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            close_old_connections()
+            self.flush()
@@ -0,0 +1,35 @@
+"""
+Agent Control Panel - System checks
+Warn about cache setups that only behave correctly in a single process.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+from . import versions
+
+
+@register(Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    errors = []
+    if settings.WEB_CONCURRENCY > 1 and versions.is_local():
+        errors.append(Warning(
+            f"The 'stats' cache is per worker (locmem) with WEB_CONCURRENCY={settings.WEB_CONCURRENCY}.",
+            hint=(
+                "Workers don't see each other's change versions, so conditional GETs may "
+                "answer 304 for up to VERSIONS_LOCAL_PERIOD seconds after a write (for as "
+                "long as the worker runs if it is 0). Set STATS_CACHE_BACKEND=file or db."
+            ),
+            id='core.W001',
+        ))
+    if settings.WEB_CONCURRENCY > 1 and isinstance(caches['limits'], LocMemCache):
+        errors.append(Warning(
+            f"The 'limits' cache is per worker (locmem) with WEB_CONCURRENCY={settings.WEB_CONCURRENCY}.",
+            hint=(
+                'Each worker enforces agent rate limits and cost budgets on its own, so an agent '
+                'can get up to WEB_CONCURRENCY times its limits. Set LIMITS_CACHE_BACKEND=redis.'
+            ),
+            id='core.W002',
+        ))
+    return errors
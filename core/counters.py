@@ -0,0 +1,78 @@
+"""
+Agent Control Panel - Atomic agent counters
+Applies increments to the running totals on Agent with F() expressions,
+so concurrent reporters never overwrite each other's updates.
+"""
+import threading
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .buffers import CoalescingBuffer
+from .models import Agent
+from . import fleet, stats, versions
+
+COUNTER_FIELDS = ['tasks_completed', 'tasks_failed', 'total_cost', 'uptime_seconds']
+
+
+def merge_deltas(current, delta):
+    merged = dict(current or {})
+    for field, value in delta.items():
+        merged[field] = merged.get(field, 0) + value
+    return merged
+
+
+def apply_deltas(deltas):
+    """
+    Apply {agent_id: {field: delta}} as one UPDATE ... SET f = f + delta
+    per agent, all in one transaction. Returns the number of agents updated.
+    """
+    updated = []
+    cost_change = Decimal('0')
+    with transaction.atomic():
+        for agent_id, delta in deltas.items():
+            changes = {field: F(field) + value for field, value in delta.items() if value}
+            if not changes:
+                continue
+            if Agent.objects.filter(pk=agent_id).update(**changes):
+                updated.append(agent_id)
+                cost_change += delta.get('total_cost', 0)
+
+    # update() bypasses signals, so adjust the dashboard snapshot directly
+    if cost_change:
+        stats.apply_delta(total_cost=float(cost_change))
+    if updated:
+        fleet.mark_changed(updated)
+        versions.bump_agents(updated, 'agents')
+    return len(updated)
+
+
+class CounterBuffer(CoalescingBuffer):
+    """Sums deltas per agent in memory and applies them in batches"""
+
+    def __init__(self, interval=None, max_pending=None):
+        super().__init__(
+            interval or settings.COUNTER_FLUSH_SECONDS,
+            max_pending or settings.COUNTER_MAX_PENDING,
+        )
+
+    def merge(self, current, value):
+        return merge_deltas(current, value)
+
+    def write(self, batch):
+        apply_deltas(batch)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_counter_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = CounterBuffer()
+    return _buffer
@@ -0,0 +1,165 @@
+"""
+Agent Control Panel - Read replica routing
+Read-only endpoints opt in with @replica_reads (function views) or
+``replica_actions`` (viewsets). While one of them handles a GET, reads
+of core models go to the 'replica' database alias (when configured, see
+DATABASE_REPLICA_URL); everything else, and every write, uses the
+primary.
+
+Read-your-writes: once a request has written, its later reads use the
+primary, and a request that changed data pins the client to the primary
+with a short-lived cookie (REPLICA_STICKY_SECONDS), so its next reads
+don't race replication lag. Versioned views (core.versions) also read
+from the primary while their data changed within that window, so no
+client pairs a new ETag with rows the replica doesn't have yet.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import Resolver404, get_resolver
+
+REPLICA = 'replica'
+PIN_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+
+class Routing:
+    """Routing state of one request (shared with threads the ORM runs on)"""
+
+    def __init__(self, use_replica):
+        self.use_replica = use_replica
+        self.wrote = False
+
+
+@contextmanager
+def replica_routing(use_replica=True):
+    """Route reads in this block (and its sync_to_async calls) per Routing"""
+    state = Routing(use_replica)
+    token = _routing.set(state)
+    try:
+        yield state
+    finally:
+        _routing.reset(token)
+
+
+def replica_available():
+    return REPLICA in settings.DATABASES
+
+
+def note_change(changed_at):
+    """
+    Called with the time (epoch seconds) the data a request serves last
+    changed: a recent change sends the request's reads to the primary.
+    """
+    state = _routing.get()
+    if state is not None and time.time() - changed_at < settings.REPLICA_STICKY_SECONDS:
+        state.use_replica = False
+
+
+def replica_reads(view):
+    """Mark a function view as read-only (apply above @api_view)"""
+    view.replica_reads = True
+    return view
+
+
+def routes_to_replica(view_func, method):
+    """
+    Whether ``view_func`` handling ``method`` may read from the replica.
+    Viewsets list their read-only actions in ``replica_actions``.
+    """
+    if getattr(view_func, 'replica_reads', False):
+        return True
+    view_class = getattr(view_func, 'cls', None)
+    actions = getattr(view_func, 'actions', None)
+    if view_class is None or not actions:
+        return False
+    return actions.get(method.lower()) in getattr(view_class, 'replica_actions', ())
+
+
+class ReplicaRouter:
+    """
+    Sends reads of core models to the replica inside replica_routing().
+    Cache tables, sessions and other apps always stay on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is None or not state.use_replica or state.wrote:
+            return None
+        if model._meta.app_label != 'core':
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction must see its writes
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None and model._meta.app_label == 'core':
+            state.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Opens replica_routing() for each request and sets the pin cookie
+    after a write. A no-op unless a replica is configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replica_available():
+            return self.get_response(request)
+        with replica_routing(self.use_replica(request)) as state:
+            response = self.get_response(request)
+        return self.pin(request, response, state)
+
+    async def __acall__(self, request):
+        if not replica_available():
+            return await self.get_response(request)
+        with replica_routing(self.use_replica(request)) as state:
+            response = await self.get_response(request)
+        return self.pin(request, response, state)
+
+    def use_replica(self, request):
+        if request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES:
+            return False
+        try:
+            match = get_resolver(getattr(request, 'urlconf', None)).resolve(request.path_info)
+        except Resolver404:
+            return False
+        return routes_to_replica(match.func, request.method)
+
+    def pin(self, request, response, state):
+        if state.wrote and request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+import json
+import uuid
+
+from .events import get_broker
+
+
+def _matches(event, filters):
+    """Apply AgentLogViewSet-style filters (agent, status, action)"""
+    data = event.data
+    if filters['agent'] and data.get('agent') != filters['agent']:
+        return False
+    if event.type == 'log':
+        if filters['status'] and data.get('status') != filters['status']:
+            return False
+        if filters['action'] and filters['action'] not in data.get('action', '').lower():
+            return False
+    return True
+
+
+def _format(event):
+    payload = json.dumps(event.data, cls=DjangoJSONEncoder)
+    return f'id: {event.id}\nevent: {event.type}\ndata: {payload}\n\n'
+
+
+async def event_stream(request):
+    """
+    GET /api/events/?agent=<id>&status=blocked&action=file
+    Server-Sent Events feed of new logs ('log'), status transitions
+    ('agent.status') and heartbeats ('agent.heartbeat').
+    Resumes after the Last-Event-ID header when the event is still buffered.
+    Every response opens with a 'ready' event whose data says whether the
+    connection stays open ({"live": true}), so clients of a WSGI server
+    can poll instead of reconnecting.
+
+    Needs the ASGI app (backend.asgi, SERVER_MODE=asgi in start.sh) to
+    hold connections open; the view is async, so an open feed holds no
+    thread. Under WSGI the buffered backlog is sent and the connection
+    closed; a client that ignores 'ready' reconnects after the retry
+    interval. Events are kept per worker (core.events), so a reconnect
+    that lands on another worker resumes from "now": clients should
+    refetch what they show whenever the feed (re)opens.
+    """
+    agent = request.GET.get('agent')
+    if agent:
+        try:
+            agent = str(uuid.UUID(agent))
+        except ValueError:
+            return JsonResponse({'agent': ['Must be an agent id (UUID)']}, status=400)
+
+    broker = get_broker()
+    live_feed = isinstance(request, ASGIRequest)
+    filters = {
+        'agent': agent,
+        'status': request.GET.get('status'),
+        'action': (request.GET.get('action') or '').lower(),
+    }
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    cursor = broker.cursor(last_event_id)
+    retry_ms = getattr(settings, 'EVENT_STREAM_RETRY_MS', 3000)
+    keepalive = getattr(settings, 'EVENT_STREAM_KEEPALIVE_SECONDS', 15)
+
+    def backlog(seq):
+        events = broker.since(seq)
+        chunks = [_format(event) for event in events if _matches(event, filters)]
+        return chunks, (events[-1].seq if events else seq)
+
+    # A data-less block only moves the client's Last-Event-ID forward, so a
+    # reconnect resumes from here even if no matching event was sent
+    def position(seq):
+        return f'retry: {retry_ms}\nid: {broker.event_id(seq)}\n\n'
+
+    ready = f'event: ready\ndata: {json.dumps({"live": live_feed})}\n\n'
+
+    async def live():
+        seq = cursor
+        yield ready + position(seq)
+        while True:
+            chunks, seq = backlog(seq)
+            for chunk in chunks:
+                yield chunk
+            if not await broker.wait(seq, keepalive):
+                yield position(seq)
+
+    def replay():
+        chunks, seq = backlog(cursor)
+        yield ready
+        yield from chunks
+        yield position(seq)
+
+    stream = live() if live_feed else replay()
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,125 @@
+"""
+Agent Control Panel - Live event feed
+Publish/subscribe for log, agent status and heartbeat events. The
+in-process broker can be swapped for a shared one via EVENT_BROKER.
+"""
+import asyncio
+import threading
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Event:
+    """A published event; ``id`` is an opaque, resumable cursor"""
+
+    __slots__ = ('id', 'seq', 'type', 'data')
+
+    def __init__(self, id, seq, type, data):
+        self.id = id
+        self.seq = seq
+        self.type = type
+        self.data = data
+
+
+class InProcessBroker:
+    """
+    Keeps the most recent events in a ring buffer and wakes waiting
+    subscribers when new ones arrive.
+
+    Events are only visible to clients connected to the same process.
+    Event ids embed a per-process token so a Last-Event-ID from another
+    process (or before a restart) resumes from "now" instead of
+    replaying the wrong history.
+    """
+
+    def __init__(self, history=None):
+        self.history = deque(maxlen=history or getattr(settings, 'EVENT_HISTORY_SIZE', 1000))
+        self.token = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.waiters = set()
+
+    def publish(self, type, data):
+        with self.lock:
+            self.seq += 1
+            event = Event(self.event_id(self.seq), self.seq, type, data)
+            self.history.append(event)
+            waiters = list(self.waiters)
+
+        for loop, flag in waiters:
+            try:
+                loop.call_soon_threadsafe(flag.set)
+            except RuntimeError:
+                # Subscriber's event loop already closed
+                self.waiters.discard((loop, flag))
+        return event
+
+    def event_id(self, seq):
+        return f'{self.token}-{seq}'
+
+    def cursor(self, last_event_id=None):
+        """Sequence number to resume after, given a client's Last-Event-ID"""
+        token, _, seq = (last_event_id or '').partition('-')
+        if token == self.token and seq.isdigit():
+            return int(seq)
+        return self.seq
+
+    def since(self, seq):
+        """Buffered events newer than ``seq``, oldest first"""
+        with self.lock:
+            if seq >= self.seq:
+                return []
+            return [event for event in self.history if event.seq > seq]
+
+    async def wait(self, seq, timeout):
+        """Wait until an event newer than ``seq`` exists; False on timeout"""
+        if self.seq > seq:
+            return True
+        flag = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), flag)
+        with self.lock:
+            self.waiters.add(waiter)
+        try:
+            if self.seq > seq:
+                return True
+            await asyncio.wait_for(flag.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self.lock:
+                self.waiters.discard(waiter)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_class = import_string(
+                    getattr(settings, 'EVENT_BROKER', 'core.events.InProcessBroker')
+                )
+                _broker = broker_class()
+    return _broker
+
+
+def publish(type, data):
+    return get_broker().publish(type, data)
+
+
+def log_event_data(log):
+    return {
+        'id': log.id,
+        'agent': str(log.agent_id),
+        'timestamp': log.timestamp.isoformat() if log.timestamp else None,
+        'action': log.action,
+        'target': log.target,
+        'status': log.status,
+    }
@@ -0,0 +1,376 @@
+"""
+Agent Control Panel - Bulk export
+Streams agent_logs / agent_metrics rows in chunks read with
+QuerySet.iterator(), so an export of millions of rows only ever holds one
+chunk in memory (on PostgreSQL the chunks come from a server-side
+cursor). The output format is negotiated from ?format= or the Accept
+header, see FORMATS, and compressed on the fly when the client accepts
+gzip.
+
+Columnar formats send each chunk as column arrays. Low-cardinality
+columns (agent, action, status) are dictionary-encoded: a chunk carries
+integer codes plus the dictionary entries first used in that chunk, and
+codes index the dictionary accumulated over all chunks so far.
+"""
+import csv
+import io
+import json
+import re
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from rest_framework.exceptions import ValidationError
+
+from .fastpath import orjson
+from .models import AgentLog, AgentMetric
+from .timeseries import parse_moment
+
+try:
+    import msgpack
+except ImportError:  # Optional binary format
+    msgpack = None
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class ExportSpec:
+    """
+    What to export from a model: ``columns`` are (name, values_list path,
+    encoding) with encoding one of 'plain', 'dictionary', 'epoch_us'
+    (datetime as integer microseconds since the Unix epoch) or 'decimal'
+    (exact decimal string).
+    """
+
+    def __init__(self, model, columns, filename):
+        self.model = model
+        self.columns = columns
+        self.filename = filename
+
+    @property
+    def names(self):
+        return [name for name, _, _ in self.columns]
+
+    @property
+    def paths(self):
+        return [path for _, path, _ in self.columns]
+
+
+LOG_EXPORT = ExportSpec(AgentLog, [
+    ('id', 'id', 'plain'),
+    ('timestamp', 'timestamp', 'epoch_us'),
+    ('agent', 'agent_id', 'dictionary'),
+    ('action', 'action', 'dictionary'),
+    ('target', 'target', 'plain'),
+    ('status', 'status', 'dictionary'),
+    ('metadata', 'metadata', 'plain'),
+], 'agent_logs')
+
+METRIC_EXPORT = ExportSpec(AgentMetric, [
+    ('id', 'id', 'plain'),
+    ('timestamp', 'timestamp', 'epoch_us'),
+    ('agent', 'agent_id', 'dictionary'),
+    ('tokens_used', 'tokens_used', 'plain'),
+    ('cost', 'cost', 'decimal'),
+    ('files_accessed', 'files_accessed', 'plain'),
+    ('tool_calls', 'tool_calls', 'plain'),
+    ('metadata', 'metadata', 'plain'),
+], 'agent_metrics')
+
+
+def export_queryset(spec, params):
+    """
+    Rows of ``spec`` oldest first, filtered by ?since=&until= (ISO or e.g.
+    '7d'), ?agent= (repeatable) and, for logs, ?status=.
+    """
+    queryset = spec.model.objects.all()
+
+    since = parse_moment(params.get('since'), None, 'since')
+    until = parse_moment(params.get('until'), None, 'until')
+    if since is not None:
+        queryset = queryset.filter(timestamp__gte=since)
+    if until is not None:
+        queryset = queryset.filter(timestamp__lt=until)
+
+    agent_ids = params.getlist('agent')
+    if agent_ids:
+        try:
+            agent_ids = [uuid.UUID(agent_id) for agent_id in agent_ids]
+        except ValueError:
+            raise ValidationError({'agent': 'Must be agent ids (UUIDs)'})
+        queryset = queryset.filter(agent_id__in=agent_ids)
+
+    log_status = params.get('status')
+    if log_status:
+        if spec.model is not AgentLog:
+            raise ValidationError({'status': 'Only log exports can be filtered by status'})
+        queryset = queryset.filter(status=log_status)
+
+    return queryset.order_by('timestamp', 'id').values_list(*spec.paths)
+
+
+def iter_chunks(queryset, size=None):
+    """Lists of up to ``size`` rows, fetched ``size`` at a time"""
+    size = size or settings.EXPORT_CHUNK_SIZE
+    rows = queryset.iterator(chunk_size=size)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def epoch_us(value):
+    return (value - EPOCH) // MICROSECOND
+
+
+def _dictionary_value(value):
+    # Agent ids are UUIDs; everything else dictionary-encoded is a string
+    return value if isinstance(value, str) or value is None else str(value)
+
+
+class ColumnarEncoder:
+    """Turns row chunks into column arrays, keeping dictionaries across chunks"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.dictionaries = {
+            name: {} for name, _, encoding in spec.columns if encoding == 'dictionary'
+        }
+        self.rows = 0
+
+    def header(self):
+        return {
+            'format': 'columnar',
+            'version': 1,
+            'table': self.spec.model._meta.db_table,
+            'columns': [
+                {'name': name, 'encoding': encoding} for name, _, encoding in self.spec.columns
+            ],
+        }
+
+    def encode(self, rows):
+        chunk = {'rows': len(rows), 'dictionary': {}, 'columns': {}}
+        for (name, _, encoding), values in zip(self.spec.columns, zip(*rows)):
+            if encoding == 'dictionary':
+                codes = self.dictionaries[name]
+                added = []
+                encoded = []
+                for value in values:
+                    code = codes.get(value)
+                    if code is None:
+                        code = codes[value] = len(codes)
+                        added.append(_dictionary_value(value))
+                    encoded.append(code)
+                if added:
+                    chunk['dictionary'][name] = added
+                values = encoded
+            elif encoding == 'epoch_us':
+                values = [None if value is None else epoch_us(value) for value in values]
+            elif encoding == 'decimal':
+                values = [None if value is None else str(value) for value in values]
+            else:
+                values = list(values)
+            chunk['columns'][name] = values
+        self.rows += len(rows)
+        return chunk
+
+    def trailer(self):
+        return {'rows': self.rows}
+
+
+def _json_dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def stream_columnar_json(spec, queryset):
+    """
+    One JSON document, written chunk by chunk:
+    {"format": "columnar", ..., "chunks": [{rows, dictionary, columns}, ...], "rows": N}
+    """
+    encoder = ColumnarEncoder(spec)
+    yield _json_dumps(encoder.header())[:-1] + b',"chunks":['
+    for index, rows in enumerate(iter_chunks(queryset)):
+        yield (b',' if index else b'') + _json_dumps(encoder.encode(rows))
+    yield b'],' + _json_dumps(encoder.trailer())[1:]
+
+
+def stream_msgpack(spec, queryset):
+    """
+    A sequence of MessagePack maps (read with msgpack.Unpacker): the
+    header, one map per chunk, then {"rows": N}.
+    """
+    encoder = ColumnarEncoder(spec)
+    packer = msgpack.Packer(datetime=False)
+    yield packer.pack(encoder.header())
+    for rows in iter_chunks(queryset):
+        yield packer.pack(encoder.encode(rows))
+    yield packer.pack(encoder.trailer())
+
+
+def iso_datetime(value):
+    """Datetime as the API writes it (DRF style, UTC with a Z suffix)"""
+    text = value.astimezone(dt_timezone.utc).isoformat()
+    return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+
+ROW_CONVERTERS = {
+    'plain': None,
+    'dictionary': _dictionary_value,
+    'epoch_us': iso_datetime,
+    'decimal': str,
+}
+
+
+def _row_converters(spec):
+    return [
+        (index, ROW_CONVERTERS[encoding]) for index, (_, _, encoding) in enumerate(spec.columns)
+        if ROW_CONVERTERS[encoding] is not None
+    ]
+
+
+def _convert(row, converters):
+    row = list(row)
+    for index, converter in converters:
+        if row[index] is not None:
+            row[index] = converter(row[index])
+    return row
+
+
+# Spreadsheet apps evaluate cells starting with these as formulas; targets
+# and actions are written by agents, so neutralize them on the way out
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(spec, queryset):
+    """CSV with a header row; metadata as JSON, timestamps as ISO 8601"""
+    converters = _row_converters(spec)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(spec.names)
+    for rows in iter_chunks(queryset):
+        for row in rows:
+            writer.writerow([_csv_cell(value) for value in _convert(row, converters)])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def stream_ndjson(spec, queryset):
+    """One JSON object per line, fields as the list API writes them"""
+    converters = _row_converters(spec)
+    names = spec.names
+    for rows in iter_chunks(queryset):
+        yield b''.join(
+            _json_dumps(dict(zip(names, _convert(row, converters)))) + b'\n' for row in rows
+        )
+
+
+def accepts_gzip(request):
+    return re.search(r'\bgzip\b', request.headers.get('Accept-Encoding', '')) is not None
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip a byte stream incrementally (one compressor, no buffering of the whole body)"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def _async_chunks(chunks):
+    # Each chunk is produced in the thread the request's database
+    # connection lives in, so the cursor stays on one connection
+    iterator = iter(chunks)
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(iterator, None)) is not None:
+        yield chunk
+
+
+def streaming_content(request, chunks):
+    """
+    ``chunks`` as StreamingHttpResponse should get them: under ASGI a sync
+    iterator would be read to the end before the first byte is sent, so
+    it is handed over as an async iterator instead.
+    """
+    if isinstance(request, ASGIRequest):
+        return _async_chunks(chunks)
+    return chunks
+
+
+# ?format= name -> (content type, accepted media types, file suffix, streamer, available)
+FORMATS = {
+    'columnar': (
+        'application/vnd.acp.columnar+json',
+        ['application/vnd.acp.columnar+json', 'application/json'],
+        'columnar.json', stream_columnar_json, True,
+    ),
+    'msgpack': (
+        'application/msgpack',
+        ['application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack'],
+        'msgpack', stream_msgpack, msgpack is not None,
+    ),
+    'csv': (
+        'text/csv; charset=utf-8', ['text/csv'], 'csv', stream_csv, True,
+    ),
+    'ndjson': (
+        'application/x-ndjson',
+        ['application/x-ndjson', 'application/ndjson', 'application/jsonl'],
+        'ndjson', stream_ndjson, True,
+    ),
+}
+
+DEFAULT_FORMAT = 'columnar'
+
+
+def negotiate_format(request):
+    """
+    Format name from ?format= or the Accept header (in client preference
+    order). Returns None if nothing acceptable is available.
+    """
+    requested = request.GET.get('format')
+    if requested:
+        entry = FORMATS.get(requested)
+        return requested if entry and entry[4] else None
+
+    accept = request.headers.get('Accept', '')
+    preferences = []
+    for position, item in enumerate(accept.split(',')):
+        media_type, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type and quality > 0:
+            preferences.append((-quality, position, media_type.strip().lower()))
+
+    for _, _, media_type in sorted(preferences):
+        if media_type in ('*/*', 'application/*'):
+            return DEFAULT_FORMAT
+        for name, (_, accepted, _, _, available) in FORMATS.items():
+            if available and media_type in accepted:
+                return name
+    return DEFAULT_FORMAT if not preferences else None
@@ -0,0 +1,56 @@
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import ValidationError
+
+from .export import (
+    FORMATS, LOG_EXPORT, METRIC_EXPORT, accepts_gzip, export_queryset, gzip_stream,
+    negotiate_format, streaming_content
+)
+
+
+def _export(request, spec):
+    name = negotiate_format(request)
+    if name is None:
+        available = [format_name for format_name, entry in FORMATS.items() if entry[4]]
+        return JsonResponse(
+            {'error': f'No acceptable export format; available: {", ".join(available)}'},
+            status=406
+        )
+    content_type, _, suffix, stream, _ = FORMATS[name]
+
+    try:
+        queryset = export_queryset(spec, request.GET)
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+
+    chunks = stream(spec, queryset)
+    compress = accepts_gzip(request)
+    if compress:
+        chunks = gzip_stream(chunks)
+    
+    response = StreamingHttpResponse(streaming_content(request, chunks), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{spec.filename}.{suffix}"'
+    response['Vary'] = 'Accept, Accept-Encoding'
+    if compress:
+        response['Content-Encoding'] = 'gzip'
+    return response
+
+
+@require_GET
+def export_logs(request):
+    """
+    GET /api/logs/export/?since=7d&until=1d&agent=<id>&status=blocked&format=csv
+    Streams every matching log, oldest first, as CSV, NDJSON, columnar
+    JSON or MessagePack (when installed), negotiated by ?format= or
+    Accept; gzipped on the fly for clients that accept it.
+    """
+    return _export(request, LOG_EXPORT)
+
+
+@require_GET
+def export_metrics(request):
+    """
+    GET /api/metrics/export/?since=30d&agent=<id>&format=msgpack
+    Streams every matching metric sample; same formats as export_logs.
+    """
+    return _export(request, METRIC_EXPORT)
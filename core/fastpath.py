@@ -0,0 +1,212 @@
+"""
+Agent Control Panel - Fast list serialization
+Builds list rows straight from values_list() tuples with per-field
+converters compiled once from a ModelSerializer, and renders them with
+orjson when it is installed. Rows are exactly what the serializer
+returns and the rendered bytes match JSONRenderer's (bar the float edge
+cases noted on FastJSONRenderer); `manage.py bench_serializers` checks
+that and reports the speedup.
+
+Opt-in per deployment with FAST_LIST_SERIALIZATION; views opt in by
+using FastListMixin and FastJSONRenderer.
+"""
+import decimal
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import fields as drf_fields, relations
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import ISO_8601, api_settings
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; falls back to the stdlib encoder
+    orjson = None
+
+# Fields whose to_representation() is the identity for values read from
+# the database
+PASSTHROUGH_FIELDS = (
+    drf_fields.CharField, drf_fields.IntegerField, drf_fields.BooleanField,
+    drf_fields.ReadOnlyField,
+)
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None:
+        return None
+    if output_format.lower() != ISO_8601 or hasattr(field, 'timezone'):
+        return field.to_representation
+    field_timezone = field.default_timezone()
+    if field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        text = value.astimezone(field_timezone).isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return convert
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+    Decimal = decimal.Decimal
+
+    def convert(value):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding, context=context))
+    return convert
+
+
+def _uuid_converter(field):
+    if field.uuid_format == 'hex_verbose':
+        return str
+    return field.to_representation
+
+
+def compile_field(field):
+    """(values_list path, converter or None) for one serializer field"""
+    if field.source == '*' or isinstance(field, drf_fields.SerializerMethodField):
+        raise ImproperlyConfigured(f'{field.field_name}: fast path needs a plain model source')
+    path = '__'.join(field.source_attrs)
+
+    if isinstance(field, relations.PrimaryKeyRelatedField):
+        # values_list('agent') already yields the related pk
+        return path, field.pk_field.to_representation if field.pk_field else None
+    if isinstance(field, relations.RelatedField):
+        raise ImproperlyConfigured(f'{field.field_name}: only primary key relations are supported')
+    if isinstance(field, drf_fields.DateTimeField):
+        return path, _datetime_converter(field)
+    if isinstance(field, drf_fields.DecimalField):
+        return path, _decimal_converter(field)
+    if isinstance(field, drf_fields.UUIDField):
+        return path, _uuid_converter(field)
+    if isinstance(field, drf_fields.JSONField) and not field.binary:
+        return path, None
+    if isinstance(field, PASSTHROUGH_FIELDS):
+        return path, None
+    return path, field.to_representation
+
+
+class FastRowSerializer:
+    """
+    Read-only mirror of a ModelSerializer over values_list() rows.
+
+    ``paths`` are the values_list() arguments; ``serialize(rows)`` turns
+    rows fetched with them into the dicts the serializer would return.
+    Converters are compiled when the mirror is built (see
+    get_fast_serializer for the cached instances).
+    """
+
+    def __init__(self, serializer_class):
+        serializer = serializer_class()
+        readable = [field for field in serializer.fields.values() if not field.write_only]
+        compiled = [compile_field(field) for field in readable]
+
+        self.names = tuple(field.field_name for field in readable)
+        self.paths = tuple(path for path, _ in compiled)
+        self.converters = [
+            (index, converter) for index, (_, converter) in enumerate(compiled)
+            if converter is not None
+        ]
+
+    def serialize(self, rows):
+        names, converters = self.names, self.converters
+        data = []
+        for row in rows:
+            row = list(row)
+            for index, converter in converters:
+                value = row[index]
+                if value is not None:
+                    row[index] = converter(value)
+            data.append(dict(zip(names, row)))
+        return data
+
+
+_compiled = {}
+
+
+def get_fast_serializer(serializer_class):
+    """Cached FastRowSerializer per serializer class and active time zone"""
+    key = (serializer_class, timezone.get_current_timezone_name())
+    fast = _compiled.get(key)
+    if fast is None:
+        fast = _compiled[key] = FastRowSerializer(serializer_class)
+    return fast
+
+
+def _orjson_default(obj):
+    return encoders.JSONEncoder().default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when available.
+
+    Output matches JSONRenderer for compact responses: datetimes and
+    dataclasses are passed back to DRF's encoder (orjson would write
+    +00:00 rather than Z), Decimals fall through to it too, and
+    U+2028/U+2029 are escaped. Indented (browsable / ?indent) responses
+    use the stdlib path. Two float edge cases differ: exponents are
+    written as 1e16 rather than 1e+16, and NaN/Infinity become null.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=_orjson_default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+                | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits; let the stdlib encoder decide
+            return super().render(data, accepted_media_type, renderer_context)
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastListMixin:
+    """
+    list() from values_list() rows when FAST_LIST_SERIALIZATION is on.
+
+    The view's queryset filters and ordering apply unchanged; only the
+    row materialization and serialization are replaced.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not getattr(settings, 'FAST_LIST_SERIALIZATION', False):
+            return super().list(request, *args, **kwargs)
+
+        fast = get_fast_serializer(self.get_serializer_class())
+        # Columns the paginator's cursors need ride along after the
+        # serialized ones; serialize() only reads the first len(names)
+        extra = [
+            path for path in getattr(self.paginator, 'cursor_fields', lambda: ())()
+            if path not in fast.paths
+        ]
+        queryset = self.filter_queryset(self.get_queryset()).values_list(
+            *fast.paths, *extra, named=True
+        )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(fast.serialize(page))
+        return Response(fast.serialize(queryset))
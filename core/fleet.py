@@ -0,0 +1,299 @@
+"""
+Agent Control Panel - Fleet summary
+Per-model / status / user / plan totals kept in the fleet_summary table.
+Writes only mark the summary as changed; a dimension is refreshed on the
+next read after a change, at most once per refresh interval. A refresh
+re-aggregates only the groups of agents that changed since the last one,
+and rebuilds the whole dimension when agents moved between its groups,
+were deleted, or the hourly rates are due (FLEET_SUMMARY_MAX_AGE).
+"""
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Q, Sum
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Agent, AgentMetricRollup, FleetSummary
+from .rollups import truncate
+
+# group_by value -> Agent field path
+DIMENSIONS = {
+    'model': 'model',
+    'status': 'status',
+    'user': 'user_id',
+    'plan': 'user__plan',
+}
+
+ORDER_FIELDS = [
+    'agents', 'running_agents', 'tasks_completed', 'tasks_failed', 'total_cost',
+    'uptime_seconds', 'avg_security_score', 'tokens_last_hour', 'cost_last_hour',
+]
+
+TOTAL_FIELDS = ['agents', 'running_agents', 'tasks_completed', 'tasks_failed', 'total_cost',
+                'tokens_last_hour', 'cost_last_hour']
+
+COST_PLACES = Decimal('0.0001')  # FleetSummary cost fields' scale
+
+CHANGED_KEY = 'fleet:changed_at'
+PENDING_KEY = 'fleet:pending'  # {agent_id: changed_at}
+
+_pending_lock = threading.Lock()
+
+
+def _cache():
+    return caches['stats']
+
+
+def _refreshed_key(dimension):
+    return f'fleet:refreshed_at:{dimension}'
+
+
+def _regrouped_key(dimension):
+    return f'fleet:regrouped_at:{dimension}'
+
+
+def mark_changed(agent_ids=None, regrouped=()):
+    """
+    Record that agents or metrics changed since the last refresh.
+
+    ``agent_ids`` limits the change to those agents' groups; without it
+    every dimension is rebuilt. ``regrouped`` names the dimensions whose
+    groups the agents moved between (e.g. 'status' when it changed).
+
+    The pending set is read and written back without a cross-process
+    lock; a change lost to a concurrent writer shows up at the next full
+    rebuild, at most FLEET_SUMMARY_MAX_AGE later.
+    """
+    now = time.time()
+    cache = _cache()
+    if agent_ids is None:
+        regrouped = DIMENSIONS
+    else:
+        with _pending_lock:
+            pending = {
+                agent_id: changed_at for agent_id, changed_at in cache.get(PENDING_KEY, {}).items()
+                if now - changed_at < settings.FLEET_SUMMARY_MAX_AGE
+            }
+            pending.update(dict.fromkeys(agent_ids, now))
+            if len(pending) > settings.FLEET_SUMMARY_MAX_PENDING:
+                pending, regrouped = {}, DIMENSIONS
+            cache.set(PENDING_KEY, pending, None)
+    cache.set_many({CHANGED_KEY: now, **{_regrouped_key(dimension): now for dimension in regrouped}}, None)
+
+
+def regrouped_dimensions(agent, loaded, created=False):
+    """
+    Dimensions in which a saved agent may have changed group, from its
+    ``loaded`` field values (all of them when those are unknown)
+    """
+    if created:
+        return ()
+    if not loaded:
+        return DIMENSIONS
+    dimensions = [field for field in ('model', 'status')
+                  if field not in loaded or loaded[field] != getattr(agent, field)]
+    if 'user_id' not in loaded or loaded['user_id'] != agent.user_id:
+        dimensions += ['user', 'plan']
+    return dimensions
+
+
+def is_stale(dimension, now=None):
+    """
+    A dimension is refreshed when it was never built by this cache, when
+    it is older than FLEET_SUMMARY_MAX_AGE (the hourly rates move with the
+    clock), or when something changed and FLEET_SUMMARY_MIN_INTERVAL has
+    passed since the last refresh.
+    """
+    now = now or time.time()
+    cache = _cache()
+    refreshed_at = cache.get(_refreshed_key(dimension))
+    if refreshed_at is None:
+        return True
+    age = now - refreshed_at
+    if age >= settings.FLEET_SUMMARY_MAX_AGE:
+        return True
+    changed_at = cache.get(CHANGED_KEY, 0)
+    return changed_at >= refreshed_at and age >= settings.FLEET_SUMMARY_MIN_INTERVAL
+
+
+def changed_agents(dimension, now=None):
+    """
+    Agents whose groups need re-aggregating in ``dimension``, or None
+    when the whole dimension has to be rebuilt.
+    """
+    now = now or time.time()
+    cache = _cache()
+    refreshed_at = cache.get(_refreshed_key(dimension))
+    if (refreshed_at is None or now - refreshed_at >= settings.FLEET_SUMMARY_MAX_AGE
+            or cache.get(_regrouped_key(dimension), 0) >= refreshed_at):
+        return None
+    return [
+        agent_id for agent_id, changed_at in cache.get(PENDING_KEY, {}).items()
+        if changed_at >= refreshed_at
+    ]
+
+
+def refresh(dimension, agent_ids=None):
+    """
+    Rebuild the summary rows of one dimension, or only the groups of
+    ``agent_ids`` when given; returns the number of groups written.
+    """
+    path = DIMENSIONS[dimension]
+    started = time.time()
+    now = timezone.now()
+    hour_start = truncate(now - timedelta(hours=1), 'minute')
+
+    agents = Agent.objects.order_by()
+    rollups = AgentMetricRollup.objects.filter(resolution='minute', bucket__gte=hour_start)
+    if agent_ids is not None:
+        if not agent_ids:
+            _cache().set(_refreshed_key(dimension), started, None)
+            return 0
+        keys = Agent.objects.filter(id__in=agent_ids).order_by().values(path)
+        agents = agents.filter(**{f'{path}__in': keys})
+        rollups = rollups.filter(**{f'agent__{path}__in': keys})
+
+    label_path = 'user__username' if dimension == 'user' else path
+    groups = (
+        agents
+        .values(group=F(path), group_label=F(label_path))
+        .annotate(
+            agents=Count('id'),
+            running_agents=Count('id', filter=Q(status='running')),
+            sum_tasks_completed=Sum('tasks_completed'),
+            sum_tasks_failed=Sum('tasks_failed'),
+            sum_total_cost=Sum('total_cost'),
+            sum_uptime_seconds=Sum('uptime_seconds'),
+            avg_security=Avg('security_score'),
+        )
+    )
+    last_hour = {
+        row['group']: row
+        for row in rollups.order_by()
+        .values(group=F(f'agent__{path}'))
+        .annotate(tokens=Sum('tokens_used'), cost=Sum('cost'))
+    }
+
+    rows = []
+    for group in groups:
+        key = str(group['group'])
+        recent = last_hour.get(group['group'], {})
+        rows.append(FleetSummary(
+            dimension=dimension,
+            key=key,
+            label=str(group['group_label'] or ''),
+            agents=group['agents'],
+            running_agents=group['running_agents'],
+            tasks_completed=group['sum_tasks_completed'] or 0,
+            tasks_failed=group['sum_tasks_failed'] or 0,
+            total_cost=group['sum_total_cost'] or 0,
+            uptime_seconds=group['sum_uptime_seconds'] or 0,
+            avg_security_score=group['avg_security'] if group['avg_security'] is not None else 100,
+            tokens_last_hour=recent.get('tokens') or 0,
+            cost_last_hour=recent.get('cost') or 0,
+            refreshed_at=now,
+        ))
+
+    with transaction.atomic():
+        FleetSummary.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['dimension', 'key'],
+            update_fields=[field.name for field in FleetSummary._meta.concrete_fields
+                           if field.name not in ('id', 'dimension', 'key')],
+        )
+        if agent_ids is None:
+            # Groups left without agents; a partial refresh never empties one
+            FleetSummary.objects.filter(dimension=dimension, refreshed_at__lt=now).delete()
+
+    _cache().set(_refreshed_key(dimension), started, None)
+    return len(rows)
+
+
+def ensure_fresh(dimension):
+    """Refresh ``dimension`` if stale, unless another request already is"""
+    if not is_stale(dimension):
+        return False
+    cache = _cache()
+    lock_key = f'fleet:refreshing:{dimension}'
+    if not cache.add(lock_key, 1, settings.FLEET_SUMMARY_LOCK_SECONDS):
+        # Serve the current rows while the other refresh runs
+        return False
+    try:
+        refresh(dimension, changed_agents(dimension))
+    finally:
+        cache.delete(lock_key)
+    return True
+
+
+def parse_summary_params(params):
+    """Validate ?group_by=&order=&top= into a dict"""
+    dimension = params.get('group_by', 'model')
+    if dimension not in DIMENSIONS:
+        raise ValidationError({'group_by': f'Must be one of {", ".join(DIMENSIONS)}'})
+
+    order = params.get('order', 'total_cost')
+    if order.lstrip('-') not in ORDER_FIELDS:
+        raise ValidationError({'order': f'Must be one of {", ".join(ORDER_FIELDS)} (prefix - for ascending)'})
+    # Top-N means largest first; '-field' asks for the smallest
+    ordering = order[1:] if order.startswith('-') else f'-{order}'
+
+    try:
+        top = int(params.get('top', settings.FLEET_SUMMARY_DEFAULT_TOP))
+    except ValueError:
+        raise ValidationError({'top': 'Must be an integer'})
+
+    return {
+        'group_by': dimension,
+        'order': order,
+        'ordering': ordering,
+        'top': max(1, min(top, settings.FLEET_SUMMARY_MAX_TOP)),
+    }
+
+
+def fleet_summary(dimension, ordering, top):
+    """Top ``top`` groups of ``dimension`` plus fleet-wide totals"""
+    ensure_fresh(dimension)
+    summary = FleetSummary.objects.filter(dimension=dimension).order_by()
+    totals = summary.aggregate(
+        groups=Count('id'),
+        refreshed_at=Max('refreshed_at'),
+        **{field: Sum(field) for field in TOTAL_FIELDS},
+    )
+    groups, refreshed_at = totals.pop('groups'), totals.pop('refreshed_at')
+    totals = {field: value or 0 for field, value in totals.items()}
+    for field in ('total_cost', 'cost_last_hour'):
+        # SQLite sums decimals without their scale
+        totals[field] = str(Decimal(totals[field]).quantize(COST_PLACES))
+    return {
+        'groups': groups,
+        'refreshed_at': refreshed_at,
+        'totals': totals,
+        'results': [_group_data(row) for row in summary.order_by(ordering, 'key')[:top]],
+    }
+
+
+def _group_data(row):
+    finished = row.tasks_completed + row.tasks_failed
+    return {
+        'key': row.key,
+        'label': row.label,
+        'agents': row.agents,
+        'running_agents': row.running_agents,
+        'tasks_completed': row.tasks_completed,
+        'tasks_failed': row.tasks_failed,
+        'failure_rate': round(row.tasks_failed / finished, 4) if finished else 0.0,
+        'total_cost': str(row.total_cost),
+        'cost_per_agent': str(round(row.total_cost / row.agents, 4)) if row.agents else '0',
+        'uptime_seconds': row.uptime_seconds,
+        'avg_security_score': round(row.avg_security_score, 2),
+        'tokens_per_hour': row.tokens_last_hour,
+        'cost_per_hour': str(row.cost_last_hour),
+    }
@@ -0,0 +1,120 @@
+"""
+Agent Control Panel - Heartbeat fast path
+Beats are recorded in memory and written to agents.last_active_at in
+batched UPDATEs; liveness is answered from the in-memory last-seen map.
+The UPDATE bypasses post_save, so the flush applies what the Agent
+receivers would have (dashboard counters, agent.status events) for the
+agents it moved to running. A late or replayed beat never moves
+last_active_at (or last-seen) backwards.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import DateTimeField, F, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .buffers import CoalescingBuffer
+from .models import Agent
+from . import events, fleet, stats, versions
+
+
+class HeartbeatBuffer(CoalescingBuffer):
+    """Keeps the latest beat per agent and marks them running on flush"""
+
+    def __init__(self, interval=None, max_pending=None):
+        super().__init__(
+            interval or settings.HEARTBEAT_FLUSH_SECONDS,
+            max_pending or settings.HEARTBEAT_MAX_PENDING,
+        )
+        self.last_seen = {}
+
+    def merge(self, current, value):
+        return value if current is None or value > current else current
+
+    def beat(self, agent_id, at=None):
+        at = at or timezone.now()
+        seen = self.last_seen.get(agent_id)
+        if seen is None or at > seen:
+            self.last_seen[agent_id] = at
+        self.add(agent_id, at)
+        return at
+
+    def write(self, batch):
+        with transaction.atomic():
+            current = {
+                agent_id: (name, status, last_active_at)
+                for agent_id, name, status, last_active_at in Agent.objects.filter(
+                    id__in=list(batch)
+                ).values_list('id', 'name', 'status', 'last_active_at')
+            }
+            # Beats older than what is stored change nothing
+            current = {
+                agent_id: row for agent_id, row in current.items()
+                if row[2] is None or row[2] < batch[agent_id]
+            }
+            # GREATEST in case another process wrote a newer beat meanwhile
+            agents = [
+                Agent(id=agent_id, last_active_at=_latest(batch[agent_id]), status='running')
+                for agent_id in current
+            ]
+            Agent.objects.bulk_update(agents, ['last_active_at', 'status'], batch_size=500)
+
+        stats.record_marked_running([(status, last_active_at) for _, status, last_active_at in current.values()])
+        started = False
+        for agent_id, (name, status, _) in current.items():
+            if status != 'running':
+                started = True
+                events.publish('agent.status', {
+                    'agent': str(agent_id), 'name': name, 'status': 'running', 'previous': status,
+                })
+        if current:
+            fleet.mark_changed(current, regrouped=['status'] if started else ())
+            versions.bump_agents(current, 'agents')
+        self.prune()
+
+    def prune(self, now=None):
+        """Forget agents that stopped beating long ago (bounds memory)"""
+        horizon = (now or timezone.now()) - timedelta(seconds=settings.HEARTBEAT_STALE_SECONDS * 10)
+        for agent_id, seen in list(self.last_seen.items()):
+            if seen < horizon:
+                self.last_seen.pop(agent_id, None)
+
+    def liveness(self, agent_ids=None, now=None):
+        """
+        {agent_id: {last_seen, age_seconds, alive}} from beats seen by this
+        process, without touching the database.
+        """
+        now = now or timezone.now()
+        stale_after = settings.HEARTBEAT_STALE_SECONDS
+        ids = self.last_seen.keys() if agent_ids is None else agent_ids
+        result = {}
+        for agent_id in ids:
+            seen = self.last_seen.get(agent_id)
+            age = (now - seen).total_seconds() if seen else None
+            result[str(agent_id)] = {
+                'last_seen': seen,
+                'age_seconds': round(age, 3) if age is not None else None,
+                'alive': age is not None and age <= stale_after,
+            }
+        return result
+
+
+def _latest(at):
+    at = Value(at, output_field=DateTimeField())
+    return Greatest(Coalesce(F('last_active_at'), at), at)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_heartbeat_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = HeartbeatBuffer()
+    return _buffer
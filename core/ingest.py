@@ -0,0 +1,173 @@
+"""
+Agent Control Panel - Bulk ingestion services
+Validates whole batches in one pass and writes them with bulk_create
+"""
+import time
+
+from django.conf import settings
+
+from .models import Agent, AgentLog, AgentMetric
+from .parsers import NDJSONError
+from .serializers import AgentLogBulkSerializer, AgentMetricIngestSerializer
+from .signals import logs_created, metrics_created
+from . import limits, policy
+
+
+def get_batch_size(requested=None):
+    """Resolve the insert chunk size, capped by settings"""
+    default = getattr(settings, 'AGENT_LOG_BULK_BATCH_SIZE', 500)
+    maximum = getattr(settings, 'AGENT_LOG_BULK_MAX_BATCH_SIZE', 5000)
+    try:
+        size = int(requested) if requested else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def ingest_logs(records, batch_size=None):
+    """
+    Validate and insert a batch of AgentLog records.
+    
+    Invalid records are skipped and reported, the rest are written.
+    Records without a status are decided by the policy rules and the
+    agent's limits (core.limits); one refused by a limit is stored
+    blocked, with metadata['limit'] naming it.
+    Returns (created_logs, errors) where each error is
+    {'index': <position in batch>, 'errors': {...}}.
+    """
+    batch_size = get_batch_size(batch_size)
+    valid = []
+    errors = []
+    
+    for index, record in enumerate(records):
+        if isinstance(record, NDJSONError):
+            errors.append({
+                'index': index,
+                'line': record.line_number,
+                'errors': {'non_field_errors': [record.message]}
+            })
+            continue
+        
+        serializer = AgentLogBulkSerializer(data=record)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+    
+    # One lookup for every agent referenced by the batch (with the model
+    # and limits decisions need)
+    agent_ids = {data['agent'] for _, data in valid}
+    known_agents = {
+        agent_id: (model, limits.limits_for(actions_per_minute, cost_budget))
+        for agent_id, model, actions_per_minute, cost_budget in Agent.objects.filter(
+            id__in=agent_ids
+        ).values_list('id', 'model', 'actions_per_minute', 'cost_budget')
+    }
+    engine = policy.get_engine() if any('status' not in data for _, data in valid) else None
+    
+    accepted = []
+    for index, data in valid:
+        if data['agent'] not in known_agents:
+            errors.append({
+                'index': index,
+                'errors': {'agent': [f'Invalid pk "{data["agent"]}" - object does not exist.']}
+            })
+            continue
+        decided = None
+        if 'status' not in data:
+            decided = engine.decide(
+                data['action'], data.get('target', ''), data['agent'], known_agents[data['agent']][0]
+            ).decision
+        accepted.append((data, decided))
+    
+    # Decided actions must fit the agent's limits; reported ones count toward them
+    refused = limits.admit([
+        (data['agent'], known_agents[data['agent']][1], decided) for data, decided in accepted
+    ])
+    
+    logs = []
+    for (data, decided), allowance in zip(accepted, refused):
+        metadata = data.get('metadata', {})
+        if allowance is not None:
+            decided = 'blocked'
+            metadata = {**metadata, 'limit': allowance.limit}
+        logs.append(AgentLog(
+            agent_id=data['agent'],
+            action=data['action'],
+            target=data.get('target', ''),
+            status=data.get('status', decided),
+            metadata=metadata,
+        ))
+    
+    if logs:
+        AgentLog.objects.bulk_create(logs, batch_size=batch_size)
+        logs_created.send(sender=AgentLog, logs=logs)
+    
+    errors.sort(key=lambda e: e['index'])
+    return logs, errors
+
+
+class MetricStreamIngestor:
+    """
+    Incrementally ingests AgentMetric samples for one agent.
+    
+    Samples are buffered and written with bulk_create once the buffer holds
+    ``batch_size`` records or ``flush_interval`` seconds have passed since
+    the last flush. The caller reads the next sample only after ``add``
+    returns, so a slow database naturally slows down the sender.
+    """
+    max_reported_errors = 100
+    
+    def __init__(self, agent, batch_size=None, flush_interval=None):
+        self.agent = agent
+        self.batch_size = batch_size or getattr(settings, 'AGENT_METRIC_STREAM_BATCH_SIZE', 200)
+        self.flush_interval = (
+            flush_interval if flush_interval is not None
+            else getattr(settings, 'AGENT_METRIC_STREAM_FLUSH_SECONDS', 1.0)
+        )
+        self.pending = []
+        self.accepted = 0
+        self.rejected = 0
+        self.batches = 0
+        self.errors = []
+        self.last_flush = time.monotonic()
+    
+    def add(self, record, line_number=None):
+        """Validate one sample and flush if the batch is due"""
+        if isinstance(record, NDJSONError):
+            self._reject(record.line_number, {'non_field_errors': [record.message]})
+        else:
+            serializer = AgentMetricIngestSerializer(data=record)
+            if serializer.is_valid():
+                self.pending.append(AgentMetric(agent=self.agent, **serializer.validated_data))
+            else:
+                self._reject(line_number, serializer.errors)
+        
+        if (len(self.pending) >= self.batch_size
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+    
+    def flush(self):
+        """Write buffered samples to the database"""
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        AgentMetric.objects.bulk_create(self.pending)
+        metrics_created.send(sender=AgentMetric, metrics=self.pending)
+        self.accepted += len(self.pending)
+        self.batches += 1
+        self.pending = []
+    
+    def summary(self):
+        return {
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'errors': self.errors,
+        }
+    
+    def _reject(self, line_number, errors):
+        self.rejected += 1
+        # Keep memory bounded on long streams full of bad records
+        if len(self.errors) < self.max_reported_errors:
+            self.errors.append({'line': line_number, 'errors': errors})
@@ -0,0 +1,311 @@
+"""
+Agent Control Panel - Per-agent limits
+Caps how fast an agent may act and how much it may spend. Limits are
+enforced when actions are decided (POST /api/policy/decide/, and bulk
+logs ingested without a status), after the policy rules:
+
+- actions per minute: a token bucket holding up to one minute of
+  actions, kept as its theoretical arrival time (GCRA), so each agent
+  costs one cache entry and a check is one get and one set
+- cost budget: AgentMetric.cost summed over the last
+  LIMITS_COST_WINDOW_HOURS in hourly slots plus a running total.
+  Metric ingestion adds to both as samples arrive (core.signals), and
+  the total drops slots as they leave the window, so a check reads two
+  cache entries and never SUMs agent_metrics. A cold store is seeded
+  from the hourly rollups, and re-seeded once per window.
+
+Agents override the LIMITS_* defaults with actions_per_minute and
+cost_budget; None means no limit and 0 refuses every action. State
+lives in the 'limits' cache: locmem keeps it in the worker (checks take
+microseconds, but each worker enforces the limits on its own, so N
+workers admit up to N times the rate and budget), a shared backend
+(redis) makes the limits fleet-wide. Spend is counted with atomic incr(). The token bucket
+is read and written under a process lock only, so with a shared backend
+workers racing on the same agent can admit a few extra actions.
+"""
+import math
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import AgentMetricRollup
+
+# Spend is counted in ten-thousandths (AgentMetric.cost has 4 decimals)
+SPEND_SCALE = 10000
+SLOT_SECONDS = 3600
+
+Limits = namedtuple('Limits', ['actions_per_minute', 'cost_budget'])
+
+# granted: how many of the requested actions may go ahead; limit: 'rate'
+# or 'budget' when some were refused; retry_after: seconds until the
+# next action would be admitted (None if unknown)
+Allowance = namedtuple('Allowance', ['granted', 'limit', 'retry_after'])
+
+_lock = threading.Lock()
+
+
+def _cache():
+    return caches['limits']
+
+
+def limits_for(actions_per_minute=None, cost_budget=None):
+    """An agent's limits, with the settings' defaults for unset ones"""
+    if actions_per_minute is None:
+        actions_per_minute = settings.LIMITS_ACTIONS_PER_MINUTE
+    if cost_budget is None:
+        cost_budget = settings.LIMITS_COST_BUDGET
+    return Limits(actions_per_minute, cost_budget)
+
+
+def is_unlimited(limits):
+    return limits.actions_per_minute is None and limits.cost_budget is None
+
+
+def _slot(timestamp):
+    return int(timestamp // SLOT_SECONDS)
+
+
+def _spend_key(agent_id, slot):
+    return f'limits:spend:{agent_id}:{slot}'
+
+
+def _total_key(agent_id):
+    return f'limits:spend:{agent_id}'
+
+
+def _span_key(agent_id):
+    # (first slot in the total, slot the total was seeded in)
+    return f'limits:span:{agent_id}'
+
+
+def _window_start(now):
+    return _slot(now) - settings.LIMITS_COST_WINDOW_HOURS + 1
+
+
+def _window_seconds():
+    return settings.LIMITS_COST_WINDOW_HOURS * SLOT_SECONDS
+
+
+def take(agent_id, count, per_minute, reported=0, now=None):
+    """
+    Take up to ``count`` actions from the agent's token bucket, after
+    charging ``reported`` actions that already happened (those are never
+    refused). Returns (granted, retry_after). A limit of 0 grants nothing
+    and never will (retry_after None).
+    """
+    if per_minute == 0:
+        return 0, None
+    now = time.time() if now is None else now
+    interval = 60.0 / per_minute
+    capacity = 60.0  # One minute of actions may burst
+    key = f'limits:tat:{agent_id}'
+    cache = _cache()
+    with _lock:
+        tat = max(cache.get(key, now), now) + reported * interval
+        available = math.floor((now + capacity - tat) / interval + 1e-9)
+        granted = max(0, min(count, available))
+        tat += granted * interval
+        cache.set(key, tat, math.ceil(tat - now) + 1)
+    retry_after = None
+    if granted < count:
+        retry_after = round(max(0.0, tat + interval - now - capacity), 3)
+    return granted, retry_after
+
+
+def spend(agent_ids, now=None):
+    """{agent_id: Decimal cost over the window} for ``agent_ids``"""
+    now = time.time() if now is None else now
+    start = _window_start(now)
+    cache = _cache()
+    agent_ids = list(agent_ids)
+    values = cache.get_many(
+        [_total_key(agent_id) for agent_id in agent_ids] + [_span_key(agent_id) for agent_id in agent_ids]
+    )
+
+    totals = {}
+    unseeded = []
+    for agent_id in agent_ids:
+        total, span = values.get(_total_key(agent_id)), values.get(_span_key(agent_id))
+        if total is None or span is None or span[1] < start:
+            unseeded.append(agent_id)
+        elif span[0] < start:
+            totals[agent_id] = _roll(agent_id, span, start, total)
+        else:
+            totals[agent_id] = total
+    if unseeded:
+        totals.update(seed(unseeded, now))
+    return {agent_id: Decimal(total) / SPEND_SCALE for agent_id, total in totals.items()}
+
+
+def _roll(agent_id, span, start, total):
+    """Drop the slots that left the window from the agent's total"""
+    cache = _cache()
+    if not cache.add(f'limits:roll:{agent_id}:{start}', True, SLOT_SECONDS):
+        # Another worker is rolling it; until then the total over-counts
+        return total
+    expired = cache.get_many([_spend_key(agent_id, slot) for slot in range(span[0], start)])
+    dropped = sum(expired.values())
+    if dropped:
+        try:
+            total = cache.decr(_total_key(agent_id), dropped)
+        except ValueError:
+            pass
+    timeout = 2 * _window_seconds()
+    cache.set(_span_key(agent_id), (start, span[1]), timeout)
+    cache.touch(_total_key(agent_id), timeout)
+    return total
+
+
+def seed(agent_ids, now=None):
+    """
+    Load the window's spend of ``agent_ids`` from the hourly rollups (one
+    query). The total is re-seeded a window later, which also corrects
+    drift from lost updates. Returns {agent_id: total in SPEND_SCALE units}.
+    """
+    now = time.time() if now is None else now
+    start = _window_start(now)
+    since = datetime.fromtimestamp(start * SLOT_SECONDS, dt_timezone.utc)
+    rows = AgentMetricRollup.objects.filter(
+        agent_id__in=agent_ids, resolution='hour', bucket__gte=since
+    ).values_list('agent_id', 'bucket', 'cost')
+
+    slots = {_spend_key(agent_id, slot): 0 for agent_id in agent_ids for slot in range(start, _slot(now) + 1)}
+    totals = dict.fromkeys(agent_ids, 0)
+    for agent_id, bucket, cost in rows:
+        units = int(cost * SPEND_SCALE)
+        slots[_spend_key(agent_id, _slot(bucket.timestamp()))] = units
+        totals[agent_id] += units
+
+    cache = _cache()
+    timeout = 2 * _window_seconds()
+    cache.set_many(slots, _window_seconds() + SLOT_SECONDS)
+    cache.set_many({_total_key(agent_id): total for agent_id, total in totals.items()}, timeout)
+    cache.set_many({_span_key(agent_id): (start, _slot(now)) for agent_id in agent_ids}, timeout)
+    return totals
+
+
+def record_spend(metrics):
+    """
+    Add newly written AgentMetric rows to the spend slots and totals.
+    Agents not seeded in this store are skipped; seeding reads them from
+    the rollups.
+    """
+    deltas = defaultdict(int)
+    for metric in metrics:
+        if metric.cost:
+            deltas[(metric.agent_id, _slot(metric.timestamp.timestamp()))] += int(
+                Decimal(metric.cost) * SPEND_SCALE
+            )
+    if not deltas:
+        return
+
+    cache = _cache()
+    spans = cache.get_many([_span_key(agent_id) for agent_id, _ in deltas])
+    for (agent_id, slot), delta in deltas.items():
+        span = spans.get(_span_key(agent_id))
+        # Unseeded, or too old to count
+        if span is None or slot < span[0]:
+            continue
+        for key, timeout in (
+            (_spend_key(agent_id, slot), _window_seconds() + SLOT_SECONDS),
+            (_total_key(agent_id), 2 * _window_seconds()),
+        ):
+            cache.add(key, 0, timeout)
+            try:
+                cache.incr(key, delta)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.set(key, delta, timeout)
+
+
+def enforce(limits, wanted, reported=None, now=None):
+    """
+    Admit actions against each agent's limits.
+
+    ``limits`` maps agent ids to Limits, ``wanted`` maps them to the
+    number of actions asking to go ahead and ``reported`` to actions
+    that already happened (they count toward the rate but are never
+    refused). Returns {agent_id: Allowance} for the agents in ``wanted``.
+    """
+    now = time.time() if now is None else now
+    reported = reported or {}
+    budgeted = [
+        agent_id for agent_id in wanted
+        if wanted[agent_id] and limits[agent_id].cost_budget is not None
+    ]
+    spent = spend(budgeted, now) if budgeted else {}
+
+    allowances = {}
+    for agent_id in set(wanted) | set(reported):
+        count = wanted.get(agent_id, 0)
+        actions_per_minute, cost_budget = limits[agent_id]
+        over_budget = bool(count) and cost_budget is not None and spent[agent_id] >= cost_budget
+        if over_budget:
+            count = 0
+        granted, retry_after = count, None
+        if actions_per_minute is not None:
+            granted, retry_after = take(
+                agent_id, count, actions_per_minute, reported.get(agent_id, 0), now
+            )
+        if over_budget:
+            allowances[agent_id] = Allowance(0, 'budget', None)
+        else:
+            allowances[agent_id] = Allowance(granted, 'rate' if granted < count else None, retry_after)
+    return {agent_id: allowances[agent_id] for agent_id in wanted}
+
+
+def admit(actions, now=None):
+    """
+    Enforce limits on a batch of decided actions, in order. ``actions``
+    holds (agent_id, limits, decision) tuples; decision None marks an
+    action the agent reports as done (counted, never refused). Returns,
+    per action, None or the Allowance that refused it.
+    """
+    wanted, reported, by_agent = Counter(), Counter(), {}
+    for agent_id, agent_limits, decision in actions:
+        if agent_id is None or is_unlimited(agent_limits):
+            continue
+        by_agent[agent_id] = agent_limits
+        if decision is None:
+            reported[agent_id] += 1
+        elif decision != 'blocked':
+            wanted[agent_id] += 1
+    if not by_agent:
+        return [None] * len(actions)
+
+    allowances = enforce(by_agent, wanted, reported, now)
+    remaining = {agent_id: allowance.granted for agent_id, allowance in allowances.items()}
+    refused = []
+    for agent_id, _, decision in actions:
+        allowance = allowances.get(agent_id)
+        if decision in (None, 'blocked') or allowance is None:
+            refused.append(None)
+        elif remaining[agent_id] > 0:
+            remaining[agent_id] -= 1
+            refused.append(None)
+        else:
+            refused.append(allowance)
+    return refused
+
+
+def usage(agent_id, limits, now=None):
+    """Current state of an agent's limits, for display"""
+    now = time.time() if now is None else now
+    body = {
+        'actions_per_minute': limits.actions_per_minute,
+        'cost_budget': limits.cost_budget,
+        'cost_window_hours': settings.LIMITS_COST_WINDOW_HOURS,
+        'spent': spend([agent_id], now)[agent_id],
+    }
+    if limits.actions_per_minute == 0:
+        body['actions_available'] = 0
+    elif limits.actions_per_minute is not None:
+        interval = 60.0 / limits.actions_per_minute
+        tat = max(_cache().get(f'limits:tat:{agent_id}', now), now)
+        body['actions_available'] = max(0, math.floor((now + 60.0 - tat) / interval + 1e-9))
+    return body
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Agent
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild minute/hour/day metric rollups from raw agent_metrics rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agent', action='append', dest='agents',
+                            help='Only rebuild this agent id (repeatable)')
+
+    def handle(self, *args, **options):
+        agent_ids = Agent.objects.values_list('id', flat=True)
+        if options['agents']:
+            agent_ids = agent_ids.filter(id__in=options['agents'])
+
+        total = 0
+        for agent_id in agent_ids.iterator():
+            created = rebuild_rollups(agent_id)
+            total += created
+            self.stdout.write(f'{agent_id}: {created} rollup rows')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} rollup rows'))
@@ -0,0 +1,52 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.limits import Limits, admit
+
+
+class Command(BaseCommand):
+    help = 'Measure per-agent limit checks/sec against the configured limits cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=20000, help='Checks per case')
+        parser.add_argument('--agents', type=int, default=1000, help='Distinct agents checked')
+        parser.add_argument('--batch', type=int, default=100, help='Actions per batched check')
+
+    def handle(self, *args, **options):
+        checks, batch = options['checks'], options['batch']
+        if checks < 1 or options['agents'] < 1 or batch < 1:
+            raise CommandError('--checks, --agents and --batch must be positive')
+        self.stdout.write(f"Limits cache: {settings.CACHES['limits']['BACKEND']}")
+
+        # Fresh ids, so earlier runs' state doesn't interfere
+        agents = [uuid.uuid4() for _ in range(options['agents'])]
+        cases = [
+            ('rate', Limits(600, None)),
+            ('budget', Limits(None, Decimal('100'))),
+            ('rate+budget', Limits(600, Decimal('100'))),
+        ]
+        # Seed every agent first (one query), so only warm checks are timed
+        admit([(agent_id, cases[1][1], 'allowed') for agent_id in agents])
+
+        for name, limits in cases:
+            started = time.perf_counter()
+            for i in range(checks):
+                admit([(agents[i % len(agents)], limits, 'allowed')])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name:12} {checks / elapsed:>10,.0f} checks/s ({elapsed / checks * 1e6:.1f} us each)'
+            )
+
+            rounds = max(1, checks // batch)
+            started = time.perf_counter()
+            for i in range(rounds):
+                admit([(agents[(i * batch + j) % len(agents)], limits, 'allowed') for j in range(batch)])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name:12} {rounds * batch / elapsed:>10,.0f} actions/s in batches of {batch} '
+                f'({elapsed / rounds * 1e3:.2f} ms per batch)'
+            )
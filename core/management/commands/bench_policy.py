@@ -0,0 +1,124 @@
+import fnmatch
+import random
+import re
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import PolicyRule
+from core.policy import SEVERITY, PolicyEngine, rule_scope
+
+ACTIONS = ['file_read', 'file_write', 'file_delete', 'code_execute', 'web_request', 'database_query']
+MODELS = ['gpt-4', 'claude-3-opus', 'claude-3-sonnet', 'llama-3-70b', 'mistral-large']
+DECISIONS = ['allowed', 'blocked', 'flagged']
+
+
+class Command(BaseCommand):
+    help = 'Measure policy decisions/sec against a synthetic rule set (no database writes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rules', type=int, default=5000, help='Rules in the rule set')
+        parser.add_argument('--decisions', type=int, default=100000, help='Decisions to time')
+        parser.add_argument('--agents', type=int, default=200, help='Agents rules and actions refer to')
+        parser.add_argument('--verify', type=int, default=2000,
+                            help='Decisions checked against a rule-by-rule scan (also timed)')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['rules'] < 1 or options['decisions'] < 1 or options['agents'] < 1:
+            raise CommandError('--rules, --decisions and --agents must be positive')
+        rng = random.Random(options['seed'])
+        agents = [(uuid.UUID(int=rng.getrandbits(128)), rng.choice(MODELS)) for _ in range(options['agents'])]
+        rules = [self.make_rule(rng, i, agents) for i in range(options['rules'])]
+
+        started = time.perf_counter()
+        engine = PolicyEngine(rules)
+        self.stdout.write(
+            f'{engine.size} rules compiled ({len(engine.by_literal)} indexed literals) '
+            f'in {(time.perf_counter() - started) * 1000:.0f} ms'
+        )
+
+        requests = [self.make_request(rng, agents) for _ in range(options['decisions'])]
+        started = time.perf_counter()
+        decided = [engine.decide(*request) for request in requests]
+        elapsed = time.perf_counter() - started
+        counts = {}
+        for decision, _ in decided:
+            counts[decision] = counts.get(decision, 0) + 1
+        self.stdout.write(
+            f'engine {len(requests) / elapsed:>12,.0f} decisions/s '
+            f'({elapsed / len(requests) * 1e6:.1f} us each, {dict(sorted(counts.items()))})'
+        )
+
+        sample = requests[:options['verify']]
+        if sample:
+            self.verify(rules, sample, decided)
+
+    def make_rule(self, rng, i, agents):
+        kind = rng.random()
+        if kind < 0.4:
+            pattern_type, pattern = 'glob', f'/srv/app{i}/config/settings.yaml'
+        elif kind < 0.7:
+            pattern_type, pattern = 'glob', f'/data/team{i}/*'
+        elif kind < 0.9:
+            pattern_type, pattern = 'glob', f'/home/*/project{i}/*.py'
+        else:
+            pattern_type, pattern = 'regex', rf'https?://api{i}\.example\.com/v[0-9]+/.*'
+
+        scope = rng.random()
+        agent_id, model = None, ''
+        if scope < 0.1:
+            agent_id = rng.choice(agents)[0]
+        elif scope < 0.3:
+            model = rng.choice(MODELS)
+        return PolicyRule(
+            id=i + 1,
+            name=f'rule-{i}',
+            agent_id=agent_id,
+            model=model,
+            action=rng.choice(ACTIONS + [''] * 3),
+            pattern_type=pattern_type,
+            pattern=pattern,
+            decision=rng.choice(DECISIONS),
+            priority=rng.randrange(10),
+        )
+
+    def make_request(self, rng, agents):
+        agent_id, model = rng.choice(agents)
+        n = rng.randrange(int(1e4))
+        target = rng.choice([
+            f'/srv/app{n}/config/settings.yaml',
+            f'/data/team{n}/reports/q3.csv',
+            f'/home/dev/project{n}/main.py',
+            f'https://api{n}.example.com/v2/users',
+            f'/tmp/scratch-{n}.txt',
+        ])
+        return rng.choice(ACTIONS), target, agent_id, model
+
+    def verify(self, rules, sample, decided):
+        """Scan every rule per decision and compare with the engine"""
+        default = PolicyEngine([]).default
+        scanned = []
+        for rule in rules:
+            regex = fnmatch.translate(rule.pattern) if rule.pattern_type == 'glob' else rule.pattern
+            rank = (-rule.priority, -SEVERITY[rule.decision], rule.pk)
+            scanned.append((re.compile(regex), rule_scope(rule), rule.action, rank, rule.decision))
+
+        started = time.perf_counter()
+        mismatches = 0
+        for (action, target, agent_id, model), (decision, _) in zip(sample, decided):
+            scopes = {('global', ''), ('model', model), ('agent', str(agent_id))}
+            best = None
+            for regex, scope, rule_action, rank, rule_decision in scanned:
+                if (scope in scopes and rule_action in ('', action) and regex.fullmatch(target)
+                        and (best is None or rank < best[0])):
+                    best = (rank, rule_decision)
+            mismatches += (best[1] if best else default) != decision
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'scan   {len(sample) / elapsed:>12,.0f} decisions/s '
+            f'({elapsed / len(sample) * 1e6:.1f} us each)'
+        )
+        style = self.style.SUCCESS if not mismatches else self.style.ERROR
+        self.stdout.write(style(f'{mismatches} of {len(sample)} decisions differ from the scan'))
@@ -0,0 +1,104 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.fastpath import FastJSONRenderer, get_fast_serializer, orjson
+from core.models import Agent, AgentLog, AgentMetric, User
+from core.serializers import AgentLogSerializer, AgentMetricSerializer, AgentSummarySerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of DRF list serialization against the values_list() fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows per list')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per path (best is reported)')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        self.stdout.write(f"JSON encoder: {'orjson' if orjson else 'stdlib json'}")
+        try:
+            with transaction.atomic():
+                self.create_rows(rows)
+                for name, serializer_class, queryset in [
+                    ('agents', AgentSummarySerializer, Agent.objects.all()),
+                    ('logs', AgentLogSerializer, AgentLog.objects.select_related('agent')),
+                    ('metrics', AgentMetricSerializer, AgentMetric.objects.all()),
+                ]:
+                    ordering = '-created_at' if name == 'agents' else '-timestamp'
+                    self.bench(name, serializer_class, queryset.order_by(ordering)[:rows], repeat)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_rows(self, count):
+        """Fixture rows inside the benchmark transaction (rolled back afterwards)"""
+        rng = random.Random(1)
+        user = User.objects.create(username=f'bench-{time.time_ns()}')
+        agents = Agent.objects.bulk_create([
+            Agent(user=user, name=f'bench-{i}', model='gpt-4', total_cost=Decimal('1.2345'),
+                  metadata={'team': 'bench'})
+            for i in range(count)
+        ], batch_size=1000)
+        AgentLog.objects.bulk_create([
+            AgentLog(agent=rng.choice(agents), action='file_read', target=f'/data/{i}.csv',
+                     status=rng.choice(['allowed', 'blocked', 'flagged']), metadata={'bytes': i})
+            for i in range(count)
+        ], batch_size=1000)
+        AgentMetric.objects.bulk_create([
+            AgentMetric(agent=rng.choice(agents), tokens_used=rng.randint(1, 5000),
+                        cost=Decimal(rng.randint(1, 99999)) / 10000, files_accessed=3, tool_calls=2)
+            for _ in range(count)
+        ], batch_size=1000)
+
+    def bench(self, name, serializer_class, queryset, repeat):
+        """
+        Times each path end to end (query + serialize + render) and for
+        serialize + render alone, on rows fetched beforehand.
+        """
+        fast_serializer = get_fast_serializer(serializer_class)
+
+        def drf_encode(instances):
+            return JSONRenderer().render(serializer_class(instances, many=True).data)
+
+        def fast_encode(rows):
+            return FastJSONRenderer().render(fast_serializer.serialize(rows))
+
+        instances = list(queryset)
+        rows = list(queryset.values_list(*fast_serializer.paths))
+        if drf_encode(instances) != fast_encode(rows):
+            raise CommandError(f'{name}: fast path output differs from DRF')
+        count = len(rows)
+
+        runs = [
+            ('drf', 'end-to-end', lambda: drf_encode(list(queryset))),
+            ('fast', 'end-to-end', lambda: fast_encode(queryset.values_list(*fast_serializer.paths))),
+            ('drf', 'encode', lambda: drf_encode(instances)),
+            ('fast', 'encode', lambda: fast_encode(rows)),
+        ]
+        rates = {}
+        for label, scope, run in runs:
+            best = min(self.timed(run) for _ in range(repeat))
+            rates[label, scope] = count / best
+            self.stdout.write(
+                f'{name:8} {scope:10} {label:5} {count / best:>12,.0f} rows/s  ({best * 1000:.1f} ms)'
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{name:8} identical output; "
+            f"{rates['fast', 'end-to-end'] / rates['drf', 'end-to-end']:.1f}x end-to-end, "
+            f"{rates['fast', 'encode'] / rates['drf', 'encode']:.1f}x encode"
+        ))
+
+    def timed(self, run):
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.retention import enforce_retention
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete agent logs and metrics older than their plan retention. '
+        'Drops whole expired partitions on PostgreSQL. Run daily (cron or a '
+        'scheduled job).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows per delete transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be removed')
+
+    def handle(self, *args, **options):
+        result = enforce_retention(chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+        verb = 'Would drop' if options['dry_run'] else 'Dropped'
+
+        for name in result['dropped_partitions']:
+            self.stdout.write(f'{verb} partition {name}')
+        for table, count in result['deleted_rows'].items():
+            self.stdout.write(f'{table}: {count} expired rows')
+
+        self.stdout.write(self.style.SUCCESS('Retention enforced'))
@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import RequestFactory, override_settings
+
+from core.models import Waitlist
+from core.views import waitlist_signup
+from core.waitlist import get_signup_buffer, read_count, recount
+
+
+class Command(BaseCommand):
+    help = 'Measure waitlist signups/sec under concurrent submission, direct and queued'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=2000, help='Signups per mode')
+        parser.add_argument('--concurrency', type=int, default=16, help='Submitting threads')
+        parser.add_argument('--duplicates', type=float, default=0.1,
+                            help='Fraction of submissions repeating an earlier email')
+
+    def handle(self, *args, **options):
+        signups, concurrency = options['signups'], options['concurrency']
+        if signups < 1 or concurrency < 1:
+            raise CommandError('--signups and --concurrency must be positive')
+
+        for mode in ('direct', 'queued'):
+            domain = f'loadtest-{uuid.uuid4().hex[:8]}.invalid'
+            emails = self.emails(signups, options['duplicates'], domain)
+            try:
+                self.run(mode, emails, concurrency)
+            finally:
+                # Remove the fixture rows and leave the counter exact
+                Waitlist.objects.filter(email__endswith=f'@{domain}').delete()
+                recount()
+
+    def emails(self, count, duplicates, domain):
+        unique = max(1, round(count * (1 - duplicates)))
+        return [f'user{i % unique}@{domain}' for i in range(count)]
+
+    def run(self, mode, emails, concurrency):
+        factory = RequestFactory()
+        before = read_count()
+        statuses = {}
+        lock = threading.Lock()
+
+        def submit(email):
+            request = factory.post(
+                '/api/waitlist', json.dumps({'email': email}), content_type='application/json'
+            )
+            try:
+                status = waitlist_signup(request).status_code
+            finally:
+                close_old_connections()
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+
+        with override_settings(WAITLIST_BUFFERED=(mode == 'queued')):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(submit, emails))
+            accepted = time.perf_counter() - started
+            get_signup_buffer().flush()
+            persisted = time.perf_counter() - started
+
+        added = read_count() - before
+        expected = len(set(emails))
+        self.stdout.write(
+            f'{mode:7} {len(emails) / accepted:>10,.0f} signups/s accepted, '
+            f'{len(emails) / persisted:>10,.0f} signups/s persisted '
+            f'({persisted * 1000:.0f} ms, responses {dict(sorted(statuses.items()))})'
+        )
+        style = self.style.SUCCESS if added == expected else self.style.WARNING
+        self.stdout.write(style(f'{mode:7} counter +{added}, {expected} unique emails'))
+
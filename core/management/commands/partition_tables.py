@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.retention import (
+    PARTITIONED_MODELS, convert_to_partitioned, ensure_partitions, partitioning_supported
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Convert agent_logs and agent_metrics to timestamp range-partitioned '
+        'tables (PostgreSQL) and create upcoming partitions. Safe to re-run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, help='Future partitions to create')
+
+    def handle(self, *args, **options):
+        if not partitioning_supported():
+            raise CommandError('Partitioning requires PostgreSQL; other databases use chunked deletes')
+
+        for model in PARTITIONED_MODELS:
+            table = model._meta.db_table
+            if convert_to_partitioned(model):
+                self.stdout.write(self.style.SUCCESS(f'Converted {table} to a partitioned table'))
+            for name in ensure_partitions(model, ahead=options['ahead']):
+                self.stdout.write(f'Created partition {name}')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.fleet import DIMENSIONS, refresh
+
+
+class Command(BaseCommand):
+    help = 'Re-aggregate the fleet_summary table (e.g. from cron, ahead of dashboard reads)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group-by', action='append', dest='dimensions',
+                            choices=list(DIMENSIONS),
+                            help='Only refresh this dimension (repeatable)')
+
+    def handle(self, *args, **options):
+        for dimension in options['dimensions'] or DIMENSIONS:
+            groups = refresh(dimension)
+            self.stdout.write(f'{dimension}: {groups} groups')
+
+        self.stdout.write(self.style.SUCCESS('Fleet summary refreshed'))
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_agent_last_security_check_agent_security_score_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('minute', 'Minute'), ('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket', models.DateTimeField()),
+                ('samples', models.IntegerField(default=0)),
+                ('tokens_used', models.BigIntegerField(default=0)),
+                ('cost', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('files_accessed', models.BigIntegerField(default=0)),
+                ('tool_calls', models.BigIntegerField(default=0)),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_rollups', to='core.agent')),
+            ],
+            options={
+                'db_table': 'agent_metric_rollups',
+                'ordering': ['-bucket'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='agentmetricrollup',
+            constraint=models.UniqueConstraint(fields=('agent', 'resolution', 'bucket'), name='agent_metric_rollup_bucket_uniq'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_agentmetricrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agent',
+            index=models.Index(fields=['-created_at', '-id'], name='agents_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentlog',
+            index=models.Index(fields=['-timestamp', '-id'], name='agent_logs_ts_id_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='agentlog',
+            name='agent_logs_timesta_d04ad6_idx',
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:20
+
+from django.db import migrations, models
+
+
+def create_action_search_index(apps, schema_editor):
+    """
+    Trigram index for action__icontains, which PostgreSQL runs as
+    UPPER(action::text) LIKE UPPER('%...%'). Other backends can't index
+    infix LIKE, so they skip it.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS agent_logs_action_trgm_idx '
+        'ON agent_logs USING gin ((UPPER(action::text)) gin_trgm_ops)'
+    )
+
+
+def drop_action_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS agent_logs_action_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentlog',
+            index=models.Index(fields=['agent', '-timestamp', '-id'], name='agent_logs_agent_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentlog',
+            index=models.Index(condition=models.Q(('status', 'blocked')), fields=['-timestamp'], name='agent_logs_blocked_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentlog',
+            index=models.Index(condition=models.Q(('status', 'flagged')), fields=['-timestamp'], name='agent_logs_flagged_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentmetric',
+            index=models.Index(fields=['agent', '-timestamp'], name='agent_metrics_agent_ts_idx'),
+        ),
+        migrations.RunPython(create_action_search_index, drop_action_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agentmetric',
+            index=models.Index(fields=['-timestamp'], name='agent_metrics_ts_idx'),
+        ),
+    ]
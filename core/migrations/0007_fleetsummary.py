@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_metrics_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FleetSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('model', 'Model'), ('status', 'Status'), ('user', 'User'), ('plan', 'Plan')], max_length=20)),
+                ('key', models.CharField(max_length=255)),
+                ('label', models.CharField(blank=True, max_length=255)),
+                ('agents', models.IntegerField(default=0)),
+                ('running_agents', models.IntegerField(default=0)),
+                ('tasks_completed', models.BigIntegerField(default=0)),
+                ('tasks_failed', models.BigIntegerField(default=0)),
+                ('total_cost', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('uptime_seconds', models.BigIntegerField(default=0)),
+                ('avg_security_score', models.FloatField(default=100)),
+                ('tokens_last_hour', models.BigIntegerField(default=0)),
+                ('cost_last_hour', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'fleet_summary',
+                'ordering': ['dimension', 'key'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='fleetsummary',
+            constraint=models.UniqueConstraint(fields=('dimension', 'key'), name='fleet_summary_group_uniq'),
+        ),
+    ]
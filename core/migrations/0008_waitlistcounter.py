@@ -0,0 +1,33 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:47
+
+from django.db import migrations, models
+
+
+def seed_counter(apps, schema_editor):
+    """Start the counter at the current number of signups"""
+    Waitlist = apps.get_model('core', 'Waitlist')
+    WaitlistCounter = apps.get_model('core', 'WaitlistCounter')
+    WaitlistCounter.objects.update_or_create(
+        name='signups', defaults={'count': Waitlist.objects.count()}
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_fleetsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistCounter',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'waitlist_counter',
+            },
+        ),
+        migrations.RunPython(seed_counter, migrations.RunPython.noop),
+    ]
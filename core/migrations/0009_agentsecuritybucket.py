@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_waitlistcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgentSecurityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('logs', models.IntegerField(default=0)),
+                ('blocked', models.IntegerField(default=0)),
+                ('flagged', models.IntegerField(default=0)),
+                ('sensitive', models.IntegerField(default=0)),
+                ('action_risk', models.FloatField(default=0)),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='security_buckets', to='core.agent')),
+            ],
+            options={
+                'db_table': 'agent_security_buckets',
+                'ordering': ['-bucket'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='agentsecuritybucket',
+            constraint=models.UniqueConstraint(fields=('agent', 'bucket'), name='agent_security_bucket_uniq'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_agentsecuritybucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolicyRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('action', models.CharField(blank=True, max_length=100)),
+                ('pattern_type', models.CharField(choices=[('glob', 'Glob'), ('regex', 'Regex')], default='glob', max_length=10)),
+                ('pattern', models.CharField(max_length=1000)),
+                ('decision', models.CharField(choices=[('allowed', 'Allowed'), ('blocked', 'Blocked'), ('flagged', 'Flagged')], max_length=50)),
+                ('priority', models.IntegerField(default=0)),
+                ('enabled', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('agent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='policy_rules', to='core.agent')),
+            ],
+            options={
+                'db_table': 'policy_rules',
+                'ordering': ['-priority', 'id'],
+            },
+        ),
+    ]
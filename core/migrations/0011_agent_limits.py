@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_policyrule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agent',
+            name='actions_per_minute',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='agent',
+            name='cost_budget',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=10, null=True),
+        ),
+    ]
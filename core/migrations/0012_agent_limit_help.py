@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_agent_limits'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='agent',
+            name='actions_per_minute',
+            field=models.PositiveIntegerField(blank=True, help_text='Empty: LIMITS_ACTIONS_PER_MINUTE. 0 refuses every action.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='agent',
+            name='cost_budget',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Per LIMITS_COST_WINDOW_HOURS. Empty: LIMITS_COST_BUDGET. 0 refuses every action.', max_digits=10, null=True),
+        ),
+    ]
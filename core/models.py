@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractUser
 import uuid
 
@@ -25,6 +26,17 @@ class Waitlist(models.Model):
     def __str__(self):
         return self.email
 
+class WaitlistCounter(models.Model):
+    """Maintained signup count (see core.waitlist), so reads skip COUNT(*)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    count = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'waitlist_counter'
+    
+    def __str__(self):
+        return f'{self.name}: {self.count}'
+
 class Agent(models.Model):
     """AI Agents being monitored"""
     STATUS_CHOICES = [
@@ -53,9 +65,29 @@ class Agent(models.Model):
     security_score = models.IntegerField(default=100)  # 0-100
     last_security_check = models.DateTimeField(null=True, blank=True)
     
+    # Limits (core.limits); None falls back to the LIMITS_* settings, 0 refuses every action
+    actions_per_minute = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text='Empty: LIMITS_ACTIONS_PER_MINUTE. 0 refuses every action.'
+    )
+    cost_budget = models.DecimalField(
+        max_digits=10, decimal_places=4, null=True, blank=True,
+        help_text='Per LIMITS_COST_WINDOW_HOURS. Empty: LIMITS_COST_BUDGET. 0 refuses every action.'
+    )
+    
     class Meta:
         db_table = 'agents'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='agents_created_id_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember loaded values so save() receivers can compute deltas
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
     
     def __str__(self):
         return f"{self.name} ({self.status})"
@@ -79,7 +111,21 @@ class AgentLog(models.Model):
         db_table = 'agent_logs'
         ordering = ['-timestamp']
         indexes = [
-            models.Index(fields=['-timestamp']),
+            models.Index(fields=['-timestamp', '-id'], name='agent_logs_ts_id_idx'),
+            # Per-agent history (AgentViewSet.logs, ?agent= filter)
+            models.Index(fields=['agent', '-timestamp', '-id'], name='agent_logs_agent_ts_idx'),
+            # Alert queries only ever look at blocked or flagged rows. One
+            # partial index per status so SQLite can prove it applies too.
+            models.Index(
+                fields=['-timestamp'],
+                name='agent_logs_blocked_ts_idx',
+                condition=models.Q(status='blocked'),
+            ),
+            models.Index(
+                fields=['-timestamp'],
+                name='agent_logs_flagged_ts_idx',
+                condition=models.Q(status='flagged'),
+            ),
         ]
     
     def __str__(self):
@@ -98,6 +144,130 @@ class AgentMetric(models.Model):
     class Meta:
         db_table = 'agent_metrics'
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['agent', '-timestamp'], name='agent_metrics_agent_ts_idx'),
+            # Fleet-wide time series
+            models.Index(fields=['-timestamp'], name='agent_metrics_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.agent.name}: ${self.cost} ({self.tokens_used} tokens)"
+
+class AgentMetricRollup(models.Model):
+    """Pre-aggregated AgentMetric totals per agent and time bucket"""
+    RESOLUTION_CHOICES = [
+        ('minute', 'Minute'),
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='metric_rollups')
+    resolution = models.CharField(max_length=10, choices=RESOLUTION_CHOICES)
+    bucket = models.DateTimeField()  # Start of the bucket (UTC)
+    samples = models.IntegerField(default=0)
+    tokens_used = models.BigIntegerField(default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    files_accessed = models.BigIntegerField(default=0)
+    tool_calls = models.BigIntegerField(default=0)
+    
+    class Meta:
+        db_table = 'agent_metric_rollups'
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['agent', 'resolution', 'bucket'],
+                name='agent_metric_rollup_bucket_uniq'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.agent_id} {self.resolution} {self.bucket:%Y-%m-%d %H:%M}"
+
+class AgentSecurityBucket(models.Model):
+    """Hourly per-agent log counts the security score is computed from (see core.security)"""
+    agent = models.ForeignKey(Agent, on_delete=models.CASCADE, related_name='security_buckets')
+    bucket = models.DateTimeField()  # Start of the hour (UTC)
+    logs = models.IntegerField(default=0)
+    blocked = models.IntegerField(default=0)
+    flagged = models.IntegerField(default=0)
+    sensitive = models.IntegerField(default=0)  # Logs touching sensitive targets
+    action_risk = models.FloatField(default=0)  # Sum of per-action risk weights
+    
+    class Meta:
+        db_table = 'agent_security_buckets'
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['agent', 'bucket'], name='agent_security_bucket_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.agent_id} {self.bucket:%Y-%m-%d %H:%M}"
+
+class PolicyRule(models.Model):
+    """Rule deciding an agent action's status from its target (see core.policy)"""
+    PATTERN_CHOICES = [
+        ('glob', 'Glob'),
+        ('regex', 'Regex'),
+    ]
+    
+    name = models.CharField(max_length=255, blank=True)
+    # Scope: one agent, agents running one model, or (neither) every agent
+    agent = models.ForeignKey(
+        Agent, on_delete=models.CASCADE, null=True, blank=True, related_name='policy_rules'
+    )
+    model = models.CharField(max_length=100, blank=True)  # Ignored when agent is set
+    action = models.CharField(max_length=100, blank=True)  # Blank matches every action
+    pattern_type = models.CharField(max_length=10, choices=PATTERN_CHOICES, default='glob')
+    pattern = models.CharField(max_length=1000)  # Must match the whole target
+    decision = models.CharField(max_length=50, choices=AgentLog.STATUS_CHOICES)
+    priority = models.IntegerField(default=0)  # Highest wins; ties go to the stricter decision
+    enabled = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'policy_rules'
+        ordering = ['-priority', 'id']
+    
+    def clean(self):
+        from .policy import PolicyError, compile_pattern
+        try:
+            compile_pattern(self.pattern_type, self.pattern)
+        except PolicyError as e:
+            raise ValidationError({'pattern': str(e)})
+    
+    def __str__(self):
+        return self.name or f"{self.action or '*'} {self.pattern} -> {self.decision}"
+
+class FleetSummary(models.Model):
+    """Materialized per-group fleet totals (see core.fleet)"""
+    DIMENSION_CHOICES = [
+        ('model', 'Model'),
+        ('status', 'Status'),
+        ('user', 'User'),
+        ('plan', 'Plan'),
+    ]
+    
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=255)
+    label = models.CharField(max_length=255, blank=True)
+    agents = models.IntegerField(default=0)
+    running_agents = models.IntegerField(default=0)
+    tasks_completed = models.BigIntegerField(default=0)
+    tasks_failed = models.BigIntegerField(default=0)
+    total_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    uptime_seconds = models.BigIntegerField(default=0)
+    avg_security_score = models.FloatField(default=100)
+    tokens_last_hour = models.BigIntegerField(default=0)
+    cost_last_hour = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    refreshed_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'fleet_summary'
+        ordering = ['dimension', 'key']
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='fleet_summary_group_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.dimension}={self.key}"
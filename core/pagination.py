@@ -0,0 +1,160 @@
+"""
+Agent Control Panel - Keyset pagination
+Seeks on (<ordering field>, id) instead of OFFSET, so page 1000 costs
+the same index range scan as page 1.
+"""
+import base64
+import json
+import uuid
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Newest-first pages keyed on (ordering_field, id).
+
+    ?cursor=<token>  continue after the last row of the previous page
+    ?since=<token>   tail mode: rows newer than the token, oldest first,
+                     for cheaply polling what arrived since the last call
+
+    Tokens are opaque; clients should only follow the returned links.
+    """
+    ordering_field = None
+    page_size = 100
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    since_query_param = 'since'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        field = self.ordering_field
+
+        since = self.decode_cursor(request.query_params.get(self.since_query_param))
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        self.tail = since is not None
+
+        if self.tail:
+            queryset = self.seek(queryset.order_by(field, 'id'), since, newer=True)
+        else:
+            queryset = queryset.order_by(f'-{field}', '-id')
+            if cursor is not None:
+                queryset = self.seek(queryset, cursor, newer=False)
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        self.first = rows[0] if rows else None
+        self.last = rows[-1] if rows else None
+        self.since = since
+        return rows
+
+    def seek(self, queryset, position, newer):
+        """
+        Rows after ``position`` in (ordering_field, id) order. The OR
+        alone isn't an index range, so it is ANDed with the redundant
+        bound on the ordering field, which the index can seek on.
+        """
+        field, (value, pk) = self.ordering_field, position
+        op = 'gt' if newer else 'lt'
+        return queryset.filter(
+            Q(**{f'{field}__{op}e': value}),
+            Q(**{f'{field}__{op}': value}) | Q(**{field: value, f'id__{op}': pk}),
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'tail': self.get_tail_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'tail': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        """Older rows (or, in tail mode, more rows that are still pending)"""
+        if not self.has_more:
+            return None
+        url = self._base_url()
+        if self.tail:
+            return replace_query_param(url, self.since_query_param, self.encode_cursor(self.last))
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_tail_link(self):
+        """Link that returns only rows newer than anything seen so far"""
+        if self.tail:
+            newest = self.encode_cursor(self.last) if self.last else self._encode(self.since)
+        elif self.first is not None and self.request.query_params.get(self.cursor_query_param) is None:
+            newest = self.encode_cursor(self.first)
+        else:
+            return None
+        url = remove_query_param(self._base_url(), self.cursor_query_param)
+        return replace_query_param(url, self.since_query_param, newest)
+
+    def _base_url(self):
+        return self.request.build_absolute_uri()
+
+    def cursor_fields(self):
+        """Attributes encode_cursor() reads (also from values_list rows)"""
+        return (self.ordering_field, 'id')
+
+    def encode_cursor(self, obj):
+        return self._encode((getattr(obj, self.ordering_field), obj.id))
+
+    def _encode(self, position):
+        value, pk = position
+        raw = json.dumps([value.isoformat(), str(pk)]).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            value, pk = json.loads(raw)
+            value = parse_datetime(value)
+            if value is None:
+                raise ValueError(token)
+            return value, self.parse_pk(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def parse_pk(self, pk):
+        return int(pk)
+
+
+class LogKeysetPagination(KeysetPagination):
+    """AgentLog pages keyed on (timestamp, id)"""
+    ordering_field = 'timestamp'
+
+
+class AgentKeysetPagination(KeysetPagination):
+    """Agent pages keyed on (created_at, id)"""
+    ordering_field = 'created_at'
+
+    def parse_pk(self, pk):
+        return uuid.UUID(pk)
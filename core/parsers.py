@@ -0,0 +1,119 @@
+"""
+Request parsers for agent ingestion endpoints
+"""
+import json
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import BaseParser
+
+
+class LengthRequired(APIException):
+    """A chunked body the server can't tell the end of"""
+    status_code = status.HTTP_411_LENGTH_REQUIRED
+    default_detail = (
+        'Chunked request bodies need a server that de-chunks them; '
+        'send Content-Length instead.'
+    )
+    default_code = 'length_required'
+
+
+class NDJSONError:
+    """Placeholder for an NDJSON line that could not be decoded"""
+
+    def __init__(self, line_number, message):
+        self.line_number = line_number
+        self.message = message
+
+    def __repr__(self):
+        return f"NDJSONError(line={self.line_number}, {self.message!r})"
+
+
+def iter_ndjson(stream, encoding='utf-8', max_line_bytes=None, with_line_numbers=False):
+    """
+    Yield one decoded record per non-empty line of ``stream``.
+
+    Lines are read one at a time so memory stays bounded by the longest
+    line. Undecodable lines yield an ``NDJSONError`` instead of raising,
+    which lets callers report per-record errors without aborting.
+    With ``with_line_numbers`` each item is a ``(line_number, record)`` pair.
+    """
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1) if max_line_bytes else stream.readline()
+        if not line:
+            break
+        line_number += 1
+
+        if max_line_bytes and len(line) > max_line_bytes:
+            # Drain the rest of the oversized line before reporting it
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_bytes)
+            error = NDJSONError(line_number, f'Line exceeds {max_line_bytes} bytes')
+            yield (line_number, error) if with_line_numbers else error
+            continue
+
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line.decode(encoding))
+        except (UnicodeDecodeError, ValueError) as e:
+            record = NDJSONError(line_number, f'Invalid JSON: {e}')
+        yield (line_number, record) if with_line_numbers else record
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON into a list of records.
+
+    Invalid lines become ``NDJSONError`` entries rather than failing the
+    whole request.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return []
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        return list(iter_ndjson(stream, encoding=encoding))
+
+
+def is_chunked(request):
+    """Whether the body was sent without a Content-Length (chunked)"""
+    meta = getattr(request, '_request', request).META
+    return not meta.get('CONTENT_LENGTH') and 'chunked' in meta.get('HTTP_TRANSFER_ENCODING', '').lower()
+
+
+def get_body_stream(request):
+    """
+    Return a file-like object for reading the raw request body incrementally.
+    
+    Django limits reads to CONTENT_LENGTH, which is absent for chunked
+    uploads. WSGI servers that de-chunk the body (gunicorn sets
+    ``wsgi.input_terminated``) can be read directly until EOF instead;
+    on other WSGI servers a chunked body would read as empty, so it is
+    refused with 411 (LengthRequired). ASGI requests hold the whole body.
+    """
+    django_request = getattr(request, '_request', request)
+    meta = django_request.META
+    if not meta.get('CONTENT_LENGTH') and meta.get('wsgi.input_terminated'):
+        return meta['wsgi.input']
+    if is_chunked(django_request) and 'wsgi.input' in meta:
+        raise LengthRequired()
+    return django_request
+
+
+def parse_chunked(request, parsers):
+    """
+    Parse a chunked body with the first of ``parsers`` that accepts its
+    content type. DRF reads nothing from a body without Content-Length,
+    so views call this instead of request.data for chunked requests.
+    """
+    content_type = request.content_type
+    parser = next(
+        (parser for parser in parsers if content_type.split(';')[0].strip() == parser.media_type),
+        parsers[0]
+    )
+    return parser.parse(get_body_stream(request), content_type, {'request': request})
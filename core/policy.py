@@ -0,0 +1,344 @@
+"""
+Agent Control Panel - Policy engine
+Decides whether an agent action is allowed, blocked or flagged from
+PolicyRule rows. A rule matches an action name (or every action) and a
+glob or regex that must match the whole target. Rules belong to one
+agent, to every agent running one model, or to every agent. Among the
+rules that match, the highest priority wins. Ties go to the stricter
+decision and then to the older rule. Without a match the decision is
+POLICY_DEFAULT_DECISION.
+
+The enabled rules are compiled once per rule-set version, so a decision
+makes no query and doesn't try rules one by one:
+
+- plain globs (no wildcard) are dict keys
+- every other pattern is filed under the longest literal text its
+  matches must contain ('/.ssh/' for '/home/*/.ssh/*'). One pass of an
+  Aho-Corasick trie over the target finds the literals it contains, and
+  only the rules filed under those are tried: per literal and (scope,
+  action), one combined regex whose alternatives are in precedence
+  order, so the first that matches is the best rule.
+- patterns without such a literal (e.g. '*', case-insensitive regexes)
+  are tried for every target, combined the same way
+- regexes with capture groups or global flags can't be combined
+  (backreferences would be renumbered, flags must lead the pattern), so
+  they are tried one by one
+
+The rule-set version is read from policy_rules itself (row count and
+latest updated_at, one aggregate query), so a change saved by any
+worker reaches every other within POLICY_RELOAD_SECONDS, whatever the
+cache backends. Each process checks it at most that often and
+recompiles when it changed; the process that saved the change checks
+again as soon as it commits. `manage.py bench_policy` measures the
+decision rate.
+"""
+import fnmatch
+import logging
+import re
+import threading
+import time
+from collections import defaultdict, deque, namedtuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .models import PolicyRule
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+# Stricter decisions win priority ties
+SEVERITY = {'blocked': 2, 'flagged': 1, 'allowed': 0}
+
+GLOB_CHARS = re.compile(r'[*?\[]')
+
+GLOBAL = ('global', '')
+
+CompiledRule = namedtuple('CompiledRule', ['id', 'name', 'decision', 'priority', 'rank'])
+Decision = namedtuple('Decision', ['decision', 'rule'])
+
+
+class PolicyError(ValueError):
+    """A rule pattern that can't be compiled"""
+
+
+def compile_pattern(pattern_type, pattern):
+    """
+    Classify a rule pattern as ('exact', text) or ('regex', source,
+    literal). Globs are shell-style (fnmatch) and ``*`` also matches
+    ``/``. Raises PolicyError for an invalid pattern.
+    """
+    if pattern_type == 'glob':
+        if not GLOB_CHARS.search(pattern):
+            return 'exact', pattern
+        source = fnmatch.translate(pattern)
+    elif pattern_type == 'regex':
+        source = pattern
+    else:
+        raise PolicyError(f'Unknown pattern type "{pattern_type}"')
+    try:
+        parsed = sre_parse.parse(source)
+    except re.error as e:
+        raise PolicyError(f'Invalid pattern: {e}')
+    return 'regex', source, required_literal(parsed)
+
+
+def required_literal(parsed):
+    """
+    Longest literal text every match of a parsed regex contains ('' when
+    there is none, or matching ignores case)
+    """
+    if parsed.state.flags & re.IGNORECASE:
+        return ''
+    best = ''
+    run = []
+
+    def walk(items):
+        nonlocal best
+        for op, av in items:
+            if op.name == 'LITERAL':
+                run.append(chr(av))
+                continue
+            # Groups in the sequence are required too; read through them
+            if op.name == 'SUBPATTERN' and not av[1] & re.IGNORECASE:
+                walk(av[3])
+                continue
+            if op.name == 'ATOMIC_GROUP':
+                walk(av)
+                continue
+            if len(run) > len(best):
+                best = ''.join(run)
+            run.clear()
+
+    walk(parsed)
+    if len(run) > len(best):
+        best = ''.join(run)
+    return best
+
+
+def combinable(source):
+    """Whether ``source`` still compiles as one alternative of a combined regex"""
+    try:
+        return not re.compile(f'(?:{source})').groups
+    except re.error:
+        return False
+
+
+def combine(alternatives):
+    """
+    One regex for [(rule, source)] plus {group name: rule}; the first
+    alternative that matches is the best-ranked rule
+    """
+    alternatives = sorted(alternatives, key=lambda item: item[0].rank)
+    regex = re.compile('|'.join(
+        f'(?P<r{i}>{source})' for i, (_, source) in enumerate(alternatives)
+    ))
+    return regex, {f'r{i}': rule for i, (rule, _) in enumerate(alternatives)}
+
+
+def rule_scope(rule):
+    if rule.agent_id:
+        return ('agent', str(rule.agent_id))
+    if rule.model:
+        return ('model', rule.model)
+    return GLOBAL
+
+
+def better(best, rule):
+    return rule if best is None or (rule is not None and rule.rank < best.rank) else best
+
+
+class LiteralIndex:
+    """Aho-Corasick trie: which of a set of strings occur in a text, in one pass"""
+
+    def __init__(self, words):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for word in words:
+            state = 0
+            for char in word:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.out[state] = (word,)
+
+        # Breadth first, so each state's fail link is final before its children's
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.out[child] += self.out[self.fail[child]]
+                queue.append(child)
+
+    def find(self, text):
+        goto, out = self.goto, self.out
+        found = set()
+        state = 0
+        for char in text:
+            following = goto[state].get(char)
+            if following is None:
+                following = goto[state][char] = self.follow(state, char)
+            state = following
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def follow(self, state, char):
+        """Transition through fail links (find() caches the result in goto)"""
+        while state and char not in self.goto[state]:
+            state = self.fail[state]
+        return self.goto[state].get(char, 0)
+
+
+class PolicyEngine:
+    """A compiled rule set; decide() is safe to call from any thread"""
+
+    def __init__(self, rules, version=None, default=None):
+        self.version = version
+        self.default = default or settings.POLICY_DEFAULT_DECISION
+        self.size = 0
+        self.exact = defaultdict(dict)  # {(scope, action): {target: rule}}
+        self.separate = defaultdict(list)  # {(scope, action): [(regex, rule)]}
+        by_literal = defaultdict(lambda: defaultdict(list))
+        unanchored = defaultdict(list)
+
+        for rule in rules:
+            try:
+                compiled = compile_pattern(rule.pattern_type, rule.pattern)
+            except PolicyError as e:
+                # Saved without full_clean(); skip it rather than fail every decision
+                logger.warning('Skipping policy rule %s: %s', rule.pk, e)
+                continue
+            rank = (-rule.priority, -SEVERITY.get(rule.decision, 0), rule.pk or 0)
+            entry = CompiledRule(rule.pk, rule.name, rule.decision, rule.priority, rank)
+            key = (rule_scope(rule), rule.action)
+            self.size += 1
+
+            if compiled[0] == 'exact':
+                targets = self.exact[key]
+                targets[compiled[1]] = better(targets.get(compiled[1]), entry)
+                continue
+            _, source, literal = compiled
+            if not combinable(source):
+                self.separate[key].append((re.compile(source), entry))
+            elif literal:
+                by_literal[literal][key].append((entry, source))
+            else:
+                unanchored[key].append((entry, source))
+
+        # {literal: {(scope, action): (regex, rules by group name)}}
+        self.by_literal = {
+            literal: {key: combine(items) for key, items in groups.items()}
+            for literal, groups in by_literal.items()
+        }
+        self.unanchored = {key: combine(items) for key, items in unanchored.items()}
+        self.literals = LiteralIndex(self.by_literal) if self.by_literal else None
+        self.keys = set(self.exact) | set(self.separate) | set(self.unanchored) | {
+            key for groups in self.by_literal.values() for key in groups
+        }
+
+    def decide(self, action, target, agent_id=None, model=None):
+        """Decision for one action of an agent (or of any agent running ``model``)"""
+        scopes = [GLOBAL]
+        if model:
+            scopes.append(('model', model))
+        if agent_id:
+            scopes.append(('agent', str(agent_id)))
+        keys = [key for scope in scopes for key in ((scope, action), (scope, '')) if key in self.keys]
+        if not keys:
+            return Decision(self.default, None)
+
+        target = target or ''
+        best = None
+        for key in keys:
+            exact = self.exact.get(key)
+            if exact:
+                best = better(best, exact.get(target))
+            group = self.unanchored.get(key)
+            if group:
+                best = better(best, self.match(group, target))
+            for regex, rule in self.separate.get(key, ()):
+                if regex.fullmatch(target):
+                    best = better(best, rule)
+
+        if self.literals is not None:
+            for literal in self.literals.find(target):
+                groups = self.by_literal[literal]
+                for key in keys:
+                    group = groups.get(key)
+                    if group:
+                        best = better(best, self.match(group, target))
+        return Decision(best.decision if best else self.default, best)
+
+    @staticmethod
+    def match(group, target):
+        found = group[0].fullmatch(target)
+        return group[1][found.lastgroup] if found else None
+
+
+def rules_version():
+    """(rule count, latest updated_at): changes with every save and delete"""
+    found = PolicyRule.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    return found['count'], found['updated']
+
+
+def load_engine(version=None):
+    """Compile the enabled rules from the database"""
+    rules = PolicyRule.objects.filter(enabled=True).only(
+        'id', 'name', 'agent_id', 'model', 'action', 'pattern_type', 'pattern', 'decision', 'priority'
+    )
+    return PolicyEngine(rules.iterator(), version)
+
+
+_engine = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    This process's compiled rule set, recompiled when rules_version()
+    changed (checked at most every POLICY_RELOAD_SECONDS)
+    """
+    global _engine, _checked_at
+    engine = _engine
+    if engine is not None and time.monotonic() - _checked_at < settings.POLICY_RELOAD_SECONDS:
+        return engine
+    with _lock:
+        version = rules_version()
+        if _engine is None or _engine.version != version:
+            _engine = load_engine(version)
+        _checked_at = time.monotonic()
+        return _engine
+
+
+def invalidate():
+    """Make the next get_engine() call check the version"""
+    global _checked_at
+    _checked_at = 0.0
+
+
+def rules_changed():
+    """
+    Check the rules again once the transaction commits (called by the
+    PolicyRule signal receivers). Other processes see the change through
+    rules_version(); a queryset.update() must also set updated_at.
+    """
+    transaction.on_commit(invalidate)
+
+
+def decide(action, target, agent_id=None, model=None):
+    return get_engine().decide(action, target, agent_id, model)
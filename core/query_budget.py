@@ -0,0 +1,98 @@
+"""
+Agent Control Panel - Query budgets
+Views declare how many SQL queries a request may cost; the middleware
+counts them and warns (or raises, in tests) when a view goes over,
+which is how N+1 regressions get caught.
+"""
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(count):
+    """Declare the query budget of a function view (apply above @api_view)"""
+    def decorator(view):
+        view.query_budget = count
+        return view
+    return decorator
+
+
+def get_query_budget(view_func, method):
+    """
+    Budget for ``view_func`` handling ``method``, or None if undeclared.
+
+    Function views carry ``query_budget`` directly. Viewsets declare
+    ``query_budgets = {action: count}`` on the class.
+    """
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is not None:
+        return budget
+
+    view_class = getattr(view_func, 'cls', None)
+    if view_class is None:
+        return None
+    budget = getattr(view_class, 'query_budget', None)
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        action = actions.get(method.lower())
+        return getattr(view_class, 'query_budgets', {}).get(action, budget)
+    return budget
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class QueryBudgetMiddleware:
+    """
+    Enforces declared budgets according to settings.QUERY_BUDGET_MODE:
+    'off', 'warn' (log a warning) or 'raise' (raise QueryBudgetExceeded).
+
+    Queries are counted on the calling thread's connection. Under ASGI
+    the ORM runs them on a shared worker thread, so the async path passes
+    requests through uncounted; budgets are enforced under WSGI and in
+    tests (the test client is synchronous).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.get_response(request)
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', 'off')
+        if mode == 'off':
+            return self.get_response(request)
+
+        counter = _QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        budget = get_query_budget(match.func, request.method) if match else None
+        if budget is not None and counter.count > budget:
+            message = (
+                f'{request.method} {request.path} ran {counter.count} queries '
+                f'(budget {budget})'
+            )
+            if mode == 'raise':
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -1,7 +1,134 @@
-from django.views import View
-from django.http import HttpResponse
-from django.conf import settings
+"""
+Agent Control Panel - React app shell
+ReactAppView is the catch-all route, so every client-side navigation
+(and every stray 404) is answered with index.html. The file is read
+once, compressed once (gzip, plus brotli when installed) when the
+server starts (backend.wsgi / backend.asgi) and served from memory with
+a strong ETag. In DEBUG its mtime is checked on each request so a
+rebuilt frontend shows up without a restart.
+"""
+import gzip
+import hashlib
 import os
+import re
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views import View
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+
+def index_candidates():
+    """index.html after collectstatic first, then the frontend build"""
+    return [
+        os.path.join(settings.STATIC_ROOT, 'index.html'),
+        os.path.join(settings.BASE_DIR, 'frontend', 'dist', 'index.html'),
+    ]
+
+
+class _AssetParser(HTMLParser):
+    """Collects the hashed bundles (under /assets/) an HTML page loads"""
+
+    def __init__(self):
+        super().__init__()
+        self.assets = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'script' and attrs.get('src'):
+            rel = 'modulepreload' if attrs.get('type') == 'module' else 'preload'
+            self.add(attrs['src'], rel, 'script')
+        elif tag == 'link' and attrs.get('href'):
+            rels = (attrs.get('rel') or '').lower().split()
+            if 'stylesheet' in rels:
+                self.add(attrs['href'], 'preload', 'style')
+            elif 'modulepreload' in rels:
+                self.add(attrs['href'], 'modulepreload', 'script')
+
+    def add(self, url, rel, kind):
+        if '/assets/' in url and (url, rel, kind) not in self.assets:
+            self.assets.append((url, rel, kind))
+
+
+def preload_links(html):
+    """Link header value preloading the hashed bundles ``html`` references"""
+    parser = _AssetParser()
+    parser.feed(html.decode('utf-8', 'replace'))
+    links = []
+    for url, rel, kind in parser.assets:
+        link = f'<{url}>; rel={rel}'
+        if rel == 'preload':
+            link += f'; as={kind}'
+        links.append(link)
+    return ', '.join(links)
+
+
+class AppShell:
+    """index.html in memory: identity/gzip/brotli bodies and validators"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, 'rb') as f:
+            body = f.read()
+
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        # Strong validators differ per content-coding
+        self.variants = {None: (body, f'"{digest}"')}
+        compressed = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(body, quality=11)
+        for encoding, data in compressed.items():
+            if len(data) < len(body):
+                self.variants[encoding] = (data, f'"{digest}-{encoding}"')
+        self.etags = {etag for _, etag in self.variants.values()}
+        self.link = preload_links(body)
+
+    def is_current(self):
+        try:
+            return os.stat(self.path).st_mtime_ns == self.mtime
+        except OSError:
+            return False
+
+    def encoding_for(self, request):
+        """Best precompressed variant the client accepts (brotli first)"""
+        accepted = set()
+        for item in request.headers.get('Accept-Encoding', '').split(','):
+            coding, _, params = item.strip().partition(';')
+            if not re.search(r'\bq=0(\.0*)?\s*$', params.strip()):
+                accepted.add(coding.strip().lower())
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and (encoding in accepted or '*' in accepted):
+                return encoding
+        return None
+
+
+_shell = None
+
+
+def get_app_shell():
+    """
+    The cached AppShell, loaded on first use. Returns None while no
+    index.html exists. Under DEBUG a changed file is reloaded.
+    """
+    global _shell
+    shell = _shell
+    if shell is not None and (not settings.DEBUG or shell.is_current()):
+        return shell
+    for path in index_candidates():
+        if os.path.exists(path):
+            shell = _shell = AppShell(path)
+            return shell
+    _shell = None
+    return None
+
 
 class ReactAppView(View):
     """
@@ -9,27 +136,36 @@ class ReactAppView(View):
     React Router will handle the actual routing.
     """
     def get(self, request, *args, **kwargs):
-        # Try static files directory first (after collectstatic)
-        static_index = os.path.join(settings.STATIC_ROOT, 'index.html')
-        
-        # Try source directory (development)
-        source_index = os.path.join(settings.BASE_DIR, 'frontend', 'dist', 'index.html')
-        
-        # Check which one exists
-        index_path = None
-        if os.path.exists(static_index):
-            index_path = static_index
-        elif os.path.exists(source_index):
-            index_path = source_index
-        
-        if index_path:
-            with open(index_path, 'r') as f:
-                return HttpResponse(f.read(), content_type='text/html')
-        
-        # Fallback error with debugging info
-        return HttpResponse(
-            f'<h1>React app not found</h1>'
-            f'<p>Checked: {static_index} (exists: {os.path.exists(static_index)})</p>'
-            f'<p>Checked: {source_index} (exists: {os.path.exists(source_index)})</p>',
-            status=500
-        )
+        shell = get_app_shell()
+        if shell is None:
+            # Fallback error with debugging info
+            checked = ''.join(
+                f'<p>Checked: {path} (exists: {os.path.exists(path)})</p>'
+                for path in index_candidates()
+            )
+            return HttpResponse(f'<h1>React app not found</h1>{checked}', status=500)
+
+        encoding = shell.encoding_for(request)
+        body, etag = shell.variants[encoding]
+
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+            if '*' in etags or shell.etags & etags:
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return self.finalize(response, shell)
+
+        response = HttpResponse(body, content_type='text/html; charset=utf-8')
+        response['ETag'] = etag
+        if encoding:
+            response['Content-Encoding'] = encoding
+        return self.finalize(response, shell)
+
+    def finalize(self, response, shell):
+        # Revalidate every time: the shell names the current hashed bundles
+        response['Cache-Control'] = 'no-cache'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if shell.link:
+            response['Link'] = shell.link
+        return response
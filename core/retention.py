@@ -0,0 +1,315 @@
+"""
+Agent Control Panel - Data retention
+Expires agent_logs/agent_metrics rows per User.plan. On PostgreSQL the
+tables can be range-partitioned by timestamp so whole expired partitions
+are dropped in O(1); everything else is removed with chunked deletes.
+Metric rollup buckets follow the same windows once they end before the
+cutoff, so a bucket straddling it keeps up to one bucket width (at most
+a day) of older samples until it expires whole.
+"""
+import logging
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AgentLog, AgentMetric, AgentMetricRollup, User
+from .rollups import RESOLUTIONS
+from .versions import GLOBAL_SCOPE, bump
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_MODELS = [AgentLog, AgentMetric]
+
+
+# ---------------------------------------------------------------------------
+# Retention windows
+# ---------------------------------------------------------------------------
+
+def retention_days(plan):
+    """Days of history kept for ``plan``; None keeps everything"""
+    windows = settings.RETENTION_DAYS
+    return windows.get(plan, windows.get('default'))
+
+
+def retention_cutoffs(now=None):
+    """{plan: cutoff datetime or None} for every plan that has users"""
+    now = now or timezone.now()
+    cutoffs = {}
+    for plan in User.objects.order_by().values_list('plan', flat=True).distinct():
+        days = retention_days(plan)
+        cutoffs[plan] = now - timedelta(days=days) if days is not None else None
+    return cutoffs
+
+
+def drop_horizon(cutoffs):
+    """
+    Rows older than this are expired for every plan, so whole partitions
+    before it can be dropped. None if any plan keeps history forever.
+    """
+    if not cutoffs or any(cutoff is None for cutoff in cutoffs.values()):
+        return None
+    return min(cutoffs.values())
+
+
+# ---------------------------------------------------------------------------
+# Chunked deletes (all backends)
+# ---------------------------------------------------------------------------
+
+def delete_in_chunks(queryset, chunk_size):
+    """Delete matching rows in short transactions of ``chunk_size`` ids"""
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            model.objects.filter(id__in=ids).delete()
+        deleted += len(ids)
+
+
+def purge_expired_rows(cutoffs, chunk_size=None, dry_run=False):
+    """Remove rows past their owner's plan retention. Returns counts per table"""
+    chunk_size = chunk_size or settings.RETENTION_DELETE_CHUNK_SIZE
+    counts = {}
+    for model in PARTITIONED_MODELS:
+        total = 0
+        for plan, cutoff in cutoffs.items():
+            if cutoff is None:
+                continue
+            expired = model.objects.filter(agent__user__plan=plan, timestamp__lt=cutoff)
+            total += expired.count() if dry_run else delete_in_chunks(expired, chunk_size)
+        counts[model._meta.db_table] = total
+
+    # Rollups answer /metrics totals, so they must not outlive the samples
+    total = 0
+    for plan, cutoff in cutoffs.items():
+        if cutoff is None:
+            continue
+        for resolution, width, _ in RESOLUTIONS:
+            expired = AgentMetricRollup.objects.filter(
+                agent__user__plan=plan, resolution=resolution, bucket__lte=cutoff - width
+            )
+            total += expired.count() if dry_run else delete_in_chunks(expired, chunk_size)
+    counts[AgentMetricRollup._meta.db_table] = total
+    return counts
+
+
+# ---------------------------------------------------------------------------
+# PostgreSQL range partitions
+# ---------------------------------------------------------------------------
+
+def partitioning_supported():
+    return connection.vendor == 'postgresql'
+
+
+def partition_interval():
+    return timedelta(days=settings.RETENTION_PARTITION_DAYS)
+
+
+def partition_start(moment):
+    """Start of the partition bucket containing ``moment`` (UTC, epoch aligned)"""
+    days = settings.RETENTION_PARTITION_DAYS
+    day = moment.astimezone(dt_timezone.utc).date()
+    day -= timedelta(days=day.toordinal() % days)
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def is_partitioned(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p "
+            "JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [table]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table):
+    """[(name, upper_bound or None)] for the partitions of ``table``"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = %s AND pg_table_is_visible(p.oid)",
+            [table]
+        )
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        match = re.search(r"TO \('([^']+)'\)", bound or '')
+        upper = None
+        if match:
+            upper = datetime.fromisoformat(match.group(1))
+            if upper.tzinfo is None:
+                upper = upper.replace(tzinfo=dt_timezone.utc)
+        partitions.append((name, upper))
+    return partitions
+
+
+def convert_to_partitioned(model):
+    """
+    Turn ``model``'s table into a timestamp range-partitioned table.
+
+    The existing table is attached, without copying, as the partition for
+    everything before the next bucket boundary and is dropped once all of
+    it has expired. Runs under an exclusive lock; schedule it for a quiet
+    moment. No-op if the table is already partitioned.
+    """
+    table = model._meta.db_table
+    if is_partitioned(table):
+        return False
+
+    legacy = f'{table}_legacy'
+    boundary = partition_start(timezone.now()) + partition_interval()
+    qn = connection.ops.quote_name
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {qn(table)} IN ACCESS EXCLUSIVE MODE')
+
+        # Capture index definitions while they still name the original table
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE tablename = %s AND schemaname = current_schema()",
+            [table]
+        )
+        indexes = [(name, sql) for name, sql in cursor.fetchall() if not name.endswith('_pkey')]
+
+        cursor.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {qn(table)}')
+        next_id = cursor.fetchone()[0]
+
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+            [table]
+        )
+        primary_key = cursor.fetchone()
+
+        cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}')
+        # The parent's key is (id, "timestamp") and a partition can't have
+        # a second one; attaching builds the matching key. Dropping it also
+        # frees the <table>_pkey name for the parent.
+        if primary_key:
+            cursor.execute(f'ALTER TABLE {qn(legacy)} DROP CONSTRAINT {qn(primary_key[0])}')
+        for name, _ in indexes:
+            cursor.execute(f'ALTER INDEX {qn(name)} RENAME TO {qn((name + "_legacy")[-63:])}')
+        cursor.execute(f'ALTER TABLE {qn(legacy)} ALTER COLUMN id DROP IDENTITY IF EXISTS')
+
+        cursor.execute(
+            f'CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(
+            f'ALTER TABLE {qn(table)} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY '
+            f'(START WITH {int(next_id)})'
+        )
+        # The partition key has to be part of the primary key
+        cursor.execute(f'ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, "timestamp")')
+        cursor.execute(
+            f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + "_agent_id_fk")} '
+            f'FOREIGN KEY (agent_id) REFERENCES agents (id) DEFERRABLE INITIALLY DEFERRED'
+        )
+
+        cursor.execute(
+            f'ALTER TABLE {qn(table)} ATTACH PARTITION {qn(legacy)} '
+            f'FOR VALUES FROM (MINVALUE) TO (%s)',
+            [boundary]
+        )
+
+        # Recreate secondary indexes on the parent (cascades to partitions)
+        for name, sql in indexes:
+            cursor.execute(sql)
+            cursor.execute(f'DROP INDEX IF EXISTS {qn((name + "_legacy")[-63:])}')
+
+    ensure_partitions(model)
+    return True
+
+
+def ensure_partitions(model, ahead=None, now=None):
+    """Create partitions for the current bucket and ``ahead`` future ones"""
+    table = model._meta.db_table
+    if not is_partitioned(table):
+        return []
+
+    ahead = settings.RETENTION_PARTITIONS_AHEAD if ahead is None else ahead
+    existing = {name for name, _ in list_partitions(table)}
+    start = partition_start(now or timezone.now())
+    qn = connection.ops.quote_name
+    created = []
+
+    with connection.cursor() as cursor:
+        for _ in range(ahead + 1):
+            end = start + partition_interval()
+            name = f'{table}_p{start:%Y%m%d}'
+            if name not in existing:
+                try:
+                    with transaction.atomic():
+                        cursor.execute(
+                            f'CREATE TABLE {qn(name)} PARTITION OF {qn(table)} '
+                            f'FOR VALUES FROM (%s) TO (%s)',
+                            [start, end]
+                        )
+                    created.append(name)
+                except Exception as e:
+                    # Usually overlaps the legacy partition's range
+                    logger.info('Skipped partition %s: %s', name, e)
+            start = end
+
+        default = f'{table}_default'
+        if default not in existing:
+            cursor.execute(f'CREATE TABLE {qn(default)} PARTITION OF {qn(table)} DEFAULT')
+            created.append(default)
+
+    return created
+
+
+def drop_expired_partitions(model, horizon, dry_run=False):
+    """Drop partitions whose whole range is older than ``horizon``"""
+    table = model._meta.db_table
+    if horizon is None or not is_partitioned(table):
+        return []
+
+    qn = connection.ops.quote_name
+    dropped = []
+    for name, upper in list_partitions(table):
+        if upper is None or upper > horizon:
+            continue
+        if not dry_run:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE {qn(name)}')
+        dropped.append(name)
+    return dropped
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def enforce_retention(now=None, chunk_size=None, dry_run=False):
+    """
+    Apply retention to logs and metrics.
+
+    Partitions that are expired for every plan are dropped first (when
+    partitioned), then per-plan windows are applied with chunked deletes.
+    """
+    cutoffs = retention_cutoffs(now)
+    horizon = drop_horizon(cutoffs)
+
+    dropped = []
+    if partitioning_supported():
+        for model in PARTITIONED_MODELS:
+            dropped += drop_expired_partitions(model, horizon, dry_run=dry_run)
+            if not dry_run:
+                ensure_partitions(model, now=now)
+
+    deleted = purge_expired_rows(cutoffs, chunk_size=chunk_size, dry_run=dry_run)
+    if not dry_run and (dropped or any(deleted.values())):
+        # Expired rows can sit in any agent's log or metric views
+        bump(GLOBAL_SCOPE)
+    return {'dropped_partitions': dropped, 'deleted_rows': deleted}
@@ -0,0 +1,197 @@
+"""
+Agent Control Panel - Metric rollups
+Minute/hour/day pre-aggregates of AgentMetric, kept current as samples
+arrive so long time windows are answered from a few hundred rows.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+
+from .models import AgentMetric, AgentMetricRollup
+
+# Finest to coarsest
+RESOLUTIONS = [
+    ('minute', timedelta(minutes=1), TruncMinute),
+    ('hour', timedelta(hours=1), TruncHour),
+    ('day', timedelta(days=1), TruncDay),
+]
+
+ROLLUP_FIELDS = ['tokens_used', 'cost', 'files_accessed', 'tool_calls']
+
+
+def truncate(dt, resolution):
+    """Start of the bucket containing ``dt``"""
+    dt = dt.replace(second=0, microsecond=0)
+    if resolution in ('hour', 'day'):
+        dt = dt.replace(minute=0)
+    if resolution == 'day':
+        dt = dt.replace(hour=0)
+    return dt
+
+
+def apply_metrics(metrics):
+    """
+    Fold newly written AgentMetric rows into every rollup resolution.
+
+    Samples are combined in memory first, so a batch costs one UPDATE
+    (or INSERT) per touched bucket rather than one per sample.
+    """
+    deltas = defaultdict(lambda: {'samples': 0, 'tokens_used': 0, 'cost': Decimal('0'),
+                                  'files_accessed': 0, 'tool_calls': 0})
+    for metric in metrics:
+        for resolution, _, _ in RESOLUTIONS:
+            delta = deltas[(metric.agent_id, resolution, truncate(metric.timestamp, resolution))]
+            delta['samples'] += 1
+            delta['tokens_used'] += metric.tokens_used or 0
+            delta['cost'] += Decimal(str(metric.cost or 0))
+            delta['files_accessed'] += metric.files_accessed or 0
+            delta['tool_calls'] += metric.tool_calls or 0
+
+    for (agent_id, resolution, bucket), delta in deltas.items():
+        _upsert(agent_id, resolution, bucket, delta)
+
+
+def _upsert(agent_id, resolution, bucket, delta):
+    increments = {field: F(field) + value for field, value in delta.items()}
+    rollups = AgentMetricRollup.objects.filter(
+        agent_id=agent_id, resolution=resolution, bucket=bucket
+    )
+    if rollups.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            AgentMetricRollup.objects.create(
+                agent_id=agent_id, resolution=resolution, bucket=bucket, **delta
+            )
+    except IntegrityError:
+        # Another writer created the bucket first
+        rollups.update(**increments)
+
+
+def plan_ranges(since, until):
+    """
+    Cover [since, until) with the coarsest aligned rollup buckets.
+
+    Returns (rollup_ranges, raw_ranges): rollup_ranges maps a resolution to
+    the (start, end) spans it answers; raw_ranges are the sub-minute edges
+    that must still be read from agent_metrics.
+    """
+    rollup_ranges = {}
+    remaining = [(since, until)]
+
+    for resolution, width, _ in reversed(RESOLUTIONS):
+        next_remaining = []
+        for start, end in remaining:
+            aligned_start = truncate(start, resolution)
+            if aligned_start < start:
+                aligned_start += width
+            aligned_end = truncate(end, resolution)
+
+            if aligned_start >= aligned_end:
+                next_remaining.append((start, end))
+                continue
+
+            rollup_ranges.setdefault(resolution, []).append((aligned_start, aligned_end))
+            if start < aligned_start:
+                next_remaining.append((start, aligned_start))
+            if aligned_end < end:
+                next_remaining.append((aligned_end, end))
+        remaining = next_remaining
+
+    return rollup_ranges, remaining
+
+
+def _totals_querysets(agent_id, since, until):
+    """The (at most two) querysets whose sums make up rollup_totals()"""
+    rollup_ranges, raw_ranges = plan_ranges(since, until)
+    if not any(end == until for _, end in raw_ranges):
+        raw_ranges.append((until, until))
+
+    rollup_filter = Q()
+    for resolution, spans in rollup_ranges.items():
+        for start, end in spans:
+            rollup_filter |= Q(resolution=resolution, bucket__gte=start, bucket__lt=end)
+
+    querysets = []
+    if rollup_filter:
+        querysets.append(AgentMetricRollup.objects.filter(rollup_filter, agent_id=agent_id))
+
+    raw_filter = Q()
+    for start, end in raw_ranges:
+        if end == until:
+            raw_filter |= Q(timestamp__gte=start)
+        else:
+            raw_filter |= Q(timestamp__gte=start, timestamp__lt=end)
+    if raw_filter:
+        querysets.append(AgentMetric.objects.filter(raw_filter, agent_id=agent_id))
+    return querysets
+
+
+def _combine_totals(parts):
+    totals = {field: None for field in ROLLUP_FIELDS}
+    for part in parts:
+        for field in ROLLUP_FIELDS:
+            if part[field] is not None:
+                totals[field] = (totals[field] or 0) + part[field]
+
+    return {
+        'total_tokens': totals['tokens_used'],
+        'total_cost': totals['cost'],
+        'total_files': totals['files_accessed'],
+        'total_tools': totals['tool_calls'],
+    }
+
+
+def rollup_totals(agent_id, since, until):
+    """
+    Metric totals for one agent over [since, until).
+
+    Reads whole days, hours and minutes from rollups and only the partial
+    minutes at either edge from raw samples: two queries regardless of
+    how long the window is. Raw samples at or after ``until`` are counted
+    too, matching an open-ended ``timestamp__gte`` filter.
+    """
+    sums = {field: Sum(field) for field in ROLLUP_FIELDS}
+    return _combine_totals(
+        queryset.aggregate(**sums) for queryset in _totals_querysets(agent_id, since, until)
+    )
+
+
+async def arollup_totals(agent_id, since, until):
+    """rollup_totals() on the async ORM"""
+    sums = {field: Sum(field) for field in ROLLUP_FIELDS}
+    return _combine_totals([
+        await queryset.aaggregate(**sums) for queryset in _totals_querysets(agent_id, since, until)
+    ])
+
+
+def rebuild_rollups(agent_id):
+    """Recompute every rollup bucket for one agent from raw samples"""
+    with transaction.atomic():
+        AgentMetricRollup.objects.filter(agent_id=agent_id).delete()
+        created = 0
+        for resolution, _, trunc in RESOLUTIONS:
+            buckets = (
+                AgentMetric.objects.filter(agent_id=agent_id)
+                .order_by()
+                .annotate(bucket=trunc('timestamp'))
+                .values('bucket')
+                .annotate(samples=Count('id'), **{f'sum_{field}': Sum(field) for field in ROLLUP_FIELDS})
+            )
+            rollups = [
+                AgentMetricRollup(
+                    agent_id=agent_id,
+                    resolution=resolution,
+                    bucket=row['bucket'],
+                    samples=row['samples'],
+                    **{field: row[f'sum_{field}'] for field in ROLLUP_FIELDS}
+                )
+                for row in buckets
+            ]
+            AgentMetricRollup.objects.bulk_create(rollups, batch_size=1000)
+            created += len(rollups)
+    return created
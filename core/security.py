@@ -0,0 +1,231 @@
+"""
+Agent Control Panel - Security scores
+An agent's security_score (0-100) is derived from its logs over the last
+SECURITY_WINDOW_HOURS: the share of blocked and flagged actions, hits on
+sensitive targets (credentials, production databases, ...) and how
+risky its mix of actions is.
+
+Logs are folded into hourly per-agent counters (AgentSecurityBucket) as
+they arrive, and scores are recomputed from the buckets in the window,
+at most SECURITY_WINDOW_HOURS rows per agent rather than the log
+history. Bucket updates are coalesced in memory and written every
+SECURITY_FLUSH_SECONDS. `manage.py recompute_security_scores` lets
+scores recover as old logs slide out of the window, and rebuilds
+buckets from raw logs for backfills.
+"""
+import re
+import threading
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .buffers import CoalescingBuffer
+from .models import Agent, AgentLog, AgentSecurityBucket
+from . import fleet, stats, versions
+
+# Targets whose access costs points whatever the outcome
+SENSITIVE_TARGETS = re.compile('|'.join([
+    r'/etc/(passwd|shadow|sudoers)',
+    r'(^|/)\.(ssh|aws|gnupg)/',
+    r'(^|/)\.env($|\.)',
+    r'\bid_(rsa|ecdsa|ed25519)\b',
+    r'^database://prod',
+    r'secret|credential|private[-_]?key',
+]), re.IGNORECASE)
+
+# Risk weight per action (unlisted actions count as 0)
+ACTION_RISK = {
+    'code_execute': 1.0,
+    'file_delete': 1.0,
+    'file_write': 0.5,
+    'database_query': 0.5,
+    'email_send': 0.5,
+    'web_request': 0.5,
+    'api_call': 0.25,
+    'slack_post': 0.25,
+    'tool_use': 0.25,
+}
+
+# Points lost when every logged action in the window is blocked / flagged
+# / maximally risky; sensitive hits cost a fixed amount each, capped
+BLOCKED_WEIGHT = 40
+FLAGGED_WEIGHT = 20
+ACTION_MIX_WEIGHT = 15
+SENSITIVE_POINTS = 5
+SENSITIVE_MAX = 25
+
+COUNT_FIELDS = ['logs', 'blocked', 'flagged', 'sensitive', 'action_risk']
+
+
+def empty_counts():
+    return {'logs': 0, 'blocked': 0, 'flagged': 0, 'sensitive': 0, 'action_risk': 0.0}
+
+
+def add_log(counts, action, target, status):
+    """Count one log into ``counts``"""
+    counts['logs'] += 1
+    counts['blocked'] += status == 'blocked'
+    counts['flagged'] += status == 'flagged'
+    counts['sensitive'] += bool(target and SENSITIVE_TARGETS.search(target))
+    counts['action_risk'] += ACTION_RISK.get(action, 0.0)
+
+
+def score(counts):
+    """Security score for window totals (100 with no activity)"""
+    logs = counts['logs'] or 0
+    if not logs:
+        return 100
+    penalty = (
+        BLOCKED_WEIGHT * counts['blocked']
+        + FLAGGED_WEIGHT * counts['flagged']
+        + ACTION_MIX_WEIGHT * counts['action_risk']
+    ) / logs
+    penalty += min(SENSITIVE_MAX, SENSITIVE_POINTS * counts['sensitive'])
+    return max(0, min(100, round(100 - penalty)))
+
+
+def hour(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def window_start(now=None):
+    """First bucket inside the scoring window"""
+    return hour(now or timezone.now()) - timedelta(hours=settings.SECURITY_WINDOW_HOURS - 1)
+
+
+def bucket_deltas(logs):
+    """{(agent_id, hour): counts} for a batch of AgentLog rows"""
+    deltas = defaultdict(empty_counts)
+    for log in logs:
+        add_log(deltas[(log.agent_id, hour(log.timestamp))], log.action, log.target, log.status)
+    return deltas
+
+
+def _upsert(agent_id, bucket, delta):
+    increments = {field: F(field) + value for field, value in delta.items()}
+    buckets = AgentSecurityBucket.objects.filter(agent_id=agent_id, bucket=bucket)
+    if buckets.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            AgentSecurityBucket.objects.create(agent_id=agent_id, bucket=bucket, **delta)
+    except IntegrityError:
+        # Another writer created the bucket first
+        buckets.update(**increments)
+
+
+def apply_deltas(deltas):
+    """Add {(agent_id, hour): counts} to the buckets and rescore those agents"""
+    horizon = window_start()
+    for (agent_id, bucket), delta in deltas.items():
+        if bucket >= horizon:
+            _upsert(agent_id, bucket, delta)
+    return rescore({agent_id for agent_id, _ in deltas})
+
+
+def rescore(agent_ids, now=None):
+    """
+    Recompute the scores of ``agent_ids`` from the buckets in the window
+    and stamp last_security_check. Returns the number whose score changed.
+    """
+    now = now or timezone.now()
+    totals = {
+        row['agent_id']: row
+        for row in AgentSecurityBucket.objects.filter(
+            agent_id__in=agent_ids, bucket__gte=window_start(now)
+        ).order_by().values('agent_id').annotate(**{field: Sum(field) for field in COUNT_FIELDS})
+    }
+
+    agents = list(Agent.objects.filter(pk__in=agent_ids).only('id', 'security_score'))
+    changed = []
+    security_change = 0
+    for agent in agents:
+        new_score = score(totals.get(agent.id, empty_counts()))
+        if new_score != agent.security_score:
+            changed.append(agent.id)
+            security_change += new_score - agent.security_score
+        agent.security_score = new_score
+        agent.last_security_check = now
+    Agent.objects.bulk_update(agents, ['security_score', 'last_security_check'], batch_size=500)
+
+    # bulk_update() bypasses signals, so adjust the derived data directly
+    if security_change:
+        stats.apply_delta(security_sum=security_change)
+    if changed:
+        fleet.mark_changed(changed)
+    if agents:
+        versions.bump_agents([agent.id for agent in agents], 'agents')
+    return len(changed)
+
+
+def rebuild_buckets(agent_ids, now=None):
+    """
+    Recount the window's buckets of ``agent_ids`` from raw logs (for
+    backfills, or after buffered updates were lost). Returns the number
+    of buckets written.
+    """
+    since = window_start(now)
+    deltas = defaultdict(empty_counts)
+    logs = (
+        AgentLog.objects.filter(agent_id__in=agent_ids, timestamp__gte=since)
+        .order_by()
+        .values_list('agent_id', 'timestamp', 'action', 'target', 'status')
+    )
+    for agent_id, timestamp, action, target, status in logs.iterator(chunk_size=5000):
+        add_log(deltas[(agent_id, hour(timestamp))], action, target, status)
+
+    with transaction.atomic():
+        AgentSecurityBucket.objects.filter(agent_id__in=agent_ids, bucket__gte=since).delete()
+        AgentSecurityBucket.objects.bulk_create([
+            AgentSecurityBucket(agent_id=agent_id, bucket=bucket, **counts)
+            for (agent_id, bucket), counts in deltas.items()
+        ], batch_size=1000)
+    return len(deltas)
+
+
+def prune_buckets(now=None):
+    """Delete buckets that have left the window; returns the number deleted"""
+    deleted, _ = AgentSecurityBucket.objects.filter(bucket__lt=window_start(now)).delete()
+    return deleted
+
+
+class SecurityBuffer(CoalescingBuffer):
+    """Sums bucket counts per (agent, hour) and applies them in batches"""
+
+    def __init__(self, interval=None, max_pending=None):
+        super().__init__(
+            interval or settings.SECURITY_FLUSH_SECONDS,
+            max_pending or settings.SECURITY_MAX_PENDING,
+        )
+
+    def merge(self, current, value):
+        if current is None:
+            return dict(value)
+        return {field: current[field] + value[field] for field in COUNT_FIELDS}
+
+    def write(self, batch):
+        apply_deltas(batch)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_security_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = SecurityBuffer()
+    return _buffer
+
+
+def record_logs(logs):
+    """Queue newly written logs for scoring"""
+    buffer = get_security_buffer()
+    for key, delta in bucket_deltas(logs).items():
+        buffer.add(key, delta)
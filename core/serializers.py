@@ -9,6 +9,7 @@ class AgentSerializer(serializers.ModelSerializer):
             'id', 'name', 'status', 'model', 
             'tasks_completed', 'tasks_failed', 'total_cost',
             'uptime_seconds', 'security_score', 'last_security_check',
+            'actions_per_minute', 'cost_budget',
             'created_at', 'last_active_at', 'metadata'
         ]
         read_only_fields = ['id', 'created_at']
@@ -42,3 +43,46 @@ class DashboardStatsSerializer(serializers.Serializer):
     total_cost = serializers.DecimalField(max_digits=10, decimal_places=2)
     avg_security_score = serializers.FloatField()
     recent_alerts = serializers.IntegerField()
+
+class AgentLogBulkSerializer(serializers.ModelSerializer):
+    """
+    Per-record validation for bulk log ingestion.
+    Agent ids are checked in one query by the caller instead of per record.
+    A missing status is decided by the policy rules (core.policy).
+    """
+    agent = serializers.UUIDField()
+    
+    class Meta:
+        model = AgentLog
+        fields = ['agent', 'action', 'target', 'status', 'metadata']
+        extra_kwargs = {'status': {'required': False}}
+
+class AgentMetricIngestSerializer(serializers.ModelSerializer):
+    """Validation for a single streamed metric sample (agent comes from the URL)"""
+    class Meta:
+        model = AgentMetric
+        fields = ['tokens_used', 'cost', 'files_accessed', 'tool_calls', 'metadata']
+
+class PolicyDecisionRequestSerializer(serializers.Serializer):
+    """One action to decide; the agent's model selects its model rules"""
+    agent = serializers.UUIDField(required=False)
+    model = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    action = serializers.CharField(max_length=100)
+    target = serializers.CharField(required=False, allow_blank=True, default='')
+
+# Agent's counters are 32-bit integer columns; a larger delta can never apply
+COUNTER_DELTA_LIMIT = 2 ** 31 - 1
+
+class AgentCounterDeltaSerializer(serializers.Serializer):
+    """Increments for Agent's running counters (negative values correct mistakes)"""
+    agent = serializers.UUIDField(required=False)
+    tasks_completed = serializers.IntegerField(
+        required=False, default=0, min_value=-COUNTER_DELTA_LIMIT, max_value=COUNTER_DELTA_LIMIT
+    )
+    tasks_failed = serializers.IntegerField(
+        required=False, default=0, min_value=-COUNTER_DELTA_LIMIT, max_value=COUNTER_DELTA_LIMIT
+    )
+    total_cost = serializers.DecimalField(max_digits=10, decimal_places=4, required=False, default=0)
+    uptime_seconds = serializers.IntegerField(
+        required=False, default=0, min_value=-COUNTER_DELTA_LIMIT, max_value=COUNTER_DELTA_LIMIT
+    )
@@ -0,0 +1,145 @@
+"""
+Agent Control Panel - Signals
+Keeps derived data (rollups, caches) in step with writes. Bulk paths
+bypass post_save, so they send the batch signals below themselves.
+"""
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import Agent, AgentLog, AgentMetric, PolicyRule, Waitlist
+from . import anomalies, events, fleet, limits, policy, rollups, security, stats, versions, waitlist
+
+# Sent after AgentLog rows are written. Arguments: logs (list)
+logs_created = Signal()
+
+# Sent after AgentMetric rows are written. Arguments: metrics (list)
+metrics_created = Signal()
+
+
+@receiver(post_save, sender=Agent)
+def agent_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    stats.record_agent_saved(instance, created)
+    
+    loaded = getattr(instance, '_loaded_values', {})
+    fleet.mark_changed([instance.id], regrouped=fleet.regrouped_dimensions(instance, loaded, created))
+    # Log lists show agent_name, so a rename changes them too
+    renamed = not created and loaded.get('name', instance.name) != instance.name
+    versions.bump_agents([instance.id], 'agents', *(['logs'] if renamed else []))
+    
+    previous = loaded.get('status')
+    if created or previous != instance.status:
+        events.publish('agent.status', {
+            'agent': str(instance.id),
+            'name': instance.name,
+            'status': instance.status,
+            'previous': None if created else previous,
+        })
+    instance._loaded_values = {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields
+    }
+
+
+@receiver(post_delete, sender=Agent)
+def agent_deleted(sender, instance, **kwargs):
+    # Cascaded logs can change recent alerts too; recompute on next read
+    stats.invalidate()
+    fleet.mark_changed()
+    versions.bump_agents([instance.id], 'agents', 'logs', 'metrics')
+
+
+@receiver(post_save, sender=AgentLog)
+def log_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        logs_created.send(sender=AgentLog, logs=[instance])
+    else:
+        versions.bump_agents([instance.agent_id], 'logs')
+
+
+@receiver(logs_created)
+def update_dashboard_alerts(sender, logs, **kwargs):
+    stats.record_logs_created(logs)
+
+
+@receiver(logs_created)
+def bump_log_versions(sender, logs, **kwargs):
+    versions.bump_agents((log.agent_id for log in logs), 'logs')
+
+
+@receiver(logs_created)
+def publish_log_events(sender, logs, **kwargs):
+    for log in logs:
+        events.publish('log', events.log_event_data(log))
+
+
+@receiver(logs_created)
+def queue_security_scores(sender, logs, **kwargs):
+    security.record_logs(logs)
+
+
+@receiver(logs_created)
+def detect_log_anomalies(sender, logs, **kwargs):
+    if settings.ANOMALY_DETECTION:
+        record_anomalies(anomalies.get_detector().observe_logs(logs))
+
+
+@receiver(post_save, sender=AgentMetric)
+def metric_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        metrics_created.send(sender=AgentMetric, metrics=[instance])
+
+
+@receiver(metrics_created)
+def update_metric_rollups(sender, metrics, **kwargs):
+    rollups.apply_metrics(metrics)
+
+
+@receiver(metrics_created)
+def mark_fleet_changed(sender, metrics, **kwargs):
+    fleet.mark_changed({metric.agent_id for metric in metrics})
+
+
+@receiver(metrics_created)
+def bump_metric_versions(sender, metrics, **kwargs):
+    versions.bump_agents((metric.agent_id for metric in metrics), 'metrics')
+
+
+@receiver(metrics_created)
+def track_agent_spend(sender, metrics, **kwargs):
+    limits.record_spend(metrics)
+
+
+@receiver(metrics_created)
+def detect_metric_anomalies(sender, metrics, **kwargs):
+    if settings.ANOMALY_DETECTION:
+        record_anomalies(anomalies.get_detector().observe_metrics(metrics))
+
+
+def record_anomalies(detections):
+    """Write detections as flagged logs (the detector skips them in turn)"""
+    if detections:
+        AgentLog.objects.bulk_create(detections)
+        logs_created.send(sender=AgentLog, logs=detections)
+
+
+@receiver(post_save, sender=Waitlist)
+def waitlist_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        waitlist.add_to_count(1)
+
+
+@receiver(post_delete, sender=Waitlist)
+def waitlist_deleted(sender, instance, **kwargs):
+    waitlist.add_to_count(-1)
+
+
+@receiver(post_save, sender=PolicyRule)
+@receiver(post_delete, sender=PolicyRule)
+def policy_rules_changed(sender, raw=False, **kwargs):
+    if not raw:
+        policy.rules_changed()
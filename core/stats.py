@@ -0,0 +1,162 @@
+"""
+Agent Control Panel - Dashboard stats cache
+Keeps one dashboard snapshot in the 'stats' cache and adjusts it as
+agents and logs are written, so dashboard polls are a single cache read.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import Agent, AgentLog
+
+STATS_KEY = 'dashboard:stats'
+
+
+def _cache():
+    return caches['stats']
+
+
+def _snapshot_queries():
+    hour_ago = timezone.now() - timedelta(hours=1)
+    agent_totals = {
+        'total_agents': Count('id'),
+        'active_agents': Count('id', filter=Q(status='running') | Q(last_active_at__gte=hour_ago)),
+        'total_cost': Sum('total_cost'),
+        'security_sum': Sum('security_score'),
+    }
+    recent_alerts = AgentLog.objects.filter(
+        status='blocked',
+        timestamp__gte=hour_ago
+    )
+    return agent_totals, recent_alerts
+
+
+def _snapshot(agents, recent_alerts):
+    return {
+        'total_agents': agents['total_agents'],
+        'active_agents': agents['active_agents'],
+        'total_cost': float(agents['total_cost'] or 0),
+        'security_sum': agents['security_sum'] or 0,
+        'recent_alerts': recent_alerts,
+        'expires_at': time.time() + settings.DASHBOARD_STATS_TTL,
+    }
+
+
+def _stats(snapshot):
+    total = snapshot['total_agents']
+    return {
+        'total_agents': total,
+        'active_agents': snapshot['active_agents'],
+        'total_cost': snapshot['total_cost'],
+        'avg_security_score': snapshot['security_sum'] / total if total else 100,
+        'recent_alerts': snapshot['recent_alerts'],
+    }
+
+
+def compute_snapshot():
+    """Recompute the dashboard snapshot from the database (two queries)"""
+    agent_totals, recent_alerts = _snapshot_queries()
+    return _snapshot(Agent.objects.aggregate(**agent_totals), recent_alerts.count())
+
+
+async def acompute_snapshot():
+    """compute_snapshot() on the async ORM"""
+    agent_totals, recent_alerts = _snapshot_queries()
+    return _snapshot(await Agent.objects.aaggregate(**agent_totals), await recent_alerts.acount())
+
+
+def get_dashboard_stats():
+    """Dashboard statistics, served from cache when a snapshot exists"""
+    snapshot = _cache().get(STATS_KEY)
+    if snapshot is None:
+        snapshot = compute_snapshot()
+        _cache().set(STATS_KEY, snapshot, settings.DASHBOARD_STATS_TTL)
+    return _stats(snapshot)
+
+
+async def aget_dashboard_stats():
+    """get_dashboard_stats() for async views"""
+    snapshot = await _cache().aget(STATS_KEY)
+    if snapshot is None:
+        snapshot = await acompute_snapshot()
+        await _cache().aset(STATS_KEY, snapshot, settings.DASHBOARD_STATS_TTL)
+    return _stats(snapshot)
+
+
+def apply_delta(**deltas):
+    """
+    Adjust counters in the cached snapshot.
+
+    The snapshot keeps its original expiry, so counters drift at most one
+    TTL even if a write is missed (queryset.update(), another worker with a
+    per-process cache, or a lost race between two adjusting writers).
+    """
+    cache = _cache()
+    snapshot = cache.get(STATS_KEY)
+    if snapshot is None:
+        return
+    remaining = snapshot['expires_at'] - time.time()
+    if remaining <= 0:
+        return
+    for key, value in deltas.items():
+        snapshot[key] += value
+    cache.set(STATS_KEY, snapshot, remaining)
+
+
+def invalidate():
+    """Drop the snapshot; the next request recomputes it"""
+    _cache().delete(STATS_KEY)
+
+
+def _is_active(status, last_active_at, hour_ago):
+    return status == 'running' or (last_active_at is not None and last_active_at >= hour_ago)
+
+
+def record_agent_saved(agent, created):
+    """Apply the counter changes caused by saving ``agent``"""
+    hour_ago = timezone.now() - timedelta(hours=1)
+    now_active = _is_active(agent.status, agent.last_active_at, hour_ago)
+
+    if created:
+        apply_delta(
+            total_agents=1,
+            active_agents=int(now_active),
+            total_cost=float(agent.total_cost or 0),
+            security_sum=agent.security_score,
+        )
+        return
+
+    loaded = getattr(agent, '_loaded_values', None)
+    tracked = ('status', 'last_active_at', 'total_cost', 'security_score')
+    if loaded is None or any(field not in loaded for field in tracked):
+        invalidate()
+        return
+
+    was_active = _is_active(loaded['status'], loaded['last_active_at'], hour_ago)
+    apply_delta(
+        active_agents=int(now_active) - int(was_active),
+        total_cost=float(agent.total_cost or 0) - float(loaded['total_cost'] or 0),
+        security_sum=agent.security_score - loaded['security_score'],
+    )
+
+
+def record_marked_running(previous):
+    """
+    Apply the counter changes of setting agents to running with a bulk
+    UPDATE; ``previous`` holds their (status, last_active_at) before it
+    """
+    hour_ago = timezone.now() - timedelta(hours=1)
+    became_active = sum(1 for status, last_active_at in previous if not _is_active(status, last_active_at, hour_ago))
+    if became_active:
+        apply_delta(active_agents=became_active)
+
+
+def record_logs_created(logs):
+    """Count newly written blocked logs towards recent alerts"""
+    blocked = sum(1 for log in logs if log.status == 'blocked')
+    if blocked:
+        apply_delta(recent_alerts=blocked)
@@ -1,3 +1,1364 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
+import asyncio
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+import warnings
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.sessions.models import Session
+from django.db import DataError, connection
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver
+from django.utils import timezone
+from rest_framework.fields import DateTimeField
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .api import AgentLogViewSet
+from .counters import CounterBuffer
+from .db_routers import (
+    PIN_COOKIE, REPLICA, ReplicaRouter, ReplicaRoutingMiddleware, note_change, replica_routing
+)
+from .export import EPOCH, msgpack
+from .fastpath import FastJSONRenderer, FastRowSerializer
+from .heartbeats import HeartbeatBuffer, get_heartbeat_buffer
+from .ingest import get_batch_size
+from .models import (
+    User, Agent, AgentLog, AgentMetric, AgentMetricRollup, AgentSecurityBucket, FleetSummary, PolicyRule, Waitlist
+)
+from .pagination import LogKeysetPagination
+from .query_budget import QueryBudgetExceeded, get_query_budget
+from .serializers import AgentLogSerializer, AgentMetricSerializer, AgentSerializer, AgentSummarySerializer
+from .timeseries import bucketed_series, percentile
+from . import (
+    anomalies, events, fleet, limits, policy, react_views, retention, rollups, security, stats, versions
+)
+from .waitlist import SignupBuffer, add_signup, add_signups, read_count
+
+
+class QueryPlanTests(TestCase):
+    """
+    The hot read paths must be answered from an index, not a table scan.
+    Each test calls the endpoint and checks the plan of the SQL it sent.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(7)
+        now = timezone.now()
+        user = User.objects.create(username='planner')
+        cls.agents = Agent.objects.bulk_create([
+            Agent(user=user, name=f'agent-{i}') for i in range(20)
+        ])
+        cls.agent = cls.agents[0]
+
+        logs = AgentLog.objects.bulk_create([
+            AgentLog(
+                agent=rng.choice(cls.agents),
+                action=rng.choice(['file_read', 'file_write', 'api_call', 'database_query']),
+                target='/tmp/data.csv',
+                status=rng.choice(['allowed'] * 8 + ['blocked', 'flagged']),
+            )
+            for _ in range(3000)
+        ])
+        metrics = AgentMetric.objects.bulk_create([
+            AgentMetric(agent=rng.choice(cls.agents), tokens_used=100) for _ in range(2000)
+        ])
+
+        # Spread rows over ~a week so time filters are selective
+        for i, row in enumerate(logs + metrics):
+            row.timestamp = now - timedelta(minutes=3 * i + rng.randint(0, 2))
+        AgentLog.objects.bulk_update(logs, ['timestamp'], batch_size=500)
+        AgentMetric.objects.bulk_update(metrics, ['timestamp'], batch_size=500)
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def endpoint_queries(self, url, table):
+        """SQL the endpoint at ``url`` sent that reads ``table``"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        sql = [query['sql'] for query in queries if f'FROM "{table}"' in query['sql']]
+        self.assertTrue(sql, f'{url} sent no query on {table}')
+        return sql
+
+    def explain(self, sql):
+        prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return '\n'.join(' '.join(map(str, row)) for row in cursor.fetchall())
+
+    def assertUsesIndex(self, sql, index_name):
+        if connection.vendor == 'sqlite':
+            plan = self.explain(sql)
+            self.assertRegex(plan, rf'USING (COVERING )?INDEX {index_name}\b', plan)
+        elif connection.vendor == 'postgresql':
+            # Tiny test tables favour sequential scans; check the index is usable
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = self.explain(sql)
+            self.assertIn(index_name, plan, plan)
+            self.assertNotIn('Seq Scan', plan, plan)
+        else:
+            self.skipTest(f'No plan assertions for {connection.vendor}')
+
+    def assertSeeksIndex(self, sql, index_name):
+        """The index is used as a range, not scanned in order"""
+        self.assertUsesIndex(sql, index_name)
+        if connection.vendor == 'sqlite':
+            plan = self.explain(sql)
+            self.assertRegex(plan, rf'SEARCH \S+ USING (COVERING )?INDEX {index_name} \(timestamp[<>]', plan)
+
+    def cursor_at(self, log):
+        return LogKeysetPagination().encode_cursor(log)
+
+    def test_dashboard_recent_alerts(self):
+        stats.invalidate()
+        for sql in self.endpoint_queries('/api/dashboard/stats/', 'agent_logs'):
+            self.assertUsesIndex(sql, 'agent_logs_blocked_ts_idx')
+
+    def test_flagged_logs_tail(self):
+        day_ago = self.cursor_at(AgentLog(id=0, timestamp=timezone.now() - timedelta(days=1)))
+        for sql in self.endpoint_queries(f'/api/logs/?status=flagged&since={day_ago}', 'agent_logs'):
+            self.assertUsesIndex(sql, 'agent_logs_flagged_ts_idx')
+
+    def test_agent_logs_action(self):
+        for sql in self.endpoint_queries(f'/api/agents/{self.agent.id}/logs/', 'agent_logs'):
+            self.assertUsesIndex(sql, 'agent_logs_agent_ts_idx')
+
+    def test_log_list_filtered_by_agent(self):
+        for sql in self.endpoint_queries(f'/api/logs/?agent={self.agent.id}', 'agent_logs'):
+            self.assertUsesIndex(sql, 'agent_logs_agent_ts_idx')
+
+    def test_log_list_page(self):
+        for sql in self.endpoint_queries('/api/logs/', 'agent_logs'):
+            self.assertUsesIndex(sql, 'agent_logs_ts_id_idx')
+
+    def test_log_list_deep_page(self):
+        middle = AgentLog.objects.order_by('-timestamp', '-id')[1500]
+        for sql in self.endpoint_queries(f'/api/logs/?cursor={self.cursor_at(middle)}', 'agent_logs'):
+            self.assertSeeksIndex(sql, 'agent_logs_ts_id_idx')
+
+    def test_log_list_tail(self):
+        middle = AgentLog.objects.order_by('-timestamp', '-id')[50]
+        for sql in self.endpoint_queries(f'/api/logs/?since={self.cursor_at(middle)}', 'agent_logs'):
+            self.assertSeeksIndex(sql, 'agent_logs_ts_id_idx')
+
+    def test_agent_list_page(self):
+        for sql in self.endpoint_queries('/api/agents/', 'agents'):
+            self.assertUsesIndex(sql, 'agents_created_id_idx')
+
+    def test_agent_metrics_window(self):
+        for sql in self.endpoint_queries(f'/api/agents/{self.agent.id}/metrics/?hours=24', 'agent_metrics'):
+            self.assertUsesIndex(sql, 'agent_metrics_agent_ts_idx')
+
+    def test_log_action_search(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Infix LIKE is only indexed (pg_trgm) on PostgreSQL')
+        for sql in self.endpoint_queries('/api/logs/?action=file', 'agent_logs'):
+            self.assertUsesIndex(sql, 'agent_logs_action_trgm_idx')
+
+
+@override_settings(QUERY_BUDGET_MODE='raise')
+class QueryBudgetTests(TestCase):
+    """
+    Every list endpoint declares a query budget and stays within it with
+    enough rows that an N+1 would show up.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='budget')
+        agents = Agent.objects.bulk_create([
+            Agent(user=user, name=f'agent-{i}') for i in range(30)
+        ])
+        cls.agent = agents[0]
+        AgentLog.objects.bulk_create([
+            AgentLog(agent=agents[i % 30], action='file_read', status='allowed')
+            for i in range(150)
+        ])
+        AgentMetric.objects.bulk_create([
+            AgentMetric(agent=cls.agent, tokens_used=10) for _ in range(30)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def test_list_endpoints_declare_budgets(self):
+        for url in ['/api/agents/', '/api/logs/', f'/api/agents/{self.agent.id}/logs/',
+                    f'/api/agents/{self.agent.id}/metrics/', '/api/dashboard/stats/',
+                    '/api/fleet/summary/']:
+            match = get_resolver().resolve(url)
+            self.assertIsNotNone(get_query_budget(match.func, 'GET'), url)
+
+    def test_agent_list(self):
+        self.get('/api/agents/')
+
+    def test_log_list(self):
+        response = self.get('/api/logs/')
+        self.assertEqual(len(response.data['results']), 100)
+        self.assertEqual(response.data['results'][0]['agent_name'][:6], 'agent-')
+
+    def test_log_list_filtered(self):
+        self.get(f'/api/logs/?agent={self.agent.id}&status=allowed&action=file')
+
+    def test_agent_logs(self):
+        response = self.get(f'/api/agents/{self.agent.id}/logs/')
+        self.assertEqual(len(response.json()), 5)
+
+    def test_agent_metrics(self):
+        self.get(f'/api/agents/{self.agent.id}/metrics/')
+
+    def test_dashboard_stats(self):
+        self.get('/api/dashboard/stats/')
+
+    def test_fleet_summary(self):
+        response = self.get('/api/fleet/summary/?group_by=user&order=agents')
+        self.assertEqual(response.data['results'][0]['agents'], 30)
+        self.get('/api/fleet/summary/?group_by=user')
+
+    def test_exceeding_budget_raises(self):
+        budgets = {**AgentLogViewSet.query_budgets, 'list': 0}
+        with mock.patch.object(AgentLogViewSet, 'query_budgets', budgets):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/logs/')
+
+
+class ConditionalGetTests(TestCase):
+    """ETags change with every write, including writes other workers handled"""
+
+    def test_304_until_changed(self):
+        agent = Agent.objects.create(user=User.objects.create(username='polled'), name='polled')
+        client = APIClient()
+        with mock.patch('core.versions.time', wraps=time) as clock:
+            clock.time.return_value = 1_000_000.0
+            etag = client.get('/api/agents/')['ETag']
+            self.assertEqual(client.get('/api/agents/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                client.patch(f'/api/agents/{agent.id}/', {'name': 'renamed'}, format='json')
+            response = client.get('/api/agents/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'][0]['name'], 'renamed')
+
+            # A write another worker handled doesn't bump this worker's
+            # (locmem) versions; the validators still roll over
+            self.assertTrue(versions.is_local())
+            etag = response['ETag']
+            Agent.objects.filter(pk=agent.pk).update(name='elsewhere')
+            self.assertEqual(client.get('/api/agents/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            clock.time.return_value += settings.VERSIONS_LOCAL_PERIOD
+            response = client.get('/api/agents/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'][0]['name'], 'elsewhere')
+
+
+class AppShellTests(SimpleTestCase):
+    """index.html served from memory: content-coding, ETags and reloads"""
+
+    html = (
+        b'<!doctype html><html><head>'
+        b'<script type="module" src="/assets/index-abc123.js"></script>'
+        b'<link rel="stylesheet" href="/assets/index-def456.css">'
+        b'<link rel="icon" href="/favicon.ico">'
+        b'</head><body>' + b'<div id="root"></div>' * 50 + b'</body></html>'
+    )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'index.html')
+        with open(self.path, 'wb') as f:
+            f.write(self.html)
+        patcher = mock.patch.object(react_views, 'index_candidates', lambda: [self.path])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        react_views._shell = None
+        self.addCleanup(setattr, react_views, '_shell', None)
+
+    def get(self, accept_encoding=None, if_none_match=None):
+        headers = {}
+        if accept_encoding is not None:
+            headers['HTTP_ACCEPT_ENCODING'] = accept_encoding
+        if if_none_match is not None:
+            headers['HTTP_IF_NONE_MATCH'] = if_none_match
+        return self.client.get('/agents/42/', **headers)
+
+    def test_content_encoding_negotiation(self):
+        best = 'br' if react_views.brotli else 'gzip'
+        for accept_encoding, encoding in [
+            ('gzip, deflate, br', best), ('gzip', 'gzip'), ('*', best), ('br;q=0, gzip;q=0.5', 'gzip'),
+            ('gzip;q=0', None), ('', None), (None, None), ('identity', None),
+        ]:
+            response = self.get(accept_encoding)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.get('Content-Encoding'), encoding, accept_encoding)
+            self.assertIn('Accept-Encoding', response['Vary'])
+            body = response.content
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'br':
+                body = react_views.brotli.decompress(body)
+            self.assertEqual(body, self.html)
+
+        response = self.get()
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(response['Link'], '</assets/index-abc123.js>; rel=modulepreload, '
+                                           '</assets/index-def456.css>; rel=preload; as=style')
+
+    def test_view_is_sync(self):
+        # An async view would go through async_to_sync on every WSGI request
+        self.assertFalse(react_views.ReactAppView.view_is_async)
+
+    def test_if_none_match(self):
+        identity, compressed = self.get()['ETag'], self.get('gzip')['ETag']
+        self.assertNotEqual(identity, compressed)
+        for if_none_match in [identity, f'W/{identity}', f'"other", {compressed}', '*']:
+            response = self.get('gzip', if_none_match)
+            self.assertEqual(response.status_code, 304, if_none_match)
+            self.assertEqual(response['ETag'], compressed)
+            self.assertEqual(response.content, b'')
+        self.assertEqual(self.get('gzip', '"other"').status_code, 200)
+
+    def test_reloads_in_debug_only(self):
+        etag = self.get()['ETag']
+        with open(self.path, 'wb') as f:
+            f.write(self.html.replace(b'abc123', b'xyz789'))
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 10 ** 9))
+        self.assertEqual(self.get()['ETag'], etag)
+        with override_settings(DEBUG=True):
+            response = self.get()
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(b'xyz789', response.content)
+
+        os.remove(self.path)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.get().status_code, 500)
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    """Reads of read-only endpoints go to the replica until the client writes"""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertIsNone(self.router.db_for_read(Agent))
+
+    def test_replica_reads_until_write(self):
+        with replica_routing():
+            self.assertEqual(self.router.db_for_read(AgentLog), REPLICA)
+            self.assertIsNone(self.router.db_for_read(Session))
+            self.router.db_for_write(Agent)
+            self.assertIsNone(self.router.db_for_read(AgentLog))
+
+    def test_recent_changes_read_from_primary(self):
+        with replica_routing():
+            note_change(time.time() - 3600)
+            self.assertEqual(self.router.db_for_read(Agent), REPLICA)
+            note_change(time.time())
+            self.assertIsNone(self.router.db_for_read(Agent))
+
+    def test_middleware_pins_client_after_write(self):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(AgentLog))
+            if request.method == 'POST':
+                self.router.db_for_write(AgentLog)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        factory = RequestFactory()
+        with mock.patch('core.db_routers.replica_available', return_value=True):
+            middleware(factory.get('/api/logs/'))
+            middleware(factory.get('/api/fleet/summary/'))
+            response = middleware(factory.post('/api/logs/'))
+            pinned = factory.get('/api/logs/')
+            pinned.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+            middleware(pinned)
+
+        self.assertEqual(seen, [REPLICA, None, None, None])
+
+
+class WaitlistCounterTests(TestCase):
+    """The maintained signup count matches COUNT(*) across every write path"""
+
+    def test_counter_follows_writes(self):
+        self.assertTrue(add_signup('a@example.com'))
+        self.assertFalse(add_signup('a@example.com'))
+        self.assertEqual(add_signups({'a@example.com': 'landing', 'b@example.com': 'api',
+                                      'c@example.com': 'api'}), 2)
+        Waitlist.objects.filter(email='b@example.com').delete()
+        self.assertEqual(read_count(), 2)
+        self.assertEqual(read_count(), Waitlist.objects.count())
+
+    @override_settings(WAITLIST_BUFFERED=True)
+    def test_bad_signups_are_refused_or_dropped(self):
+        client = APIClient()
+        for email in ['no-at-sign', 'x' * 250 + '@example.com', None]:
+            response = client.post('/api/waitlist', {'email': email}, format='json')
+            self.assertEqual(response.status_code, 400, email)
+
+        # A row the database rejects anyway only loses that signup
+        bulk_create = Waitlist.objects.bulk_create
+
+        def reject_bad(rows, **kwargs):
+            if any(row.email == 'bad@example.com' for row in rows):
+                raise DataError('value too long')
+            return bulk_create(rows, **kwargs)
+
+        buffer = SignupBuffer(interval=3600, max_pending=100)
+        for email in ['bad@example.com', 'd@example.com', 'e@example.com']:
+            buffer.add(email, 'landing')
+        with mock.patch.object(Waitlist.objects, 'bulk_create', side_effect=reject_bad):
+            with self.assertLogs('core.buffers', 'ERROR'):
+                self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(buffer.pending, {})
+        self.assertEqual(sorted(Waitlist.objects.values_list('email', flat=True)), ['d@example.com', 'e@example.com'])
+        self.assertEqual(read_count(), 2)
+
+    def test_signup_responses(self):
+        self.assertFalse(settings.WAITLIST_BUFFERED)
+        client = APIClient()
+        response = client.post('/api/waitlist', {'email': 'f@example.com'}, format='json')
+        self.assertEqual((response.status_code, response.json()['count']), (200, 1))
+        self.assertTrue(Waitlist.objects.filter(email='f@example.com').exists())
+
+        buffer = SignupBuffer(interval=3600)
+        with override_settings(WAITLIST_BUFFERED=True), \
+                mock.patch('core.views.get_signup_buffer', return_value=buffer):
+            response = client.post('/api/waitlist', {'email': 'g@example.com'}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['count'], 2)  # Counts the queued signup
+        self.assertFalse(Waitlist.objects.filter(email='g@example.com').exists())
+        self.assertEqual(buffer.flush(), 1)
+
+
+class IngestionTests(TestCase):
+    """Bulk logs and streamed metrics from JSON, NDJSON and chunked bodies"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create(user=User.objects.create(username='ingested'), name='ingested')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def tearDown(self):
+        security.get_security_buffer().flush()
+
+    def ndjson(self, *lines):
+        return '\n'.join(lines).encode() + b'\n'
+
+    def post_chunked(self, url, body, terminated=True):
+        # As a de-chunking server hands it over: no length, readable to EOF
+        extra = {'CONTENT_LENGTH': '', 'HTTP_TRANSFER_ENCODING': 'chunked', 'wsgi.input': io.BytesIO(body)}
+        if terminated:
+            extra['wsgi.input_terminated'] = True
+        return self.client.generic('POST', url, body, content_type='application/x-ndjson', **extra)
+
+    def test_json_array(self):
+        response = self.client.post('/api/logs/bulk/', [
+            {'agent': str(self.agent.id), 'action': 'file_read', 'status': 'allowed'},
+            {'agent': str(self.agent.id), 'action': 'file_write', 'status': 'bogus'},
+            {'agent': str(self.agent.id), 'action': 'api_call', 'status': 'blocked'},
+        ], format='json')
+        body = response.json()
+        self.assertEqual((body['received'], body['created'], body['failed']), (3, 2, 1))
+        self.assertEqual(body['errors'][0]['index'], 1)
+        self.assertEqual(AgentLog.objects.count(), 2)
+
+    def test_batches_and_limits(self):
+        records = [{'agent': str(self.agent.id), 'action': 'file_read', 'status': 'allowed'} for _ in range(5)]
+        records.append({'agent': str(uuid.uuid4()), 'action': 'file_read', 'status': 'allowed'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/logs/bulk/?batch_size=2', {'logs': records}, format='json')
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (5, 1))
+        self.assertEqual(body['errors'][0]['index'], 5)
+        self.assertIn('agent', body['errors'][0]['errors'])
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "agent_logs"')]
+        self.assertEqual(len(inserts), 3)
+
+        self.assertEqual(get_batch_size('0'), 1)
+        self.assertEqual(get_batch_size('junk'), settings.AGENT_LOG_BULK_BATCH_SIZE)
+        self.assertEqual(get_batch_size(10 ** 6), settings.AGENT_LOG_BULK_MAX_BATCH_SIZE)
+
+        self.assertEqual(self.client.post('/api/logs/bulk/', {'logs': 'x'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post('/api/logs/bulk/', records[-1:], format='json').status_code, 400)
+        with override_settings(AGENT_LOG_BULK_MAX_RECORDS=2):
+            self.assertEqual(self.client.post('/api/logs/bulk/', records, format='json').status_code, 413)
+
+    def test_ndjson_with_malformed_line(self):
+        record = f'{{"agent": "{self.agent.id}", "action": "file_read", "status": "allowed"}}'
+        body = self.ndjson(record, '{not json', '', record)
+        response = self.client.generic('POST', '/api/logs/bulk/', body, content_type='application/x-ndjson')
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (2, 1))
+        self.assertEqual(body['errors'][0]['line'], 2)
+
+    def test_chunked_bodies(self):
+        record = f'{{"agent": "{self.agent.id}", "action": "file_read", "status": "allowed"}}'
+        response = self.post_chunked('/api/logs/bulk/', self.ndjson(record, record))
+        self.assertEqual(response.json()['created'], 2)
+
+        url = f'/api/agents/{self.agent.id}/metrics/stream/'
+        response = self.post_chunked(url, self.ndjson('{"tokens_used": 10}', '[1', '{"tokens_used": 20}'))
+        body = response.json()
+        self.assertEqual((body['accepted'], body['rejected']), (2, 1))
+        self.assertEqual(body['errors'][0]['line'], 2)
+        self.assertEqual(AgentMetric.objects.filter(agent=self.agent).count(), 2)
+
+        # Without a de-chunking server the body would read as empty
+        for url in ['/api/logs/bulk/', url]:
+            self.assertEqual(self.post_chunked(url, self.ndjson(record), terminated=False).status_code, 411)
+
+
+class DashboardStatsTests(TestCase):
+    """The cached snapshot follows writes exactly as a recomputation would"""
+
+    def assertSnapshotCurrent(self):
+        cached = caches['stats'].get(stats.STATS_KEY)
+        self.assertIsNotNone(cached)
+        fresh = stats.compute_snapshot()
+        for key in ['total_agents', 'active_agents', 'security_sum', 'recent_alerts']:
+            self.assertEqual(cached[key], fresh[key], key)
+        self.assertAlmostEqual(cached['total_cost'], fresh['total_cost'])
+
+    def test_deltas_match_recomputed_snapshot(self):
+        user = User.objects.create(username='dashboard')
+        stats.invalidate()
+        with self.assertNumQueries(2):
+            stats.get_dashboard_stats()
+        with self.assertNumQueries(0):
+            stats.get_dashboard_stats()
+
+        idle = Agent.objects.create(user=user, name='idle', total_cost=Decimal('1.5'))
+        running = Agent.objects.create(user=user, name='running', status='running', security_score=40)
+        self.assertSnapshotCurrent()
+
+        idle = Agent.objects.get(pk=idle.pk)
+        idle.status = 'running'
+        idle.total_cost = Decimal('4.25')
+        idle.security_score = 70
+        idle.save()
+        running = Agent.objects.get(pk=running.pk)
+        running.status = 'stopped'
+        running.last_active_at = timezone.now() - timedelta(hours=2)
+        running.save()
+        self.assertSnapshotCurrent()
+
+        AgentLog.objects.create(agent=idle, action='file_delete', status='blocked')
+        AgentLog.objects.create(agent=idle, action='file_read', status='allowed')
+        self.assertSnapshotCurrent()
+        security.get_security_buffer().flush()
+        self.assertSnapshotCurrent()
+
+    def test_unknown_previous_values_drop_the_snapshot(self):
+        agent = Agent.objects.create(user=User.objects.create(username='partial'), name='partial')
+        stats.get_dashboard_stats()
+        partial = Agent.objects.only('id', 'name').get(pk=agent.pk)
+        partial.name = 'renamed'
+        partial.save()
+        self.assertIsNone(caches['stats'].get(stats.STATS_KEY))
+
+        stats.get_dashboard_stats()
+        agent.delete()
+        self.assertIsNone(caches['stats'].get(stats.STATS_KEY))
+
+
+class EventStreamTests(TestCase):
+    """SSE feed: filters and resuming after Last-Event-ID"""
+
+    def read(self, query='', last_event_id=None):
+        extra = {'HTTP_LAST_EVENT_ID': last_event_id} if last_event_id else {}
+        response = self.client.get(f'/api/events/{query}', **extra)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        blocks = []
+        for block in b''.join(response.streaming_content).decode().split('\n\n'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines())
+            if fields:
+                blocks.append(fields)
+        # Under WSGI the feed says it won't stay open, then replays
+        self.assertEqual(blocks.pop(0), {'event': 'ready', 'data': '{"live": false}'})
+        # The last block carries no event, only the position to resume from
+        position = blocks.pop()
+        self.assertNotIn('data', position)
+        return [(block['event'], json.loads(block['data'])) for block in blocks], position['id']
+
+    def test_resume_after_last_event_id(self):
+        broker = events.get_broker()
+        start = broker.event_id(broker.seq)
+        agent, other = str(uuid.uuid4()), str(uuid.uuid4())
+        events.publish('log', {'agent': agent, 'action': 'file_delete', 'status': 'blocked'})
+        events.publish('log', {'agent': other, 'action': 'file_read', 'status': 'allowed'})
+        last = events.publish('agent.status', {'agent': agent, 'status': 'running', 'previous': 'idle'})
+
+        received, position = self.read(last_event_id=start)
+        self.assertEqual([(kind, data['agent']) for kind, data in received],
+                         [('log', agent), ('log', other), ('agent.status', agent)])
+        self.assertEqual(position, last.id)
+        self.assertEqual(self.read(last_event_id=position), ([], last.id))
+
+        # Filtered feeds still move the position past skipped events
+        received, position = self.read(f'?agent={agent.upper()}&status=blocked', last_event_id=start)
+        self.assertEqual([kind for kind, _ in received], ['log', 'agent.status'])
+        self.assertEqual(position, last.id)
+        # status and action only filter logs
+        received, _ = self.read('?action=READ', last_event_id=start)
+        self.assertEqual([(kind, data['agent']) for kind, data in received],
+                         [('log', other), ('agent.status', agent)])
+
+        # Ids from another process (or before a restart) resume from now
+        self.assertEqual(self.read(last_event_id='0000-1'), ([], last.id))
+        self.assertEqual(self.read(), ([], last.id))
+
+    def test_bad_agent_filter(self):
+        response = self.client.get('/api/events/?agent=not-a-uuid')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('agent', response.json())
+
+    def test_broker_history_and_wait(self):
+        broker = events.InProcessBroker(history=3)
+        for i in range(5):
+            broker.publish('log', {'n': i})
+        self.assertEqual([event.data['n'] for event in broker.since(0)], [2, 3, 4])
+        self.assertEqual(broker.since(5), [])
+        self.assertEqual(broker.cursor(broker.event_id(4)), 4)
+        self.assertFalse(asyncio.run(broker.wait(5, 0.01)))
+        self.assertTrue(asyncio.run(broker.wait(4, 0.01)))
+
+
+class RetentionTests(TestCase):
+    """Per-plan retention windows and chunked deletes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.now = timezone.now()
+        cls.agents = {}
+        for plan in ['free', 'pro', 'self-hosted']:
+            agent = Agent.objects.create(user=User.objects.create(username=plan, plan=plan), name=plan)
+            cls.agents[plan] = agent
+            for days in [1, 10, 100]:
+                log = AgentLog.objects.create(agent=agent, action='file_read', status='allowed')
+                metric = AgentMetric.objects.create(agent=agent)
+                moment = cls.now - timedelta(days=days)
+                AgentLog.objects.filter(pk=log.pk).update(timestamp=moment)
+                AgentMetric.objects.filter(pk=metric.pk).update(timestamp=moment)
+            rollups.rebuild_rollups(agent.id)
+
+    def tearDown(self):
+        security.get_security_buffer().flush()
+
+    def test_cutoffs(self):
+        cutoffs = retention.retention_cutoffs(self.now)
+        self.assertEqual(cutoffs, {
+            'free': self.now - timedelta(days=7),
+            'pro': self.now - timedelta(days=90),
+            'self-hosted': None,
+        })
+        self.assertIsNone(retention.drop_horizon(cutoffs))
+        del cutoffs['self-hosted']
+        self.assertEqual(retention.drop_horizon(cutoffs), self.now - timedelta(days=90))
+
+        moment = datetime(2026, 3, 4, 15, 30, tzinfo=dt_timezone.utc)
+        start = retention.partition_start(moment)
+        self.assertLessEqual(start, moment)
+        self.assertLess(moment, start + retention.partition_interval())
+        self.assertEqual(start.date().toordinal() % settings.RETENTION_PARTITION_DAYS, 0)
+
+    def test_enforce_retention(self):
+        # Rollups: minute, hour and day buckets of the 10 (free) and 100 day old samples
+        expected = {'agent_logs': 3, 'agent_metrics': 3, 'agent_metric_rollups': 9}
+        result = retention.enforce_retention(now=self.now, dry_run=True)
+        self.assertEqual(result['deleted_rows'], expected)
+        self.assertEqual(AgentLog.objects.count(), 9)
+
+        result = retention.enforce_retention(now=self.now, chunk_size=1)
+        self.assertEqual(result, {'dropped_partitions': [], 'deleted_rows': expected})
+        remaining = {
+            plan: sorted((self.now - log.timestamp).days for log in AgentLog.objects.filter(agent=agent))
+            for plan, agent in self.agents.items()
+        }
+        self.assertEqual(remaining, {'free': [1], 'pro': [1, 10], 'self-hosted': [1, 10, 100]})
+        self.assertEqual(AgentMetric.objects.filter(agent=self.agents['free']).count(), 1)
+        self.assertEqual(AgentMetricRollup.objects.filter(agent=self.agents['free']).count(), 3)
+        days = AgentMetricRollup.objects.filter(agent=self.agents['pro'], resolution='day')
+        self.assertEqual(days.aggregate(samples=Sum('samples'))['samples'], 2)
+        self.assertEqual(retention.enforce_retention(now=self.now)['deleted_rows'],
+                         {'agent_logs': 0, 'agent_metrics': 0, 'agent_metric_rollups': 0})
+
+    def test_convert_to_partitioned(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('Partitioning is only supported on PostgreSQL')
+        ids = set(AgentLog.objects.values_list('id', flat=True))
+        self.assertTrue(retention.convert_to_partitioned(AgentLog))
+        self.assertTrue(retention.is_partitioned('agent_logs'))
+        self.assertIn('agent_logs_legacy', [name for name, _ in retention.list_partitions('agent_logs')])
+        self.assertEqual(set(AgentLog.objects.values_list('id', flat=True)), ids)
+
+        log = AgentLog.objects.create(agent=self.agents['free'], action='file_read', status='allowed')
+        self.assertGreater(log.id, max(ids))
+        self.assertFalse(retention.convert_to_partitioned(AgentLog))
+
+
+class FastPathTests(TestCase):
+    """The values_list() fast path returns and renders what the serializers do"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='fast')
+        cls.agents = [
+            Agent.objects.create(user=user, name='plain'),
+            Agent.objects.create(user=user, name='caf\u00e9 \u2028', status='running', security_score=0,
+                                 last_active_at=timezone.now(), total_cost=Decimal('12.3456')),
+        ]
+        for agent in cls.agents:
+            AgentLog.objects.create(agent=agent, action='file_read', target='/tmp/\u2029', status='allowed',
+                                    metadata={'nested': [1, 2.5, None], 'text': 'caf\u00e9'})
+            AgentMetric.objects.create(agent=agent, tokens_used=7, cost=Decimal('0.1'), metadata={'k': 'v'})
+        AgentMetric.objects.create(agent=cls.agents[0], cost=Decimal('99999.9999'))
+
+    def tearDown(self):
+        security.get_security_buffer().flush()
+
+    def test_rows_match_serializers(self):
+        for serializer_class, queryset in [
+            (AgentSerializer, Agent.objects.all()),
+            (AgentSummarySerializer, Agent.objects.all()),
+            (AgentLogSerializer, AgentLog.objects.select_related('agent')),
+            (AgentMetricSerializer, AgentMetric.objects.all()),
+        ]:
+            fast = FastRowSerializer(serializer_class)
+            self.assertEqual(
+                fast.serialize(queryset.values_list(*fast.paths)),
+                serializer_class(queryset, many=True).data,
+                serializer_class.__name__,
+            )
+
+    def test_list_responses_match(self):
+        for url in ['/api/agents/', '/api/logs/', '/api/logs/?page_size=1']:
+            with override_settings(FAST_LIST_SERIALIZATION=False):
+                slow = self.client.get(url)
+            with override_settings(FAST_LIST_SERIALIZATION=True):
+                fast = self.client.get(url)
+            self.assertEqual(fast.status_code, 200)
+            self.assertEqual(fast.content, slow.content, url)
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'when': timezone.now(), 'cost': Decimal('1.50'), 'id': uuid.uuid4(),
+            'text': 'caf\u00e9 \u2028 \u2029', 'numbers': [1, 2.5, None, True], 'nested': {'a': []},
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class HeartbeatTests(TestCase):
+    """Buffered beats do what saving the agent would have, for known agents only"""
+
+    def test_flush_updates_stats_and_publishes_status(self):
+        user = User.objects.create(username='beating')
+        idle = Agent.objects.create(user=user, name='idle', status='idle')
+        running = Agent.objects.create(user=user, name='running', status='running')
+        stats.invalidate()  # Left over from other tests
+        self.assertEqual(stats.get_dashboard_stats()['active_agents'], 1)
+        broker = events.get_broker()
+        seq = broker.seq
+
+        unknown = uuid.uuid4()
+        response = APIClient().post('/api/agents/heartbeats/', {
+            'agents': [str(idle.id), str(running.id), str(unknown), 'not-a-uuid'],
+        }, format='json')
+        body = response.json()
+        self.assertEqual((body['accepted'], body['unknown'], body['invalid']), (2, [str(unknown)], ['not-a-uuid']))
+        self.assertNotIn(str(unknown), get_heartbeat_buffer().liveness())
+
+        get_heartbeat_buffer().flush()
+        idle.refresh_from_db()
+        self.assertEqual(idle.status, 'running')
+        self.assertEqual(stats.get_dashboard_stats()['active_agents'], 2)
+        self.assertEqual(stats.compute_snapshot()['active_agents'], 2)
+        changes = [event.data for event in broker.since(seq) if event.type == 'agent.status']
+        self.assertEqual(changes, [{'agent': str(idle.id), 'name': 'idle', 'status': 'running', 'previous': 'idle'}])
+
+    def test_late_beat_does_not_move_last_active_back(self):
+        now = timezone.now()
+        agent = Agent.objects.create(user=User.objects.create(username='late'), name='late', status='stopped')
+        Agent.objects.filter(pk=agent.pk).update(last_active_at=now)
+        buffer = HeartbeatBuffer(interval=3600, max_pending=1000)
+        self.addCleanup(buffer.pending.clear)
+        broker = events.get_broker()
+        seq = broker.seq
+
+        buffer.beat(agent.id, now - timedelta(minutes=5))  # Replayed after a newer write
+        buffer.flush()
+        agent.refresh_from_db()
+        self.assertEqual((agent.last_active_at, agent.status), (now, 'stopped'))
+        self.assertFalse([event for event in broker.since(seq) if event.type == 'agent.status'])
+
+        buffer.beat(agent.id, now + timedelta(seconds=10))
+        buffer.beat(agent.id, now + timedelta(seconds=5))  # Arrives late
+        self.assertEqual(buffer.liveness([agent.id])[str(agent.id)]['last_seen'], now + timedelta(seconds=10))
+        buffer.flush()
+        agent.refresh_from_db()
+        self.assertEqual((agent.last_active_at, agent.status), (now + timedelta(seconds=10), 'running'))
+
+
+class ExportTests(TestCase):
+    """Streamed exports: formats, compression and parameter errors"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create(user=User.objects.create(username='exported'), name='exported')
+        AgentLog.objects.bulk_create([
+            AgentLog(agent=cls.agent, action='file_read', target='=cmd()', status='allowed'),
+            AgentLog(agent=cls.agent, action='file_write', target='/tmp/out', status='blocked',
+                     metadata={'size': 3}),
+        ])
+
+    def export(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertEqual(response.status_code, 200, url)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.export('/api/logs/export/?format=csv').decode())))
+        self.assertEqual(rows[0], ['id', 'timestamp', 'agent', 'action', 'target', 'status', 'metadata'])
+        self.assertEqual([row[4] for row in rows[1:]], ["'=cmd()", '/tmp/out'])  # No formulas
+        self.assertEqual(rows[2][6], '{"size":3}')
+
+    def test_ndjson_by_accept(self):
+        body = self.export(f'/api/logs/export/?agent={self.agent.id}&status=blocked',
+                           HTTP_ACCEPT='application/x-ndjson')
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(r['agent'], r['target']) for r in records], [(str(self.agent.id), '/tmp/out')])
+
+    def test_gzip(self):
+        response = self.client.get('/api/logs/export/?format=ndjson', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(gzip.decompress(b''.join(response.streaming_content)).splitlines()), 2)
+        response = self.client.get('/api/logs/export/?format=ndjson')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_bad_parameters(self):
+        for url in ['/api/logs/export/?agent=not-a-uuid', '/api/logs/export/?since=yesterday',
+                    '/api/metrics/export/?status=blocked']:
+            self.assertEqual(self.client.get(url).status_code, 400, url)
+        self.assertEqual(self.client.get('/api/logs/export/?format=xml').status_code, 406)
+        self.assertEqual(self.client.get('/api/logs/export/', HTTP_ACCEPT='text/html').status_code, 406)
+
+    def decode_columnar(self, header, chunks):
+        """Records from a columnar export, dictionaries resolved and timestamps in API form"""
+        dictionaries = {column['name']: [] for column in header['columns']}
+        timestamp = DateTimeField()
+        records = []
+        for chunk in chunks:
+            for name, added in chunk['dictionary'].items():
+                dictionaries[name] += added
+            columns = []
+            for column in header['columns']:
+                name, values = column['name'], chunk['columns'][column['name']]
+                if column['encoding'] == 'dictionary':
+                    values = [dictionaries[name][code] for code in values]
+                elif column['encoding'] == 'epoch_us':
+                    values = [timestamp.to_representation(EPOCH + timedelta(microseconds=v)) for v in values]
+                columns.append(values)
+            self.assertEqual(len(columns[0]), chunk['rows'])
+            records += [dict(zip(dictionaries, row)) for row in zip(*columns)]
+        return records
+
+    def expected(self, serializer_class, queryset):
+        # As the API would send them (ids as strings)
+        serializer = serializer_class(queryset.order_by('timestamp', 'id'), many=True)
+        data = json.loads(JSONRenderer().render(serializer.data))
+        return [{key: row[key] for key in data[0] if key != 'agent_name'} for row in data]
+
+    @override_settings(EXPORT_CHUNK_SIZE=2)
+    def test_columnar_formats(self):
+        other = Agent.objects.create(user=self.agent.user, name='other')
+        for i in range(3):
+            AgentLog.objects.create(agent=other if i % 2 else self.agent, action='api_call', status='flagged')
+            AgentMetric.objects.create(agent=other, tokens_used=i, cost=Decimal('0.0125') * i, metadata={'i': i})
+        security.get_security_buffer().flush()
+        cases = [
+            ('logs', AgentLogSerializer, AgentLog.objects.all()),
+            ('metrics', AgentMetricSerializer, AgentMetric.objects.all()),
+        ]
+        for (name, serializer_class, queryset), compressed in itertools.product(cases, [False, True]):
+            headers = {'HTTP_ACCEPT_ENCODING': 'gzip'} if compressed else {}
+            expected = self.expected(serializer_class, queryset)
+
+            body = self.export(f'/api/{name}/export/?format=columnar', **headers)
+            document = json.loads(gzip.decompress(body) if compressed else body)
+            self.assertEqual(document['rows'], len(expected))
+            self.assertGreater(len(document['chunks']), 1)
+            self.assertEqual(self.decode_columnar(document, document['chunks']), expected)
+
+            if msgpack is None:
+                continue
+            body = self.export(f'/api/{name}/export/?format=msgpack', **headers)
+            unpacker = msgpack.Unpacker(raw=False)
+            unpacker.feed(gzip.decompress(body) if compressed else body)
+            header, *chunks, trailer = list(unpacker)
+            self.assertEqual(trailer, {'rows': len(expected)})
+            self.assertEqual(self.decode_columnar(header, chunks), expected)
+
+    async def test_streams_under_asgi(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            response = await AsyncClient().get('/api/logs/export/?format=csv', headers={'Accept-Encoding': 'gzip'})
+            self.assertTrue(response.is_async)
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        # Django warns when it has to read a sync iterator to the end first
+        self.assertEqual([str(w.message) for w in caught if 'StreamingHttpResponse' in str(w.message)], [])
+        rows = list(csv.reader(io.StringIO(gzip.decompress(body).decode())))
+        self.assertEqual([row[4] for row in rows[1:]], ["'=cmd()", '/tmp/out'])
+
+
+class TimeSeriesTests(TestCase):
+    """Buckets are half-open [start, start + width) and empty ones are left out"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create(user=User.objects.create(username='charted'), name='charted')
+        cls.start = datetime(2026, 1, 1, 12, 0, tzinfo=dt_timezone.utc)
+        offsets = [0] * 37 + [299, 300, 599, 1200]
+        metrics = AgentMetric.objects.bulk_create([
+            AgentMetric(agent=cls.agent, tokens_used=(i * 7919) % 101) for i in range(len(offsets))
+        ])
+        for metric, offset in zip(metrics, offsets):
+            metric.timestamp = cls.start + timedelta(seconds=offset)
+        AgentMetric.objects.bulk_update(metrics, ['timestamp'])
+        cls.values = [metric.tokens_used for metric in metrics]
+
+    def series(self, since, until):
+        return bucketed_series(AgentMetric.objects.all(), 'tokens_used', 300, since, until)
+
+    def test_bucket_boundaries(self):
+        points = self.series(self.start, self.start + timedelta(seconds=1200))
+        self.assertEqual([(p['t'], p['count']) for p in points], [
+            (self.start, 38), (self.start + timedelta(seconds=300), 2),
+        ])
+        self.assertEqual(points[1]['sum'], sum(self.values[38:40]))
+        first = sorted(self.values[:38])
+        self.assertAlmostEqual(points[0]['p95'], percentile(first, 0.95))
+        self.assertEqual(points[1]['p95'], percentile(sorted(self.values[38:40]), 0.95))
+
+    def test_empty_window(self):
+        self.assertEqual(self.series(self.start - timedelta(hours=1), self.start), [])
+        response = self.client.get('/api/metrics/timeseries/?since=2025-01-01T00:00:00Z&until=2025-01-02T00:00:00Z&bucket=1h')
+        self.assertEqual(response.json()['points'], [])
+
+    def test_bad_parameters(self):
+        for query in ['since=2026-13-45', 'bucket=5x', 'field=name', 'since=1h&until=2h',
+                      'since=30d&bucket=1s']:
+            self.assertEqual(self.client.get(f'/api/metrics/timeseries/?{query}').status_code, 400, query)
+
+
+class RollupTests(TestCase):
+    """Rollup windows and the totals read from them"""
+
+    def test_plan_ranges(self):
+        def at(day, hour, minute, second=0):
+            return datetime(2026, 1, day, hour, minute, second, tzinfo=dt_timezone.utc)
+
+        rollup_ranges, raw_ranges = rollups.plan_ranges(at(1, 22, 30, 15), at(3, 1, 5, 30))
+        self.assertEqual(rollup_ranges, {
+            'day': [(at(2, 0, 0), at(3, 0, 0))],
+            'hour': [(at(1, 23, 0), at(2, 0, 0)), (at(3, 0, 0), at(3, 1, 0))],
+            'minute': [(at(1, 22, 31), at(1, 23, 0)), (at(3, 1, 0), at(3, 1, 5))],
+        })
+        self.assertEqual(raw_ranges, [(at(1, 22, 30, 15), at(1, 22, 31)), (at(3, 1, 5), at(3, 1, 5, 30))])
+
+        # Shorter than a minute: raw samples only
+        since, until = at(1, 0, 0, 10), at(1, 0, 0, 50)
+        self.assertEqual(rollups.plan_ranges(since, until), ({}, [(since, until)]))
+
+    def test_totals_match_raw_samples(self):
+        agent = Agent.objects.create(user=User.objects.create(username='rolled'), name='rolled')
+        now = timezone.now()
+        rng = random.Random(3)
+        metrics = AgentMetric.objects.bulk_create([
+            AgentMetric(agent=agent, tokens_used=rng.randrange(1000), cost=Decimal(rng.randrange(10000)) / 1000,
+                        files_accessed=rng.randrange(5), tool_calls=rng.randrange(5))
+            for _ in range(200)
+        ])
+        for metric in metrics:
+            metric.timestamp = now - timedelta(seconds=rng.randrange(3 * 86400))
+        AgentMetric.objects.bulk_update(metrics, ['timestamp'])
+        rollups.apply_metrics(metrics)
+
+        def raw(since):
+            totals = AgentMetric.objects.filter(agent=agent, timestamp__gte=since).aggregate(
+                tokens=Sum('tokens_used'), cost=Sum('cost'), files=Sum('files_accessed'), tools=Sum('tool_calls'),
+            )
+            return [totals['tokens'], Decimal(totals['cost']).quantize(Decimal('0.0001')), totals['files'], totals['tools']]
+
+        def from_rollups(since):
+            with self.assertNumQueries(2):
+                totals = rollups.rollup_totals(agent.id, since, now)
+            return [totals['total_tokens'], Decimal(totals['total_cost']).quantize(Decimal('0.0001')),
+                    totals['total_files'], totals['total_tools']]
+
+        for hours in [1, 5, 24, 49, 72]:
+            since = now - timedelta(hours=hours, seconds=17)
+            self.assertEqual(from_rollups(since), raw(since), hours)
+
+        # Rebuilding from raw samples gives the same buckets
+        buckets = AgentMetricRollup.objects.filter(agent=agent).values_list(
+            'resolution', 'bucket', 'samples', 'tokens_used', 'tool_calls'
+        )
+        before = set(buckets)
+        rollups.rebuild_rollups(agent.id)
+        self.assertEqual(set(buckets.all()), before)
+
+
+@override_settings(FLEET_SUMMARY_MIN_INTERVAL=15, FLEET_SUMMARY_MAX_AGE=300)
+class FleetSummaryTests(TestCase):
+    """Fleet summary refreshes, ordering and top-N"""
+
+    def setUp(self):
+        caches['stats'].clear()
+        user = User.objects.create(username='fleet')
+        self.agents = [
+            Agent.objects.create(user=user, name=f'{model}-{i}', model=model, total_cost=cost)
+            for model, cost, count in [('alpha', 1, 3), ('beta', 5, 1), ('gamma', 2, 2)]
+            for i in range(count)
+        ]
+
+    def summary(self, query=''):
+        response = APIClient().get(f'/api/fleet/summary/?group_by=model{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_staleness(self):
+        self.assertTrue(fleet.is_stale('model'))
+        fleet.refresh('model')
+        now = time.time()
+        self.assertFalse(fleet.is_stale('model', now))
+        self.assertTrue(fleet.is_stale('model', now + 300))
+
+        fleet.mark_changed([self.agents[0].id])
+        self.assertFalse(fleet.is_stale('model', now + 1))
+        self.assertTrue(fleet.is_stale('model', now + 15))
+
+    def test_changes_refresh_only_their_groups(self):
+        fleet.refresh('model')
+        agent = Agent.objects.get(pk=self.agents[3].pk)  # beta
+        agent.total_cost = 7
+        agent.save()
+        self.assertEqual(fleet.changed_agents('model'), [agent.id])
+
+        before = dict(FleetSummary.objects.filter(dimension='model').values_list('key', 'refreshed_at'))
+        self.assertEqual(fleet.refresh('model', fleet.changed_agents('model')), 1)
+        after = dict(FleetSummary.objects.filter(dimension='model').values_list('key', 'refreshed_at'))
+        self.assertEqual(after['alpha'], before['alpha'])
+        self.assertGreater(after['beta'], before['beta'])
+        self.assertEqual(fleet.changed_agents('model'), [])
+        self.assertEqual(self.summary()['totals']['total_cost'], '14.0000')
+
+    def test_moving_agents_rebuilds_the_dimension(self):
+        fleet.refresh('model')
+        fleet.refresh('status')
+        agent = Agent.objects.get(pk=self.agents[3].pk)  # beta's only agent
+        agent.model = 'alpha'
+        agent.save()
+        self.assertIsNone(fleet.changed_agents('model'))
+        self.assertEqual(fleet.changed_agents('status'), [agent.id])
+
+        with mock.patch.object(fleet, 'is_stale', return_value=True):
+            body = self.summary()
+        self.assertEqual(body['groups'], 2)
+        self.assertEqual([row['key'] for row in body['results']], ['alpha', 'gamma'])
+        self.assertEqual(body['results'][0]['agents'], 4)
+
+    def test_ordering(self):
+        body = self.summary('&order=total_cost')
+        self.assertEqual([row['key'] for row in body['results']], ['beta', 'gamma', 'alpha'])
+        body = self.summary('&order=-total_cost')
+        self.assertEqual([row['key'] for row in body['results']], ['alpha', 'gamma', 'beta'])
+        # Ties are broken by key
+        body = self.summary('&order=running_agents')
+        self.assertEqual([row['key'] for row in body['results']], ['alpha', 'beta', 'gamma'])
+        self.assertEqual(APIClient().get('/api/fleet/summary/?order=name').status_code, 400)
+
+    def test_top_is_clamped(self):
+        self.assertEqual(fleet.parse_summary_params({'top': '0'})['top'], 1)
+        self.assertEqual(fleet.parse_summary_params({'top': '100000'})['top'], settings.FLEET_SUMMARY_MAX_TOP)
+        self.assertEqual(APIClient().get('/api/fleet/summary/?top=many').status_code, 400)
+
+        body = self.summary('&top=1')
+        self.assertEqual([row['key'] for row in body['results']], ['beta'])
+        # Totals still cover every group
+        self.assertEqual(body['groups'], 3)
+        self.assertEqual(body['totals']['agents'], 6)
+        self.assertEqual(body['totals']['total_cost'], '12.0000')
+
+
+class CounterBufferTests(TestCase):
+    """A delta that can't be applied is dropped without holding up the others"""
+
+    def test_bad_key_does_not_block_others(self):
+        user = User.objects.create(username='counted')
+        good = Agent.objects.create(user=user, name='good')
+        bad = Agent.objects.create(user=user, name='bad')
+        buffer = CounterBuffer(interval=3600, max_pending=100)
+        buffer.add(bad.id, {'tasks_completed': 10 ** 20})
+        buffer.add(good.id, {'tasks_completed': 3})
+        with self.assertLogs('core.buffers', 'ERROR'):
+            self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.pending, {})
+        good.refresh_from_db()
+        self.assertEqual(good.tasks_completed, 3)
+
+        client = APIClient()
+        response = client.post('/api/agents/increments/', {'deltas': [
+            {'agent': str(good.id), 'tasks_completed': 10 ** 20},
+        ]}, format='json')
+        self.assertEqual(response.json()['failed'], 1)
+        response = client.post(f'/api/agents/{good.id}/increment/', {'tasks_completed': 10 ** 20}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CounterEndpointTests(TestCase):
+    """increment / increments: validation, unknown agents and the summed flush"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.agent = Agent.objects.create(user=User.objects.create(username='counting'), name='counting')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.buffer = CounterBuffer(interval=3600, max_pending=100)
+        self.addCleanup(self.buffer.pending.clear)  # Nothing left for the exit flush
+        patcher = mock.patch('core.api.get_counter_buffer', return_value=self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_increment(self):
+        url = f'/api/agents/{self.agent.id}/increment/'
+        response = self.client.post(url, {'tasks_completed': 2, 'total_cost': '0.0125'}, format='json')
+        self.assertEqual(response.json(), {
+            'tasks_completed': 2, 'tasks_failed': 0, 'total_cost': '0.0125', 'uptime_seconds': 0,
+        })
+        for payload in [{'tasks_completed': 'many'}, {'total_cost': '1.123456'}, {'uptime_seconds': 2 ** 31}]:
+            self.assertEqual(self.client.post(url, payload, format='json').status_code, 400, payload)
+
+        unknown = f'/api/agents/{uuid.uuid4()}/increment/'
+        self.assertEqual(self.client.post(unknown, {'tasks_completed': 1}, format='json').status_code, 404)
+        self.assertEqual(
+            self.client.post(f'{unknown}?buffered=1', {'tasks_completed': 1}, format='json').status_code, 404
+        )
+        self.assertEqual(self.buffer.pending, {})
+        self.assertEqual(self.client.post(f'{url}?buffered=1', {'tasks_failed': 1}, format='json').status_code, 202)
+        self.assertEqual(list(self.buffer.pending), [self.agent.id])
+
+    def test_increments_are_summed_on_flush(self):
+        response = self.client.post('/api/agents/increments/', {'deltas': [
+            {'agent': str(self.agent.id), 'tasks_completed': 2, 'total_cost': '0.5'},
+            {'agent': str(uuid.uuid4()), 'tasks_completed': 1},
+            {'tasks_completed': 1},
+            {'agent': str(self.agent.id), 'tasks_completed': 3, 'uptime_seconds': 60},
+            {'agent': str(self.agent.id), 'tasks_failed': 'x'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 202)
+        body = response.json()
+        self.assertEqual((body['accepted'], body['failed']), (2, 3))
+        self.assertEqual([error['index'] for error in body['errors']], [1, 2, 4])
+        self.assertIn('does not exist', body['errors'][0]['errors']['agent'][0])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.buffer.flush(), 1)
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "agents"')]
+        self.assertEqual(len(updates), 1)
+        self.agent.refresh_from_db()
+        self.assertEqual((self.agent.tasks_completed, self.agent.uptime_seconds), (5, 60))
+        self.assertEqual(self.agent.total_cost, Decimal('0.5'))
+
+        self.assertEqual(self.client.post('/api/agents/increments/', {'deltas': 'x'}, format='json').status_code, 400)
+
+
+class SecurityScoreTests(TestCase):
+    """Incremental bucket updates score the same as a rebuild from raw logs"""
+
+    def test_incremental_matches_rebuild(self):
+        agent = Agent.objects.create(user=User.objects.create(username='scored'), name='scored')
+        logs = AgentLog.objects.bulk_create([
+            AgentLog(agent=agent, action='file_read', target='/etc/passwd', status='blocked'),
+            AgentLog(agent=agent, action='code_execute', target='build.sh', status='flagged'),
+            AgentLog(agent=agent, action='file_read', target='report.csv', status='allowed'),
+            AgentLog(agent=agent, action='api_call', target='https://api.stripe.com', status='allowed'),
+        ])
+        security.apply_deltas(security.bucket_deltas(logs))
+        agent.refresh_from_db()
+        # (40 blocked + 20 flagged + 15 * 1.25 action risk) / 4 logs + 5 for one sensitive hit
+        self.assertEqual(agent.security_score, 75)
+        self.assertIsNotNone(agent.last_security_check)
+
+        incremental = list(AgentSecurityBucket.objects.values(*security.COUNT_FIELDS))
+        security.rebuild_buckets([agent.id])
+        self.assertEqual(list(AgentSecurityBucket.objects.values(*security.COUNT_FIELDS)), incremental)
+
+
+class PolicyEngineTests(TestCase):
+    """Compiled rules pick the same winner as reading the rules by hand"""
+
+    def test_precedence_and_scopes(self):
+        agent = Agent.objects.create(
+            user=User.objects.create(username='governed'), name='governed', model='gpt-4'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            PolicyRule.objects.bulk_create([
+                PolicyRule(action='file_read', pattern='/etc/*', decision='flagged'),
+                PolicyRule(action='file_read', pattern='/etc/shadow', decision='blocked'),
+                PolicyRule(pattern='/etc/host*', decision='allowed', priority=5),
+                PolicyRule(model='gpt-4', pattern_type='regex', pattern=r'https://[^/]+\.internal/.*',
+                           decision='blocked'),
+                PolicyRule(agent=agent, pattern='*/.ssh/*', decision='blocked', priority=10),
+            ])
+            policy.rules_changed()
+
+        engine = policy.get_engine()
+        cases = [
+            ('file_read', '/etc/passwd', 'flagged'),
+            ('file_read', '/etc/shadow', 'blocked'),  # Tie with /etc/*: stricter wins
+            ('file_read', '/etc/hosts', 'allowed'),  # Higher priority
+            ('file_write', '/etc/passwd', 'allowed'),  # Other action: default
+            ('web_request', 'https://db.internal/q', 'blocked'),
+            ('file_read', '/home/dev/.ssh/id_rsa', 'blocked'),
+        ]
+        for action, target, expected in cases:
+            self.assertEqual(engine.decide(action, target, agent.id, agent.model).decision, expected)
+        # Model and agent rules don't leak to other agents
+        self.assertEqual(engine.decide('web_request', 'https://db.internal/q').decision, 'allowed')
+        self.assertEqual(engine.decide('file_read', '/home/dev/.ssh/id_rsa', model='gpt-4').decision, 'allowed')
+
+        client = APIClient()
+        response = client.post('/api/policy/decide/', {'actions': [
+            {'agent': str(agent.id), 'action': 'web_request', 'target': 'https://db.internal/q'},
+            {'action': 'file_read', 'target': '/etc/shadow'},
+            {'target': '/etc/shadow'},
+        ]}, format='json')
+        decisions = response.json()['decisions']
+        self.assertEqual([d.get('decision') for d in decisions], ['blocked', 'blocked', None])
+        self.assertIn('action', decisions[2]['errors'])
+
+        # Bulk ingestion decides logs sent without a status
+        client.post('/api/logs/bulk/', [
+            {'agent': str(agent.id), 'action': 'file_read', 'target': '/etc/shadow'},
+            {'agent': str(agent.id), 'action': 'file_read', 'target': '/etc/passwd', 'status': 'allowed'},
+        ], format='json')
+        self.assertEqual(
+            list(AgentLog.objects.order_by('id').values_list('status', flat=True)), ['blocked', 'allowed']
+        )
+        security.get_security_buffer().flush()
+
+
+    def test_changes_from_other_workers_are_picked_up(self):
+        def decide():
+            # As if POLICY_RELOAD_SECONDS had passed
+            with mock.patch.object(policy, '_checked_at', 0.0):
+                return policy.get_engine().decide('file_read', '/etc/shadow').decision
+
+        self.assertEqual(decide(), 'allowed')
+        # Saved by another worker: no signal reaches this process, only the table changes
+        PolicyRule.objects.bulk_create([PolicyRule(pattern='/etc/shadow', decision='blocked')])
+        self.assertEqual(decide(), 'blocked')
+        PolicyRule.objects.update(decision='flagged', updated_at=timezone.now())
+        self.assertEqual(decide(), 'flagged')
+
+
+class AgentLimitsTests(TestCase):
+    """Decisions respect the agent's rate limit and rolling cost budget"""
+
+    def test_rate_and_budget(self):
+        user = User.objects.create(username='limited')
+        fast = Agent.objects.create(user=user, name='fast', actions_per_minute=2)
+        client = APIClient()
+        response = client.post('/api/policy/decide/', {'actions': [
+            {'agent': str(fast.id), 'action': 'tool_use', 'target': 'search'},
+        ] * 3}, format='json')
+        decisions = response.json()['decisions']
+        self.assertEqual([d['decision'] for d in decisions], ['allowed', 'allowed', 'blocked'])
+        self.assertEqual(decisions[2]['limit']['type'], 'rate')
+        self.assertGreater(decisions[2]['limit']['retry_after'], 0)
+
+        # Spend before the first check is seeded from the rollups, later spend is tracked
+        spender = Agent.objects.create(user=user, name='spender', cost_budget=Decimal('1'))
+        AgentMetric.objects.create(agent=spender, cost=Decimal('0.6'))
+        self.assertEqual(limits.spend([spender.id])[spender.id], Decimal('0.6'))
+        AgentMetric.objects.create(agent=spender, cost=Decimal('0.5'))
+        response = client.post('/api/policy/decide/', {
+            'agent': str(spender.id), 'action': 'tool_use', 'target': 'search',
+        }, format='json')
+        self.assertEqual(response.json()['limit']['type'], 'budget')
+
+
+    def test_zero_refuses_everywhere(self):
+        user = User.objects.create(username='paused')
+        paused = Agent.objects.create(user=user, name='paused', actions_per_minute=0)
+        default = Agent.objects.create(user=user, name='default')
+        client = APIClient()
+
+        def decisions():
+            response = client.post('/api/policy/decide/', {'actions': [
+                {'agent': str(agent.id), 'action': 'tool_use'} for agent in (paused, default)
+            ]}, format='json')
+            return [d['decision'] for d in response.json()['decisions']]
+
+        self.assertEqual(decisions(), ['blocked', 'allowed'])
+        with override_settings(LIMITS_ACTIONS_PER_MINUTE=0):
+            self.assertEqual(decisions(), ['blocked', 'blocked'])
+        self.assertEqual(client.get(f'/api/agents/{paused.id}/limits/').json()['actions_available'], 0)
+
+
+class AnomalyDetectionTests(TestCase):
+    """Sudden changes in an agent's stream are written as flagged logs"""
+
+    def test_bursts_new_targets_and_spikes(self):
+        agent = Agent.objects.create(user=User.objects.create(username='watched'), name='watched')
+        detector = anomalies.Detector()
+        start = time.time()
+        for minute in range(30):
+            detector.observe_logs([
+                AgentLog(agent=agent, action='file_read', target=f'/srv/data/{i % 5}', status='allowed')
+                for i in range(5)
+            ] + [AgentLog(agent=agent, action='file_delete', target='/tmp/cache', status='allowed')],
+                now=start + 60 * minute)
+
+        burst = [AgentLog(agent=agent, action='file_delete', target='/tmp/cache', status='allowed')] * 20
+        detected = detector.observe_logs(burst, now=start + 60 * 30)
+        self.assertEqual([log.target for log in detected], ['action_burst:file_delete'])
+
+        new = [AgentLog(agent=agent, action='file_read', target='/etc/shadow', status='allowed')]
+        detected = detector.observe_logs(new, now=start + 60 * 30)
+        self.assertEqual([log.target for log in detected], ['new_target:/etc/shadow'])
+
+        # Through the metrics signal, into agent_logs
+        for tokens in range(500, 525):
+            AgentMetric.objects.create(agent=agent, tokens_used=tokens)
+        AgentMetric.objects.create(agent=agent, tokens_used=50000)
+        flagged = AgentLog.objects.filter(agent=agent, action=anomalies.ANOMALY_ACTION)
+        self.assertEqual(list(flagged.values_list('target', 'status')), [('metric_spike:tokens_used', 'flagged')])
+        security.get_security_buffer().flush()
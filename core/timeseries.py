@@ -0,0 +1,239 @@
+"""
+Agent Control Panel - Metric time series
+Fixed-width buckets grouped in the database plus LTTB downsampling of
+raw samples, so charts receive a few hundred points instead of raw rows.
+"""
+import math
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Aggregate, Avg, Count, F, FloatField, Func, IntegerField, Sum, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+SERIES_FIELDS = ['tokens_used', 'cost', 'files_accessed', 'tool_calls']
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class EpochBucket(Func):
+    """Start of the fixed-width bucket (epoch seconds) containing a timestamp"""
+    output_field = IntegerField()
+    # SQL standard EXTRACT(EPOCH ...) (PostgreSQL and most others); SQLite
+    # and MySQL spell it differently below
+    template = 'CAST(FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / %(width)s) * %(width)s AS BIGINT)'
+
+    def __init__(self, expression, width, **extra):
+        super().__init__(expression, width=int(width), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template="(CAST(strftime('%%%%s', %(expressions)s) AS INTEGER) / %(width)s * %(width)s)",
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='(FLOOR(UNIX_TIMESTAMP(%(expressions)s) / %(width)s) * %(width)s)',
+            **extra_context
+        )
+
+
+class Percentile(Aggregate):
+    """PostgreSQL ordered-set percentile (linear interpolation)"""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+def percentile(sorted_values, fraction):
+    """Linear-interpolated percentile, matching PERCENTILE_CONT"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    weight = position - lower
+    return float(sorted_values[lower]) * (1 - weight) + float(sorted_values[upper]) * weight
+
+
+def p95_by_bucket(queryset, field):
+    """
+    {bucket: p95 of ``field``} for a queryset annotated with ``bucket``,
+    for backends without PERCENTILE_CONT. Window functions rank each
+    bucket's values in the database, which returns only the two values
+    the percentile interpolates between, however many rows the bucket has.
+    """
+    # 0-based index of the lower value: floor((n - 1) * 0.95), in integers
+    lower = (F('size') - 1) * 95 / 100
+    ranked = queryset.filter(**{f'{field}__isnull': False}).annotate(
+        rank=Window(RowNumber(), partition_by=[F('bucket')], order_by=[F(field).asc(), F('id').asc()]),
+        size=Window(Count('id'), partition_by=[F('bucket')]),
+    ).filter(rank__gt=lower, rank__lte=lower + 2).values_list('bucket', 'size', field)
+
+    values = {}
+    for bucket, size, value in ranked:
+        values.setdefault(bucket, (size, []))[1].append(value)
+    p95 = {}
+    for bucket, (size, pair) in values.items():
+        weight = (size - 1) * 95 % 100 / 100
+        p95[bucket] = float(min(pair)) * (1 - weight) + float(max(pair)) * weight
+    return p95
+
+
+def parse_duration(value):
+    """'90s', '5m', '1h', '7d' -> seconds"""
+    match = re.fullmatch(r'(\d+)([smhd])', value or '')
+    if not match:
+        raise ValidationError({'bucket': f'Invalid duration "{value}" (use e.g. 30s, 5m, 1h, 1d)'})
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def parse_moment(value, default, name):
+    """ISO timestamp or a duration ago ('24h')"""
+    if not value:
+        return default
+    if re.fullmatch(r'\d+[smhd]', value):
+        return timezone.now() - timedelta(seconds=parse_duration(value))
+    try:
+        moment = parse_datetime(value)
+    except ValueError:  # Well formed but not a real date
+        moment = None
+    if moment is None:
+        raise ValidationError({name: f'Invalid timestamp "{value}"'})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
+
+
+def parse_series_params(params):
+    """Validate ?field=&bucket=&since=&until=&points= into a dict"""
+    now = timezone.now()
+    field = params.get('field', 'cost')
+    if field not in SERIES_FIELDS:
+        raise ValidationError({'field': f'Must be one of {", ".join(SERIES_FIELDS)}'})
+
+    since = parse_moment(params.get('since'), now - timedelta(hours=24), 'since')
+    until = parse_moment(params.get('until'), now, 'until')
+    if since >= until:
+        raise ValidationError({'since': 'Must be before until'})
+
+    width = parse_duration(params.get('bucket', '5m'))
+    if width < 1:
+        raise ValidationError({'bucket': 'Must be at least 1s'})
+    max_buckets = settings.TIMESERIES_MAX_BUCKETS
+    if (until - since).total_seconds() / width > max_buckets:
+        raise ValidationError({'bucket': f'Window would exceed {max_buckets} buckets; use a wider bucket'})
+
+    try:
+        points = int(params.get('points', settings.TIMESERIES_DEFAULT_POINTS))
+    except ValueError:
+        raise ValidationError({'points': 'Must be an integer'})
+
+    return {
+        'field': field,
+        'since': since,
+        'until': until,
+        'bucket_seconds': width,
+        'points': max(3, min(points, settings.TIMESERIES_MAX_POINTS)),
+    }
+
+
+def bucketed_series(queryset, field, width, since, until):
+    """
+    [{t, count, sum, avg, p95}] per bucket, grouped in the database.
+    PostgreSQL computes p95 with PERCENTILE_CONT; other backends rank the
+    values with window functions (p95_by_bucket). Empty buckets are
+    omitted.
+    """
+    queryset = (
+        queryset.filter(timestamp__gte=since, timestamp__lt=until)
+        .order_by()
+        .annotate(bucket=EpochBucket('timestamp', width))
+    )
+    aggregates = {'count': Count('id'), 'sum': Sum(field), 'avg': Avg(field)}
+    in_db_p95 = connection.vendor == 'postgresql'
+    if in_db_p95:
+        aggregates['p95'] = Percentile(field, 0.95)
+
+    rows = list(queryset.values('bucket').annotate(**aggregates).order_by('bucket'))
+
+    if not in_db_p95 and rows:
+        p95 = p95_by_bucket(queryset, field)
+        for row in rows:
+            row['p95'] = p95.get(row['bucket'])
+
+    return [
+        {
+            't': datetime.fromtimestamp(row['bucket'], dt_timezone.utc),
+            'count': row['count'],
+            'sum': row['sum'],
+            'avg': float(row['avg']) if row['avg'] is not None else None,
+            'p95': row['p95'],
+        }
+        for row in rows
+    ]
+
+
+def lttb(points, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling of [(x, y)] sorted by x.
+    Keeps the first and last point and the visually significant ones.
+    """
+    if threshold >= len(points) or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (len(points) - 2) / (threshold - 2)
+    a = 0
+
+    for i in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, len(points))
+        next_bucket = points[next_start:next_end]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = points[a]
+        best_area, best = -1, start
+        for j in range(start, end):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best_area, best = area, j
+
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def raw_series(queryset, field, since, until, points):
+    """Raw samples in the window, LTTB-downsampled to ``points``"""
+    max_rows = settings.TIMESERIES_MAX_RAW_ROWS
+    rows = (
+        queryset.filter(timestamp__gte=since, timestamp__lt=until)
+        .order_by('timestamp', 'id')
+        .values_list('timestamp', field)[:max_rows + 1]
+    )
+    series = [(ts.timestamp(), float(value or 0)) for ts, value in rows]
+    if len(series) > max_rows:
+        raise ValidationError({'raw': f'More than {max_rows} samples in window; use buckets instead'})
+
+    return [
+        {'t': datetime.fromtimestamp(x, dt_timezone.utc), 'value': y}
+        for x, y in lttb(series, points)
+    ], len(series)
@@ -0,0 +1,162 @@
+"""
+Agent Control Panel - Change versions and conditional GET
+Every write bumps a version per table ('agents', 'logs', 'metrics') and
+per agent ('agent:<id>') in the 'stats' cache. Read endpoints build their
+ETag and Last-Modified from those versions, so an unchanged poll is
+answered 304 before any query or serializer runs.
+
+Versions are only seen by every worker when the 'stats' cache is shared
+(file or db). With locmem each worker keeps its own, so a worker never
+hears of writes handled by the others; validators then also roll over
+every VERSIONS_LOCAL_PERIOD seconds, which bounds how long such a worker
+keeps answering 304 for a changed list (core.checks warns about this
+setup when WEB_CONCURRENCY > 1).
+
+A version is the time of the last change in nanoseconds. Unlike an
+incremented counter it needs no atomic read-modify-write (the file and
+db cache backends don't have one), every bump yields a value no reader
+has seen before, and it doubles as the Last-Modified time.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .db_routers import note_change
+
+# Bumped by writes that remove rows across agents (retention)
+GLOBAL_SCOPE = 'all'
+
+
+def _cache():
+    return caches['stats']
+
+
+def is_local():
+    """Whether versions are kept per worker process"""
+    return isinstance(_cache(), LocMemCache)
+
+
+def _key(scope):
+    return f'version:{scope}'
+
+
+def agent_scope(agent_id):
+    return f'agent:{agent_id}'
+
+
+def bump(*scopes):
+    """
+    Record a change to each scope once the current transaction commits,
+    so no reader can pair the new version with the old rows.
+    """
+    keys = {_key(scope) for scope in scopes}
+
+    def apply():
+        now = time.time_ns()
+        _cache().set_many({key: now for key in keys}, None)
+
+    transaction.on_commit(apply)
+
+
+def bump_agents(agent_ids, *scopes):
+    """Bump ``scopes`` plus the per-agent scope of every id in ``agent_ids``"""
+    bump(*scopes, *(agent_scope(agent_id) for agent_id in set(agent_ids)))
+
+
+def tables(*names):
+    """Scopes function for views that read whole tables"""
+    return lambda request, *args, **kwargs: list(names)
+
+
+def agent_detail(request, *args, pk=None, **kwargs):
+    """Scopes function for views of one agent (``pk``)"""
+    return [agent_scope(pk)]
+
+
+def current(scopes):
+    """
+    Versions of ``scopes`` (plus the global scope). Missing versions
+    (cold or evicted cache) are started at now, which is past anything
+    handed out before, so a stale ETag cannot match by accident.
+    """
+    cache = _cache()
+    keys = [_key(scope) for scope in (GLOBAL_SCOPE, *scopes)]
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        now = time.time_ns()
+        for key in missing:
+            cache.add(key, now, None)
+        values.update(cache.get_many(missing))
+    return [values.get(key, 0) for key in keys]
+
+
+def conditional(scopes, period=None):
+    """
+    ETag / Last-Modified for a read view, from change versions.
+
+    ``scopes(request, *args, **kwargs)`` returns the scopes the response
+    depends on. Views over a sliding time window pass ``period``
+    (seconds) so their validators also roll over as the window moves.
+    With per-worker versions the period is at most VERSIONS_LOCAL_PERIOD.
+
+    The ETag covers the full path and Accept header, so filtered and
+    paginated variants validate separately. Responses are marked
+    ``no-cache`` so browsers revalidate each poll rather than guess a
+    freshness lifetime. Apply below @query_budget and above @api_view
+    (or via method_decorator on viewset methods); async views work too.
+    """
+    def validators(request, *args, **kwargs):
+        cached = getattr(request, '_version_validators', None)
+        if cached is not None:
+            return cached
+
+        versions = current(scopes(request, *args, **kwargs))
+        modified = max(versions) / 1e9
+        note_change(modified)
+        rollover = period
+        if settings.VERSIONS_LOCAL_PERIOD and is_local():
+            rollover = min(period or settings.VERSIONS_LOCAL_PERIOD, settings.VERSIONS_LOCAL_PERIOD)
+        if rollover:
+            window = int(time.time() // rollover)
+            versions.append(window)
+            modified = max(modified, window * rollover)
+
+        variant = f"{'.'.join(map(str, versions))}|{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+        etag = hashlib.blake2b(variant.encode(), digest_size=12).hexdigest()
+        request._version_validators = (etag, datetime.fromtimestamp(modified, dt_timezone.utc))
+        return request._version_validators
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: validators(request, *args, **kwargs)[0],
+            last_modified_func=lambda request, *args, **kwargs: validators(request, *args, **kwargs)[1],
+        )(view)
+
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                # Read the versions off the event loop (the cache may be the
+                # database); condition() then finds them on the request
+                await sync_to_async(validators)(request, *args, **kwargs)
+                response = await conditional_view(request, *args, **kwargs)
+                patch_cache_control(response, no_cache=True, private=True)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, no_cache=True, private=True)
+            return response
+        return wrapper
+    return decorator
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
@@ -5,6 +6,8 @@ from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import Waitlist
+from .query_budget import query_budget
+from .waitlist import add_signup, clean_email, get_count, get_signup_buffer
 import json
 
 def landing(request):
@@ -30,36 +33,44 @@ def integrations(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def waitlist_signup(request):
-    """Add email to waitlist"""
+    """
+    Add email to waitlist
+    With WAITLIST_BUFFERED (off by default) the signup is queued and
+    inserted with the next batch (see core.waitlist); the count returned
+    then includes it, although it is not persisted yet.
+    """
     try:
         data = json.loads(request.body)
-        email = data.get('email', '').strip()
+        email = clean_email(data.get('email') if isinstance(data, dict) else None)
         
-        if not email or '@' not in email:
+        if not email:
             return JsonResponse({'error': 'Invalid email'}, status=400)
         
-        # Create or get existing
-        waitlist, created = Waitlist.objects.get_or_create(
-            email=email,
-            defaults={'source': 'landing'}
-        )
+        if settings.WAITLIST_BUFFERED:
+            get_signup_buffer().add(email, 'landing')
+            return JsonResponse({
+                'success': True,
+                'count': get_count() + 1,
+                'queued': True
+            }, status=202)
         
-        count = Waitlist.objects.count()
+        # Create or get existing
+        created = add_signup(email, 'landing')
         
         return JsonResponse({
             'success': True,
-            'count': count,
+            'count': get_count(),
             'created': created
         })
         
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@query_budget(1)
 @require_http_methods(["GET"])
 def waitlist_count(request):
-    """Get waitlist count"""
-    count = Waitlist.objects.count()
-    return JsonResponse({'count': count})
+    """Get waitlist count (maintained counter, no COUNT(*))"""
+    return JsonResponse({'count': get_count()})
 
 @api_view(['GET'])
 def admin_waitlist(request):
@@ -0,0 +1,135 @@
+"""
+Agent Control Panel - Waitlist signups
+The signup count is a counter row updated with F() in the transaction
+that inserts the signups, so reading it is a primary key lookup rather
+than a COUNT(*) over the table. Single saves and deletes are counted by
+receivers in core.signals, bulk inserts by add_signups(); recount()
+repairs any drift (e.g. rows removed with raw SQL).
+
+With WAITLIST_BUFFERED, signups are queued in memory and inserted in
+batches (one bulk INSERT and one counter UPDATE per flush), so a burst
+of signups doesn't turn into a burst of single-row transactions. Emails
+are validated against the model field before they are queued, and a
+batch that still fails is retried signup by signup (core.buffers).
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+
+from .buffers import CoalescingBuffer
+from .models import Waitlist, WaitlistCounter
+
+COUNTER_NAME = 'signups'
+COUNT_KEY = 'waitlist:count'
+
+
+def _cache():
+    return caches['stats']
+
+
+def add_to_count(delta):
+    updated = WaitlistCounter.objects.filter(pk=COUNTER_NAME).update(count=F('count') + delta)
+    if not updated:
+        recount()
+    transaction.on_commit(lambda: _cache().delete(COUNT_KEY))
+
+
+def read_count():
+    """Current number of signups from the counter row (one primary key lookup)"""
+    count = WaitlistCounter.objects.filter(pk=COUNTER_NAME).values_list('count', flat=True).first()
+    return recount() if count is None else count
+
+
+def get_count():
+    """
+    Signup count as shown to visitors: read_count() cached for up to
+    WAITLIST_COUNT_TTL seconds and dropped when this process writes
+    """
+    count = _cache().get(COUNT_KEY)
+    if count is None:
+        count = read_count()
+        _cache().set(COUNT_KEY, count, settings.WAITLIST_COUNT_TTL)
+    return count
+
+
+def recount():
+    """Reset the counter from COUNT(*); returns the count"""
+    with transaction.atomic():
+        count = Waitlist.objects.count()
+        WaitlistCounter.objects.update_or_create(name=COUNTER_NAME, defaults={'count': count})
+    return count
+
+
+def clean_email(email):
+    """
+    ``email`` as Waitlist.email would store it, or None if the column
+    would reject it (checked before queueing, so a bad address can't
+    fail a whole batch later)
+    """
+    if not isinstance(email, str):
+        return None
+    try:
+        return Waitlist._meta.get_field('email').clean(email.strip(), None)
+    except ValidationError:
+        return None
+
+
+def add_signup(email, source='landing'):
+    """Insert one signup now; returns whether it was new"""
+    _, created = Waitlist.objects.get_or_create(email=email, defaults={'source': source})
+    return created
+
+
+def add_signups(signups):
+    """
+    Insert {email: source}, skipping emails already signed up, and count
+    them in the same transaction. Returns the number added.
+
+    Two processes inserting the same new email at once both count it
+    (the conflicting insert is ignored); recount() corrects that.
+    """
+    with transaction.atomic():
+        existing = set(
+            Waitlist.objects.filter(email__in=list(signups)).values_list('email', flat=True)
+        )
+        new = [
+            Waitlist(email=email, source=source)
+            for email, source in signups.items() if email not in existing
+        ]
+        if new:
+            Waitlist.objects.bulk_create(new, batch_size=500, ignore_conflicts=True)
+            add_to_count(len(new))
+    return len(new)
+
+
+class SignupBuffer(CoalescingBuffer):
+    """Queues signups per email (first source wins) and inserts them in batches"""
+
+    def __init__(self, interval=None, max_pending=None):
+        super().__init__(
+            interval or settings.WAITLIST_FLUSH_SECONDS,
+            max_pending or settings.WAITLIST_MAX_PENDING,
+        )
+
+    def merge(self, current, value):
+        return current or value
+
+    def write(self, batch):
+        add_signups(batch)
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_signup_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = SignupBuffer()
+    return _buffer
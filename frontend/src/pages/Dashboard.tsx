@@ -23,20 +23,23 @@ export default function Dashboard() {
   const [error, setError] = useState<string | null>(null)
 
   useEffect(() => {
+    const fetchStats = async () => {
+      const statsRes = await fetch('/api/dashboard/stats/')
+      if (!statsRes.ok) throw new Error('Failed to fetch stats')
+      setStats(await statsRes.json())
+    }
+
+    const fetchAgents = async () => {
+      const agentsRes = await fetch('/api/agents/')
+      if (!agentsRes.ok) throw new Error('Failed to fetch agents')
+      const agentsData = await agentsRes.json()
+      setAgents(agentsData.results || agentsData)
+    }
+
     const fetchData = async () => {
       try {
-        // Fetch dashboard stats
-        const statsRes = await fetch('/api/dashboard/stats/')
-        if (!statsRes.ok) throw new Error('Failed to fetch stats')
-        const statsData = await statsRes.json()
-        setStats(statsData)
-
-        // Fetch agents list
-        const agentsRes = await fetch('/api/agents/')
-        if (!agentsRes.ok) throw new Error('Failed to fetch agents')
-        const agentsData = await agentsRes.json()
-        setAgents(agentsData.results || agentsData)
-
+        await fetchStats()
+        await fetchAgents()
         setLoading(false)
       } catch (err) {
         setError(err instanceof Error ? err.message : 'Unknown error')
@@ -45,9 +48,83 @@ export default function Dashboard() {
     }
 
     fetchData()
-    // Refresh every 30 seconds
-    const interval = setInterval(fetchData, 30000)
-    return () => clearInterval(interval)
+
+    // Polling every 30 seconds, for browsers without EventSource and for
+    // servers whose feed isn't live (WSGI replays the backlog and closes)
+    let pollTimer: ReturnType<typeof setInterval> | null = null
+    const startPolling = () => {
+      if (!pollTimer) pollTimer = setInterval(fetchData, 30000)
+    }
+
+    if (typeof EventSource === 'undefined') {
+      startPolling()
+      return () => {
+        if (pollTimer) clearInterval(pollTimer)
+      }
+    }
+
+    // Live updates: patch agents in place, refresh stats at most every 5s
+    let statsTimer: ReturnType<typeof setTimeout> | null = null
+    const scheduleStats = () => {
+      if (statsTimer) return
+      statsTimer = setTimeout(() => {
+        statsTimer = null
+        fetchStats().catch(() => {})
+      }, 5000)
+    }
+
+    const source = new EventSource('/api/events/')
+
+    source.addEventListener('ready', (e) => {
+      const { live } = JSON.parse((e as MessageEvent).data)
+      if (!live) {
+        source.close()
+        startPolling()
+      }
+    })
+
+    // Events published while disconnected (or by another worker) are not
+    // replayed, so every (re)connect starts from fresh data
+    source.onopen = () => {
+      fetchData()
+    }
+
+    source.onerror = () => {
+      // The browser stopped reconnecting (e.g. an error response)
+      if (source.readyState === EventSource.CLOSED) startPolling()
+    }
+
+    source.addEventListener('agent.status', (e) => {
+      const data = JSON.parse((e as MessageEvent).data)
+      setAgents((current) => {
+        if (!current.some((agent) => agent.id === data.agent)) {
+          fetchAgents().catch(() => {})
+          return current
+        }
+        return current.map((agent) =>
+          agent.id === data.agent ? { ...agent, status: data.status } : agent
+        )
+      })
+      scheduleStats()
+    })
+
+    source.addEventListener('agent.heartbeat', (e) => {
+      const data = JSON.parse((e as MessageEvent).data)
+      setAgents((current) => current.map((agent) =>
+        agent.id === data.agent ? { ...agent, last_active_at: data.last_active_at } : agent
+      ))
+    })
+
+    source.addEventListener('log', (e) => {
+      const data = JSON.parse((e as MessageEvent).data)
+      if (data.status === 'blocked') scheduleStats()
+    })
+
+    return () => {
+      source.close()
+      if (statsTimer) clearTimeout(statsTimer)
+      if (pollTimer) clearInterval(pollTimer)
+    }
   }, [])
 
   const getStatusColor = (status: string) => {
@@ -3,6 +3,8 @@ set -e
 
 # Default PORT if not set
 export PORT="${PORT:-8000}"
+# Exported so settings (and `manage.py check`) know how many workers share the caches
+export WEB_CONCURRENCY="${WEB_CONCURRENCY:-2}"
 
 echo "========================================="
 echo "Starting Agent Control Panel"
@@ -15,6 +17,10 @@ echo ""
 echo "Running migrations..."
 python manage.py migrate --noinput || { echo "Migration failed"; exit 1; }
 
+echo ""
+echo "Creating cache tables (if configured)..."
+python manage.py createcachetable || { echo "Cache table creation failed"; exit 1; }
+
 echo ""
 echo "Collecting static files..."
 python manage.py collectstatic --noinput || { echo "Collectstatic failed"; exit 1; }
@@ -24,7 +30,26 @@ echo "Creating admin user (if needed)..."
 python manage.py create_admin 2>&1 || echo "Admin user creation skipped"
 
 echo ""
+# SERVER_MODE=asgi runs uvicorn workers: async views (dashboard stats, health,
+# per-agent logs/metrics, the live event feed) share each worker's event
+# loop, so concurrency is no longer capped at workers x threads.
+# The default (wsgi) runs sync workers, one request at a time each.
+# GUNICORN_THREADS=n opts into threaded (gthread) workers. Each thread keeps
+# its own database connection (WEB_CONCURRENCY x n per database), and the
+# locmem caches' read-modify-write updates (dashboard stats, limits,
+# versions) aren't locked across threads; use a shared cache with them.
+SERVER_MODE="${SERVER_MODE:-wsgi}"
+
 echo "========================================="
-echo "Starting gunicorn on port $PORT..."
+echo "Starting gunicorn ($SERVER_MODE) on port $PORT..."
 echo "========================================="
-exec gunicorn backend.wsgi:application --bind 0.0.0.0:$PORT --workers 2 --timeout 60 --log-level info
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec gunicorn backend.asgi:application --bind 0.0.0.0:$PORT --workers $WEB_CONCURRENCY \
+        --worker-class uvicorn.workers.UvicornWorker --timeout 60 --log-level info
+fi
+if [ -n "${GUNICORN_THREADS:-}" ]; then
+    exec gunicorn backend.wsgi:application --bind 0.0.0.0:$PORT --workers $WEB_CONCURRENCY \
+        --worker-class gthread --threads "$GUNICORN_THREADS" --timeout 60 --log-level info
+fi
+exec gunicorn backend.wsgi:application --bind 0.0.0.0:$PORT --workers $WEB_CONCURRENCY \
+    --timeout 60 --log-level info